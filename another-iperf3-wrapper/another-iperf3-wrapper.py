@@ -7,10 +7,8 @@ import logging
 import os
 import sys
 
-from rich import print
-
-from modules import bufferbloat, probe, bdp, run_iperf, unidirectional_test, all_tests
-from utils import args, common, run_commands, output_operations
+from modules import bufferbloat, probe, bdp, run_iperf, unidirectional_test, all_tests, scheduler, sweep, tune, history, compare, serve, server
+from utils import args, common, run_commands, output_operations, parquet_output, ssh_control
 
 
 # get main logger
@@ -47,76 +45,66 @@ def setup_logger(logging_level):
     logger.addHandler(ch)
 
 
-def get_host_list():
-    """get host list from config file
-
-    Returns:
-        list: host list
-    """
-    host_list = []
-    try:
-        # open in app folder the json file contaning list of hosts
-        with open(__file__) as f:
-            hosts = json.load(f)
-            for host in hosts:
-                host_list.append(host["host"])
-
-        """with open(common.data["config_file"]) as f:
-            for line in f:
-                if line.startswith("host:"):
-                    host_list.append(line.split(":")[1].strip())
-        """
-    except Exception as e:
-        log.debug(f"Exception: {e}")
-        log.warning("No host found in config file")
-        return None
-    return host_list
-
-def select_host(host_list):
-    """select a host from list
-
-    Args:
-        host_list (list): list of host
-    """
-    print("Select a host from list:")
-    for i, host in enumerate(host_list):
-        print(f"{i+1}) {host}")
-    print("0) Exit")
-    try:
-        host_index = int(input("Select a host: "))
-        if host_index == 0:
-            return None
-        else:
-            return host_list[host_index-1]
-    except Exception as e:
-        log.debug(f"Exception: {e}")
-        log.warning("No valid host selected")
-        return None
-
 def main():
     """main run
 
     Args:
         args (obj): main program obj
     """
-    
-    if not args.obj.host:
-        log.warning("No valid host, please set a host with argument '-c'  \nexit")
+    # results database only - no host required
+    if args.obj.cmd == "history":
+        history.history_run()
+        return
+
+    if args.obj.cmd == "compare":
+        compare.compare_run()
+        return
+
+    # local iperf3 servers - no host required
+    if args.obj.cmd == "server":
+        server.server_run()
+        return
+
+    hosts = scheduler.get_hosts(common.data["config"])
+
+    if not hosts:
+        log.warning("No valid host, please set a host with argument '-c' or 'hosts' in config file \nexit")
         exit(0)
-        
-        # Prototype - ask if user wish to select a host from list
-        host_list = get_host_list()
-        if host_list:
-            host = select_host(host_list)
-            if host:
-                args.obj.host = host
-            else:
-                log.warning("No valid host selected, exit")
-                exit(0)
 
+    # one metrics endpoint by agent
+    if args.obj.cmd == "serve" and len(hosts) > 1:
+        log.error("serve measures a single host - run an agent for each host")
+        exit(1)
+
+    # several hosts - run a job for each host
+    if len(hosts) > 1:
+        scheduler.scheduler_run(hosts)
+        return
+
+    args.obj.host = hosts[0]["host"]
+    args.obj.port = hosts[0]["port"]
 
     args.obj.test_name = f"{args.obj.test_name}-" if args.obj.test_name else ""
 
+    if args.obj.parquet:
+        parquet_output.check_pyarrow()
+
+    # replayed outputs - no server to probe
+    if args.obj.runner == "replay":
+        args.obj.no_probe = True
+
+    if args.obj.runner == "ssh" and not args.obj.ssh_client:
+        log.error("--runner ssh requires --ssh-client host")
+        exit(1)
+    if args.obj.runner == "ssh":
+        ssh_control.connect(args.obj.ssh_client)
+
+    # iperf3 servers of port pool started on demand
+    if args.obj.ssh_server is not None:
+        ssh_control.start_servers(
+            args.obj.ssh_server or args.obj.host, args.obj.host, run_commands.check_port_arg(args.obj.port)
+        )
+
     if args.obj.cmd == "bdp":
         bdp.bdp_run()
 
@@ -129,6 +117,15 @@ def main():
     if args.obj.cmd == "all":
         all_tests.all_tests_run()
 
+    if args.obj.cmd == "sweep":
+        sweep.sweep_run()
+
+    if args.obj.cmd == "tune":
+        tune.tune_run()
+
+    if args.obj.cmd == "serve":
+        serve.serve_run()
+
     # default iperf run
     if not args.obj.cmd:
         unidirectional_test.unidirectional_test()
@@ -151,6 +148,7 @@ if __name__ == "__main__":
     except FileNotFoundError:
         configFileNotFoundError = True
 
+    common.data["config"] = config
     args.obj = args.arg_parse(config.get("default", {}))
     # args_dict = vars(common.args)
 
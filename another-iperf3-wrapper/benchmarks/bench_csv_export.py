@@ -0,0 +1,204 @@
+"""benchmark of interval stats CSV export - legacy flatten/DictWriter vs fixed schema rows
+
+Time and peak memory (tracemalloc, interval store excluded) of each export:
+legacy builds a dict by second then the whole CSV content, fixed schema rows
+are merged from store tables and written one at a time.
+
+Usage (from another-iperf3-wrapper directory):
+    python3 benchmarks/bench_csv_export.py -P 128 -t 3600
+"""
+import argparse
+import csv
+import datetime
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from utils import common, interval_store  # noqa: E402
+
+
+def generate_store(parallel, duration):
+    """interval store filled as by an iperf3 TCP test with ping running alongside"""
+    random.seed(0)
+    store = interval_store.new_interval_store()
+    start_ts = 1700000000
+    for second in range(duration):
+        streams = [
+            {
+                "socket": 5 + i,
+                "start": float(second),
+                "end": float(second + 1),
+                "seconds": 1.0,
+                "bytes": random.randint(1e5, 1e7),
+                "bits_per_second": random.random() * 1e8,
+                "retransmits": random.randint(0, 10),
+                "snd_cwnd": random.randint(1e4, 1e6),
+                "snd_wnd": 3145728,
+                "rtt": random.randint(1000, 50000),
+                "rttvar": random.randint(100, 5000),
+                "pmtu": 1500,
+                "omitted": False,
+                "sender": True,
+            }
+            for i in range(parallel)
+        ]
+        total = {
+            "start": float(second),
+            "end": float(second + 1),
+            "seconds": 1.0,
+            "bytes": sum(s["bytes"] for s in streams),
+            "bits_per_second": sum(s["bits_per_second"] for s in streams),
+            "retransmits": sum(s["retransmits"] for s in streams),
+            "omitted": False,
+            "sender": True,
+        }
+        interval_store.add_iperf3_interval(store, "upstream", start_ts, {"sum": total, "streams": streams})
+        interval_store.add_ping_reply(
+            store,
+            {
+                "unix_time": start_ts + second + 0.3,
+                "target_host": "192.0.2.1",
+                "icmp_seq": second + 1,
+                "icmp_ttl": 60,
+                "icmp_time": random.random() * 20,
+            },
+        )
+    return store
+
+
+# legacy path - export code as it was before fixed schema rows, kept verbatim
+
+
+def legacy_get_row(table, columns, index):
+    row = {}
+    for column, typecode in columns.items():
+        value = table[column][index]
+        if typecode in ["d", "n"]:
+            if not math.isnan(value):
+                row[column] = int(value) if typecode == "n" else value
+        elif typecode == "b":
+            if value != -1:
+                row[column] = bool(value)
+        else:
+            row[column] = value
+    return row
+
+
+def legacy_to_interval_stats(store):
+    interval_stats = {}
+
+    table = store["iperf3_sum"]
+    for index, timestamp in enumerate(table["timestamp"]):
+        direction = interval_store.DIRECTIONS[table["direction"][index]]
+        stats = interval_stats.setdefault(int(round(timestamp, 0)), {})
+        stats.setdefault("sum", {})[direction] = legacy_get_row(table, interval_store.IPERF3_SUM_COLUMNS, index)
+        stats.setdefault("streams", {})[direction] = []
+
+    table = store["iperf3_streams"]
+    last_timestamp = {}
+    for index, timestamp in enumerate(table["timestamp"]):
+        direction = interval_store.DIRECTIONS[table["direction"][index]]
+        rounded_timestamp = int(round(timestamp, 0))
+        streams = interval_stats[rounded_timestamp]["streams"][direction]
+        if last_timestamp.get((rounded_timestamp, direction), timestamp) != timestamp:
+            streams.clear()
+        last_timestamp[(rounded_timestamp, direction)] = timestamp
+        streams.append(legacy_get_row(table, interval_store.IPERF3_STREAM_COLUMNS, index))
+
+    table = store["ping"]
+    for index, timestamp in enumerate(table["timestamp"]):
+        rounded_timestamp = int(round(timestamp, 0))
+        ping = dict(unix_time=timestamp, **store["ping_info"])
+        ping.update(legacy_get_row(table, interval_store.PING_COLUMNS, index))
+        interval_stats.setdefault(rounded_timestamp, {})["ping"] = ping
+
+    return interval_stats
+
+
+def legacy_export(store, filename):
+    """export as before fixed schema - nested dicts flattened row by row"""
+    interval_stats = legacy_to_interval_stats(store)
+    for timestamp, stats_per_ts in interval_stats.items():
+        if stats_per_ts.get("streams", False):
+            for stream_type, stream_type_stats in stats_per_ts["streams"].items():
+                streams_dict = {}
+                for id, stream in enumerate(stream_type_stats):
+                    streams_dict[str(id)] = stream
+                interval_stats[timestamp]["streams"][stream_type] = streams_dict
+
+    CSV_content = []
+    for timestamp in sorted(interval_stats):
+        CSV_line = {"timestamp": datetime.datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S")}
+        CSV_line.update(common.flatten(interval_stats[timestamp], "", "."))
+        CSV_content.append(CSV_line)
+
+    header = [key for dict in CSV_content for key in dict]
+    header = sorted(set(header))
+    header.remove("timestamp")
+    header.insert(0, "timestamp")
+    for h in header:
+        if h.startswith("sum."):
+            header.remove(h)
+            header.insert(1, h)
+
+    with open(filename, "w") as output_file:
+        dict_writer = csv.DictWriter(output_file, header)
+        dict_writer.writeheader()
+        dict_writer.writerows(CSV_content)
+
+
+def schema_export(store, filename):
+    """export with header derived once and rows written as generated"""
+    header = interval_store.get_CSV_header(store)
+    common.save_CSV_rows(filename, header, interval_store.get_CSV_rows(store, header))
+
+
+def read_rows(filename):
+    """rows as dicts without empty values - column order independent"""
+    with open(filename, newline="") as f:
+        return [{k: v for k, v in row.items() if v != ""} for row in csv.DictReader(f)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("-P", dest="parallel", type=int, default=128, help="streams (default 128)")
+    parser.add_argument("-t", dest="time", type=int, default=600, help="test duration in seconds (default 600)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs of each export, best is kept (default 3)")
+    obj = parser.parse_args()
+
+    store = generate_store(obj.parallel, obj.time)
+    print(f"-P {obj.parallel} -t {obj.time}: {interval_store.get_rows_count(store, 'iperf3_streams')} stream rows")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = {}
+        for name, export in [("legacy", legacy_export), ("schema", schema_export)]:
+            filename = os.path.join(tmp, f"{name}.csv")
+            timings = []
+            for _ in range(obj.repeat):
+                start = time.perf_counter()
+                export(store, filename)
+                timings.append(time.perf_counter() - start)
+            results[name] = min(timings)
+
+            # separate run - tracemalloc slows allocations down
+            tracemalloc.start()
+            export(store, filename)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(
+                f"{name:>8}: {results[name]:.3f}s - peak memory {peak / 1e6:.1f} MB"
+                f" ({os.path.getsize(filename) / 1e6:.1f} MB file)"
+            )
+
+        same = read_rows(os.path.join(tmp, "legacy.csv")) == read_rows(os.path.join(tmp, "schema.csv"))
+        print(f"speedup: x{results['legacy'] / results['schema']:.1f} - same content: {same}")
+
+
+if __name__ == "__main__":
+    main()
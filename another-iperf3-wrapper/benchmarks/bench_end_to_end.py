@@ -0,0 +1,160 @@
+"""benchmark of wrapper overhead with stand-in iperf3/ping as -P and -t grow
+
+For each -P/-t combination:
+    spawn     Popen of stand-in iperf3 to its first output line (median) - includes
+              python startup of stand-in, real iperf3 starts faster
+    parse     json.loads of iperf3 -J output
+    aggregate intervals into interval store, rtt stats and fairness
+    stream    --json-stream lines parsed and aggregated as they come
+    export    interval CSV and JSON of interval store
+    wrapper   whole wrapper run with --csv (stand-in tools output as fast as possible)
+    peak RSS  max resident memory of wrapper process - stand-in tools excluded
+
+Usage (from another-iperf3-wrapper directory):
+    python3 benchmarks/bench_end_to_end.py -P 1,16,128 -t 10,60,600
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCHMARKS_PATH = os.path.dirname(os.path.abspath(__file__))
+WRAPPER_PATH = os.path.join(BENCHMARKS_PATH, "..")
+FAKE_PATH = os.path.join(BENCHMARKS_PATH, "fake")
+
+sys.path.insert(0, WRAPPER_PATH)
+
+from utils import args, common, data_parsers, interval_store  # noqa: E402
+
+
+def get_env():
+    """environment with stand-in tools first in PATH, output as fast as possible"""
+    return dict(os.environ, PATH=f"{FAKE_PATH}{os.pathsep}{os.environ['PATH']}", FAKE_TIME_SCALE="0")
+
+
+def timed(function, *function_args):
+    """return result of function and its duration in seconds"""
+    start = time.perf_counter()
+    result = function(*function_args)
+    return result, time.perf_counter() - start
+
+
+def measure_spawn(cmd, repeat):
+    """median seconds from Popen to first output line"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, env=get_env())
+        process.stdout.readline()
+        timings.append(time.perf_counter() - start)
+        process.stdout.read()
+        process.wait()
+    return statistics.median(timings)
+
+
+def aggregate(output_parsed):
+    """intervals into interval store and stats as run_iperf.run"""
+    store = interval_store.new_interval_store()
+    direction = data_parsers.get_stream_direction(output_parsed)
+    data_parsers.add_iperf3_results(store, direction, output_parsed)
+    interval_store.get_rtt_stats(store, direction)
+    interval_store.get_streams_fairness(store, direction)
+    return store
+
+
+def parse_stream(lines):
+    """--json-stream lines parsed and aggregated as they come"""
+    store = interval_store.new_interval_store()
+    stream = data_parsers.new_iperf3_stream(store)
+    for line in lines:
+        data_parsers.parse_iperf3_stream_line(stream, line)
+    return store
+
+
+def export(store, tmp):
+    """interval CSV and JSON as saved by the wrapper"""
+    header = interval_store.get_CSV_header(store)
+    common.save_CSV_rows(os.path.join(tmp, "intervals.csv"), header, interval_store.get_CSV_rows(store, header))
+    common.save_JSON(os.path.join(tmp, "intervals.json"), interval_store.to_interval_stats(store))
+
+
+# run wrapper and write its own peak RSS in KB at exit - stand-in tools excluded
+RSS_BOOTSTRAP = """
+import atexit, os, resource, runpy, sys
+atexit.register(lambda: open(os.environ["BENCH_RSS_FILE"], "w").write(
+    str(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)))
+sys.path.insert(0, os.path.dirname(sys.argv[1]))
+sys.argv = sys.argv[1:]
+runpy.run_path(sys.argv[0], run_name="__main__")
+"""
+
+
+def run_wrapper(parallel, duration, tmp):
+    """whole wrapper run - wall time and peak RSS of wrapper process in MB"""
+    cmd = [
+        sys.executable,
+        "-c",
+        RSS_BOOTSTRAP,
+        os.path.join(WRAPPER_PATH, "another-iperf3-wrapper.py"),
+        "-c", "192.0.2.1",
+        "-P", str(parallel),
+        "-t", str(duration),
+        "--no-probe",
+        "--csv",
+        "--result-dst-path", f"{tmp}{os.sep}",
+        "--nl",
+    ]
+    rss_file = os.path.join(tmp, "rss")
+    start = time.perf_counter()
+    process = subprocess.run(cmd, stdout=subprocess.DEVNULL, env=dict(get_env(), BENCH_RSS_FILE=rss_file))
+    wall_time = time.perf_counter() - start
+    if process.returncode:
+        print(f"wrapper run failed (returncode {process.returncode}): {' '.join(cmd[3:])}")
+    with open(rss_file) as f:
+        # ru_maxrss in KB on Linux
+        return wall_time, int(f.read()) / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("-P", dest="parallel", default="1,16,128", help="streams, comma separated (default 1,16,128)")
+    parser.add_argument("-t", dest="time", default="10,60,600", help="durations, comma separated (default 10,60,600)")
+    parser.add_argument("--repeat", type=int, default=3, help="spawns measured (default 3)")
+    obj = parser.parse_args()
+
+    # defaults of wrapper arguments used by parsers
+    sys.argv = [sys.argv[0], "-c", "192.0.2.1"]
+    args.obj = args.arg_parse({})
+
+    columns = ["-P", "-t", "spawn", "parse", "aggregate", "stream", "export", "wrapper", "peak RSS"]
+    print(" ".join(f"{column:>10}" for column in columns))
+
+    for parallel in [int(p) for p in obj.parallel.split(",")]:
+        for duration in [int(t) for t in obj.time.split(",")]:
+            iperf3_cmd = ["iperf3", "-c", "192.0.2.1", "-P", str(parallel), "-t", str(duration)]
+            env = get_env()
+            output = subprocess.run(iperf3_cmd + ["-J"], capture_output=True, text=True, env=env).stdout
+            lines = subprocess.run(
+                iperf3_cmd + ["--json-stream"], capture_output=True, text=True, env=env
+            ).stdout.splitlines()
+
+            spawn = measure_spawn(iperf3_cmd + ["--json-stream"], obj.repeat)
+            output_parsed, parse = timed(json.loads, output)
+            store, aggregation = timed(aggregate, output_parsed)
+            _, stream = timed(parse_stream, lines)
+            with tempfile.TemporaryDirectory() as tmp:
+                _, export_time = timed(export, store, tmp)
+                wall_time, peak_rss = run_wrapper(parallel, duration, tmp)
+
+            values = [f"{parallel}", f"{duration}"]
+            values += [f"{t * 1000:.1f}ms" for t in [spawn, parse, aggregation, stream, export_time]]
+            values += [f"{wall_time:.2f}s", f"{peak_rss:.0f}MB"]
+            print(" ".join(f"{value:>10}" for value in values), flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,431 @@
+"""stand-in iperf3, ping and ssh emitting realistic output at configurable scale
+
+Used through benchmarks/fake/iperf3, benchmarks/fake/ping and benchmarks/fake/ssh - put
+benchmarks/fake first in PATH to run the wrapper without network nor iperf3 server:
+    PATH=benchmarks/fake:$PATH python3 another-iperf3-wrapper.py -c 192.0.2.1 -P 32 -t 60 --no-probe
+
+iperf3 -s only answers control handshake of port probing and prints its
+listening/accepted lines. ssh runs remote command
+locally with sh, its control master is a plain file at ControlPath created after
+a simulated connection setup.
+
+Scale follows the command line as real tools (-P streams, -t duration, -i interval,
+-c ping count), output is tuned with environment variables:
+    FAKE_TIME_SCALE   wall time / simulated time, 0 = output as fast as possible (default: 0)
+    FAKE_BITRATE      total throughput in bits/s, -b if given (default: 1e9)
+    FAKE_RTT_MS       base round trip time in ms (default: 20)
+    FAKE_PING_LOSS    percentage of pings without answer (default: 0)
+    FAKE_SEED         random seed (default: 0)
+    FAKE_SSH_SETUP    seconds of ssh connection setup (default: 0.2)
+"""
+import json
+import math
+import os
+import random
+import signal
+import socket
+import sys
+import time
+
+# MSS reported in start block, cwnd floor
+TCP_MSS = 1448
+
+
+def get_env(name, default):
+    """float from environment variable"""
+    return float(os.environ.get(name, default))
+
+
+def get_arg(cmd_args, arg, default):
+    """return value following arg in command arguments"""
+    try:
+        return cmd_args[cmd_args.index(arg) + 1]
+    except (ValueError, IndexError):
+        return default
+
+
+def get_units(value):
+    """iperf3 value with K/M/G suffix as number"""
+    units = {"K": 1e3, "M": 1e6, "G": 1e9, "T": 1e12}
+    if value[-1].upper() in units:
+        return float(value[:-1]) * units[value[-1].upper()]
+    return float(value)
+
+
+def new_state():
+    """interruption state - set by SIGINT as real tools, partial results are output"""
+    state = {"interrupted": False}
+
+    def interrupt(signum, frame):
+        state["interrupted"] = True
+
+    signal.signal(signal.SIGINT, interrupt)
+    signal.signal(signal.SIGTERM, interrupt)
+    return state
+
+
+def sleep(seconds, state):
+    """sleep simulated time scaled by FAKE_TIME_SCALE - interrupted by SIGINT"""
+    deadline = time.monotonic() + seconds * get_env("FAKE_TIME_SCALE", 0)
+    while not state["interrupted"] and time.monotonic() < deadline:
+        time.sleep(min(deadline - time.monotonic(), 0.05))
+
+
+def get_iperf3_start(cmd_args, sockets):
+    """iperf3 start block"""
+    host = get_arg(cmd_args, "-c", "192.0.2.1")
+    port = int(get_arg(cmd_args, "-p", 5201))
+    now = time.time()
+    return {
+        "connected": [
+            {
+                "socket": sock,
+                "local_host": "192.0.2.100",
+                "local_port": 40000 + index,
+                "remote_host": host,
+                "remote_port": port,
+            }
+            for index, sock in enumerate(sockets)
+        ],
+        "version": "iperf 3.16",
+        "system_info": f"Linux {socket.gethostname()} fake",
+        "timestamp": {"time": time.strftime("%a, %d %b %Y %H:%M:%S GMT", time.gmtime(now)), "timesecs": int(now)},
+        "connecting_to": {"host": host, "port": port},
+        "cookie": "fakefakefakefakefakefakefakefakefake",
+        "tcp_mss_default": TCP_MSS,
+        "test_start": {
+            "protocol": "UDP" if "-u" in cmd_args else "TCP",
+            "num_streams": len(sockets),
+            "blksize": 1460 if "-u" in cmd_args else 131072,
+            "omit": 0,
+            "duration": int(float(get_arg(cmd_args, "-t", 10))),
+            "bytes": 0,
+            "blocks": 0,
+            "reverse": int("-R" in cmd_args),
+            "tos": 0,
+        },
+    }
+
+
+def get_iperf3_stream_interval(cmd_args, sock, start, seconds, bits_per_second):
+    """stream interval as reported by the client side - sender unless -R"""
+    sender = "-R" not in cmd_args
+    interval = {
+        "socket": sock,
+        "start": round(start, 6),
+        "end": round(start + seconds, 6),
+        "seconds": seconds,
+        "bytes": int(bits_per_second * seconds / 8),
+        "bits_per_second": bits_per_second,
+    }
+    if "-u" in cmd_args:
+        packets = max(int(interval["bytes"] / 1460), 1)
+        interval["packets"] = packets
+        if not sender:
+            lost = int(packets * random.random() * 0.001)
+            interval.update(
+                {
+                    "jitter_ms": random.random() * 0.5,
+                    "lost_packets": lost,
+                    "lost_percent": lost / packets * 100,
+                }
+            )
+    elif sender:
+        rtt_us = int(get_env("FAKE_RTT_MS", 20) * 1000 * (1 + random.random() * 0.5))
+        interval.update(
+            {
+                "retransmits": int(random.random() < 0.1) * random.randint(1, 20),
+                "snd_cwnd": int(bits_per_second / 8 * rtt_us / 1e6) + 10 * TCP_MSS,
+                "snd_wnd": 3145728,
+                "rtt": rtt_us,
+                "rttvar": int(rtt_us * 0.05),
+                "pmtu": 1500,
+            }
+        )
+    interval.update({"omitted": False, "sender": sender})
+    return interval
+
+
+def get_iperf3_interval(cmd_args, sockets, start, seconds):
+    """interval with streams and sum - total throughput shared with noise between streams"""
+    bitrate = get_units(get_arg(cmd_args, "-b", os.environ.get("FAKE_BITRATE", "1e9")))
+    streams = [
+        get_iperf3_stream_interval(
+            cmd_args, sock, start, seconds, bitrate / len(sockets) * random.uniform(0.8, 1.2)
+        )
+        for sock in sockets
+    ]
+    total = {k: streams[0][k] for k in ["start", "end", "seconds"]}
+    for key in ["bytes", "bits_per_second", "retransmits", "packets", "lost_packets"]:
+        if key in streams[0]:
+            total[key] = sum(stream[key] for stream in streams)
+    if "jitter_ms" in streams[0]:
+        total["jitter_ms"] = sum(stream["jitter_ms"] for stream in streams) / len(streams)
+        total["lost_percent"] = total["lost_packets"] / total["packets"] * 100
+    total.update({"omitted": False, "sender": streams[0]["sender"]})
+    return {"streams": streams, "sum": total}
+
+
+def get_iperf3_end(cmd_args, sockets, intervals):
+    """end block summarizing intervals as sender and receiver"""
+    duration = intervals[-1]["sum"]["end"] if intervals else 0.0
+    tcp = "-u" not in cmd_args
+    sender = "-R" not in cmd_args
+
+    # totals by socket in one pass
+    totals = {sock: {"bytes": 0, "retransmits": 0, "rtts": [], "max_snd_cwnd": 0} for sock in sockets}
+    for interval in intervals:
+        for stream in interval["streams"]:
+            total = totals[stream["socket"]]
+            total["bytes"] += stream["bytes"]
+            total["retransmits"] += stream.get("retransmits", 0)
+            if "rtt" in stream:
+                total["rtts"].append(stream["rtt"])
+                total["max_snd_cwnd"] = max(total["max_snd_cwnd"], stream["snd_cwnd"])
+
+    def get_sum(total_bytes, **extra):
+        return dict(
+            {
+                "start": 0,
+                "end": duration,
+                "seconds": duration,
+                "bytes": total_bytes,
+                "bits_per_second": total_bytes * 8 / duration if duration else 0.0,
+            },
+            **extra,
+        )
+
+    streams = []
+    for sock, total in totals.items():
+        stream_sender = get_sum(total["bytes"], socket=sock)
+        if tcp:
+            rtts = total["rtts"] or [0]
+            stream_sender.update(
+                {
+                    "retransmits": total["retransmits"],
+                    "max_snd_cwnd": total["max_snd_cwnd"],
+                    "max_rtt": max(rtts),
+                    "min_rtt": min(rtts),
+                    "mean_rtt": int(sum(rtts) / len(rtts)),
+                }
+            )
+        stream_sender["sender"] = sender
+        # receiver lags behind sender at end of test
+        stream_receiver = get_sum(int(total["bytes"] * 0.99), socket=sock, sender=sender)
+        streams.append({"sender": stream_sender, "receiver": stream_receiver})
+
+    total_bytes = sum(total["bytes"] for total in totals.values())
+    sum_sent = get_sum(total_bytes)
+    if tcp:
+        sum_sent["retransmits"] = sum(total["retransmits"] for total in totals.values())
+    sum_sent["sender"] = sender
+    sum_received = get_sum(int(total_bytes * 0.99), sender=sender)
+
+    end = {
+        "streams": streams,
+        "sum_sent": sum_sent,
+        "sum_received": sum_received,
+        "cpu_utilization_percent": {
+            "host_total": 5.0,
+            "host_user": 0.5,
+            "host_system": 4.5,
+            "remote_total": 10.0,
+            "remote_user": 2.0,
+            "remote_system": 8.0,
+        },
+    }
+    if tcp:
+        end["sender_tcp_congestion"] = end["receiver_tcp_congestion"] = "cubic"
+    else:
+        end["sum"] = dict(sum_received, jitter_ms=0.1, lost_packets=0, packets=0, lost_percent=0.0)
+    return end
+
+
+def run_iperf3(cmd_args):
+    """emit iperf3 output - full json (-J), json lines (--json-stream) or text"""
+    random.seed(get_env("FAKE_SEED", 0))
+    state = new_state()
+
+    parallel = int(get_arg(cmd_args, "-P", 1))
+    duration = float(get_arg(cmd_args, "-t", 10))
+    report_interval = float(get_arg(cmd_args, "-i", 1)) or duration
+    sockets = [5 + 2 * index for index in range(parallel)]
+    json_stream = "--json-stream" in cmd_args
+
+    start = get_iperf3_start(cmd_args, sockets)
+    if json_stream:
+        print(json.dumps({"event": "start", "data": start}), flush=True)
+
+    intervals = []
+    elapsed = 0.0
+    while elapsed < duration and not state["interrupted"]:
+        seconds = min(report_interval, duration - elapsed)
+        sleep(seconds, state)
+        interval = get_iperf3_interval(cmd_args, sockets, elapsed, seconds)
+        intervals.append(interval)
+        elapsed += seconds
+        if json_stream:
+            print(json.dumps({"event": "interval", "data": interval}), flush=True)
+
+    end = get_iperf3_end(cmd_args, sockets, intervals)
+    # interrupted client reports an error along with partial results
+    error = "interrupt - the client has terminated" if state["interrupted"] else None
+    if json_stream:
+        print(json.dumps({"event": "end", "data": end}), flush=True)
+        if error:
+            print(json.dumps({"event": "error", "data": error}), flush=True)
+    elif "-J" in cmd_args:
+        output = {"start": start, "intervals": intervals, "end": end}
+        if error:
+            output["error"] = error
+        print(json.dumps(output, indent=4))
+    else:
+        # text output - only final line is used when probing ports
+        for interval in intervals:
+            total = interval["sum"]
+            print(f"[SUM] {total['start']:.2f}-{total['end']:.2f} sec {total['bytes']} Bytes {total['bits_per_second']:.0f} bits/sec")
+        print("\niperf Done.")
+
+
+def run_iperf3_server(cmd_args):
+    """accept control connections and answer ready state - -D daemon, --pidfile, -1 as real iperf3"""
+    port = int(get_arg(cmd_args, "-p", 5201))
+    server = socket.create_server(("", port))
+
+    if "-D" in cmd_args:
+        if os.fork():
+            return
+        os.setsid()
+        devnull = os.open(os.devnull, os.O_RDWR)
+        for fd in range(3):
+            os.dup2(devnull, fd)
+
+    pidfile = get_arg(cmd_args, "--pidfile", None)
+    if pidfile:
+        with open(pidfile, "w") as f:
+            f.write(f"{os.getpid()}\n")
+
+    def stop(signum, frame):
+        if pidfile and os.path.exists(pidfile):
+            os.remove(pidfile)
+        sys.exit(0)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    separator = "-" * 61
+    test = 1
+    while True:
+        print(f"{separator}\nServer listening on {port} (test #{test})\n{separator}", flush=True)
+        conn, address = server.accept()
+        print(f"Accepted connection from {address[0]}, port {address[1]}", flush=True)
+        test += 1
+        with conn:
+            try:
+                conn.recv(37)
+                # PARAM_EXCHANGE - ready to run a test
+                conn.sendall(bytes([9]))
+            except OSError:
+                pass
+        if "-1" in cmd_args:
+            stop(None, None)
+
+
+def run_ping(cmd_args):
+    """emit ping -D -O output - one line by reply, no answer line for lost packets"""
+    random.seed(get_env("FAKE_SEED", 0))
+    state = new_state()
+
+    host = cmd_args[0]
+    count = int(get_arg(cmd_args, "-c", 5))
+    interval = float(get_arg(cmd_args, "-i", 1))
+    base_rtt = get_env("FAKE_RTT_MS", 20)
+    loss = get_env("FAKE_PING_LOSS", 0) / 100
+
+    print(f"PING {host} ({host}) 56(84) bytes of data.", flush=True)
+    start = time.time()
+    rtts = []
+    transmitted = 0
+    for seq in range(1, count + 1):
+        if state["interrupted"]:
+            break
+        transmitted += 1
+        if random.random() < loss:
+            print(f"[{time.time():.6f}] no answer yet for icmp_seq={seq}", flush=True)
+        else:
+            rtt = round(base_rtt * (1 + random.random() * 0.5), 3)
+            rtts.append(rtt)
+            print(f"[{time.time():.6f}] 64 bytes from {host}: icmp_seq={seq} ttl=60 time={rtt} ms", flush=True)
+        if seq < count:
+            sleep(interval, state)
+
+    elapsed = int((time.time() - start) * 1000)
+    print(f"\n--- {host} ping statistics ---")
+    loss_perc = (transmitted - len(rtts)) / transmitted * 100 if transmitted else 0
+    print(f"{transmitted} packets transmitted, {len(rtts)} received, {loss_perc:g}% packet loss, time {elapsed}ms")
+    if rtts:
+        mean = sum(rtts) / len(rtts)
+        mdev = math.sqrt(max(sum(r * r for r in rtts) / len(rtts) - mean * mean, 0))
+        print(f"rtt min/avg/max/mdev = {min(rtts):.3f}/{mean:.3f}/{max(rtts):.3f}/{mdev:.3f} ms", flush=True)
+
+
+# ssh options followed by a value
+SSH_VALUE_OPTIONS = set("BbcDEeFIiJLlmOopQRSWw")
+
+
+def run_ssh(cmd_args):
+    """run remote command locally - -O check/exit and ControlMaster auto|yes emulated"""
+    options = {}
+    ctl_cmd = None
+    index = 0
+    while index < len(cmd_args) and cmd_args[index].startswith("-"):
+        arg = cmd_args[index]
+        if arg[1:2] in SSH_VALUE_OPTIONS:
+            value = arg[2:] or cmd_args[index + 1]
+            index += 1 if arg[2:] else 2
+            if arg[1] == "o":
+                key, _, option_value = value.partition("=")
+                options[key.lower()] = option_value
+            elif arg[1] == "O":
+                ctl_cmd = value
+        else:
+            index += 1
+    destination = cmd_args[index]
+    command = " ".join(cmd_args[index + 1 :])
+    control_path = options.get("controlpath")
+
+    if ctl_cmd == "check":
+        if not control_path or not os.path.exists(control_path):
+            print(f"Control socket connect({control_path}): No such file or directory", file=sys.stderr)
+            sys.exit(255)
+        print(f"Master running (pid={os.getpid()})", file=sys.stderr)
+        return
+    if ctl_cmd == "exit":
+        if control_path and os.path.exists(control_path):
+            os.remove(control_path)
+        print("Exit request sent.", file=sys.stderr)
+        return
+
+    if control_path and options.get("controlmaster") in ["auto", "yes"] and not os.path.exists(control_path):
+        time.sleep(get_env("FAKE_SSH_SETUP", 0.2))
+        with open(control_path, "w") as f:
+            f.write(f"{destination}\n")
+
+    if command:
+        os.execvp("sh", ["sh", "-c", command])
+
+
+def main(tool):
+    """entry point of stand-in tool
+
+    Args:
+        tool (str): iperf3|ping|ssh
+    """
+    if tool == "iperf3" and "-s" in sys.argv[1:]:
+        run_iperf3_server(sys.argv[1:])
+    elif tool == "iperf3":
+        run_iperf3(sys.argv[1:])
+    elif tool == "ssh":
+        run_ssh(sys.argv[1:])
+    else:
+        run_ping(sys.argv[1:])
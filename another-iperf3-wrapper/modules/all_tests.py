@@ -2,7 +2,7 @@ import logging
 import re
 import time 
 
-from utils import args, common, run_commands, output_operations
+from utils import args, run_commands, result_sink
 from modules import bufferbloat, unidirectional_test
 
 log = logging.getLogger("another-iperf3-wrapper")
@@ -16,60 +16,53 @@ def all_tests_run():
     2. Runs the upload test.
     3. Runs the bufferbloat test.
     4. Repeats the above steps for the specified number of iterations.
-    5. Saves the results to CSV and/or JSON files if specified in the arguments.
+    5. Appends the results of each test to CSV and/or JSON files as soon as done,
+       tests already completed in a resumed campaign are skipped.
     """
     
-    all_interval_stats = []
     all_summary_stats = []
 
     all_tests_run_iterations = args.obj.iterations
     args.obj.iterations = 1 
+
+    # results of each test saved as soon as done
+    sink = result_sink.new_sink(f"{args.obj.test_name}ALL", args.obj.campaign)
+
+    def run_step(i, step, run):
+        completed = result_sink.get_completed(sink, i, step)
+        if completed:
+            log.info(f"{step} test of iteration {i + 1} already completed - skipped")
+            all_summary_stats.append(completed)
+            return
+        log.info(f"Starting {step} test")
+        interval_stats, summary_stats = run()
+        log.info(f"{step.capitalize()} test completed")
+        all_summary_stats.append(result_sink.append_run(sink, i, step, summary_stats, interval_stats))
+
+    def run_unidirectional(reverse):
+        args.obj.reverse = reverse
+        run_commands.cmd_preparation()
+        return unidirectional_test.single_run(save=False)
+
+    def run_bufferbloat():
+        args.obj.reverse = False
+        run_commands.cmd_preparation()
+        return bufferbloat.single_run(save=False)
     
     for i in range(all_tests_run_iterations):
         log.info(f"Running iteration {i + 1} of {all_tests_run_iterations}") if all_tests_run_iterations > 1 else None
         
         # Download 
-        log.info("Starting download test")
-        args.obj.reverse = True
-        run_commands.cmd_preparation()
-        interval_stats, summary_stats = unidirectional_test.single_run() 
-        log.info("Download test completed")
-        
-        all_interval_stats.append(interval_stats)
-        all_summary_stats.append(summary_stats)
+        run_step(i, "download", lambda: run_unidirectional(True))
         
         # Upload
-        log.info("Starting upload test")
-        args.obj.reverse = False
-        run_commands.cmd_preparation()
-        interval_stats, summary_stats = unidirectional_test.single_run() 
-        log.info("Upload test completed")
-        
-        all_interval_stats.append(interval_stats)
-        all_summary_stats.append(summary_stats)
+        run_step(i, "upload", lambda: run_unidirectional(False))
         
         # Bufferbloat
-        log.info("Starting bufferbloat test")
-        interval_stats, summary_stats = bufferbloat.single_run()
-        log.info("Bufferbloat test completed")
-        
-        all_interval_stats.append(interval_stats)
-        all_summary_stats.append(summary_stats)
+        run_step(i, "bufferbloat", run_bufferbloat)
             
         if i < all_tests_run_iterations - 1:
             log.info(f"Sleeping for {args.obj.sleep} seconds before next iteration")
             time.sleep(args.obj.sleep)
 
-    # Save all results after all iterations
-    if args.obj.csv:
-        log.info("Saving results to CSV")
-        runtest_time = common.get_timestamp_now()
-        output_operations.save_to_CSV(
-            f"{args.obj.test_name}ALL", runtest_time, all_summary_stats, all_interval_stats
-        )
-
-    if args.obj.json:
-        log.info("Saving results to JSON")
-        output_operations.save_to_JSON(
-            f"{args.obj.test_name}ALL", runtest_time, all_summary_stats, all_interval_stats
-        )
\ No newline at end of file
+    return all_summary_stats
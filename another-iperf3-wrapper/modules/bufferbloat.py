@@ -1,8 +1,7 @@
 import logging
-import re
 import time
 
-from utils import args, common, run_commands, output_operations
+from utils import args, common, run_commands, output_operations, result_sink, placement, results_db
 from modules import run_iperf
 
 log = logging.getLogger("another-iperf3-wrapper")
@@ -35,7 +34,7 @@ def bufferbloat_grade(effective_latency_inc):
     return grade
 
 
-def single_run():
+def single_run(use_cache=True, save=True):
     """
     Main function to run bufferbloat test.
     This function performs the following steps:
@@ -48,6 +47,12 @@ def single_run():
     7. Displays the summary statistics.
     8. Calculates and prints the bufferbloat grade if the log level is debug or info.
     9. Saves the results to CSV and/or JSON files if specified.
+    If the test fails on a port taken from port cache, ports are probed again and test re-run.
+
+    Args:
+        use_cache (bool, optional): use port cache when probing. Defaults to True.
+        save (bool, optional): save results, False when saved by a result sink. Defaults to True.
+
     Returns:
         tuple: A tuple containing interval statistics and summary statistics.
     """
@@ -66,36 +71,43 @@ def single_run():
         cmd_iperf3_ds = f"{common.data['commands'][0]} -R"
 
     bufferbloat_iperf3_commands = [cmd_iperf3_ds, cmd_iperf3_us]
+    ports = common.data["port_list"]
 
     if not args.obj.no_probe and not args.obj.dry_run:
-        free_ports = run_commands.probe_iperf3(
-            args.obj.host, common.data["port_list"], required_ports=2
+        ports = run_commands.probe_iperf3(
+            args.obj.host,
+            common.data["port_list"],
+            required_ports=placement.get_required_ports(bufferbloat_iperf3_commands),
+            use_cache=use_cache,
         )
 
-        for idx, cmd in enumerate(bufferbloat_iperf3_commands):
-            bufferbloat_iperf3_commands[idx] = re.sub(
-                r"-p\s+\d+\s",
-                f"-p {free_ports[idx]} ",
-                bufferbloat_iperf3_commands[idx],
-            )
-
     scenario_time = str(int(args.obj.time) + 4)
 
     scenario_cmds = {
-        f"ping {args.obj.host} -c {scenario_time} -D": 2,
-        bufferbloat_iperf3_commands[0]: 0.1,
-        bufferbloat_iperf3_commands[1]: 0.1,
+        run_commands.get_ping_cmd(args.obj.host, int(scenario_time)): 2,
     }
+    # iperf3 processes of each direction - several with --split
+    for process_cmd in placement.place_cmds(bufferbloat_iperf3_commands, ports):
+        scenario_cmds[process_cmd] = 0.1
     
     for cmd in scenario_cmds.keys():
         log.info(f"commands: {cmd}")
 
     runtest_time = common.get_timestamp_now()
     interval_stats, summary_stats = run_iperf.run(scenario_cmds)
+
+    # not re-run when aborted - partial results kept
+    if common.data["failed_ports"] and common.data.get("ports_from_cache") and not summary_stats["aborted"]:
+        log.warning("test failed on port from cache - probe ports again")
+        return single_run(use_cache=False, save=save)
     
     summary_stats["timestamp"] = runtest_time
     summary_stats["description"] = args.obj.description
 
+    # saved once test is not re-run
+    if args.obj.db:
+        results_db.save_run("BBT", list(scenario_cmds), summary_stats, interval_stats)
+
     #
     # Display data
     #
@@ -105,26 +117,35 @@ def single_run():
     # Bufferbloat specific
     #
     if log.level in (10, 20):
-        effective_latency_inc = float(summary_stats["icmp_rtt_max"]) - float(
-            summary_stats["icmp_rtt_min"]
-        )
-
-        print(
-            f"bufferbloat grade: {bufferbloat_grade(round(effective_latency_inc, 2))}"
-        )
+        # no ping stats when all pings are lost, e.g. aborted on ping loss
+        rtt_max = results_db.get_number(summary_stats.get("icmp_rtt_max"))
+        rtt_min = results_db.get_number(summary_stats.get("icmp_rtt_min"))
+        if rtt_max is None or rtt_min is None:
+            log.warning("no ping rtt - bufferbloat grade not available")
+        else:
+            effective_latency_inc = rtt_max - rtt_min
+
+            print(
+                f"bufferbloat grade: {bufferbloat_grade(round(effective_latency_inc, 2))}"
+            )
 
     #
     # Save data
     #
-    if args.obj.csv:
+    if save and args.obj.csv:
         output_operations.save_to_CSV(
             f"{args.obj.test_name}BBT", runtest_time, [summary_stats], [interval_stats]
         )
 
-    if args.obj.json:
+    if save and args.obj.json:
         output_operations.save_to_JSON(
             f"{args.obj.test_name}BBT", runtest_time, [summary_stats], [interval_stats]
         )
+
+    if save and args.obj.parquet:
+        output_operations.save_to_parquet(
+            f"{args.obj.test_name}BBT", runtest_time, [summary_stats], [interval_stats]
+        )
         
     return interval_stats, summary_stats
 
@@ -133,21 +154,30 @@ def single_run():
 def bufferbloat_run():
     """main function to run bufferbloat test"""
 
-    all_interval_stats = []
     all_summary_stats = []
     
     run_commands.cmd_preparation()
 
+    # results of each iteration saved as soon as done
+    sink = result_sink.new_sink(f"{args.obj.test_name}BBT", args.obj.campaign)
+
     for i in range(args.obj.iterations):
+        completed = result_sink.get_completed(sink, i, "bufferbloat")
+        if completed:
+            log.info(f"iteration {i + 1} already completed - skipped")
+            all_summary_stats.append(completed)
+            continue
+
         log.info(f"Running iteration {i + 1} of {args.obj.iterations}") if args.obj.iterations > 1 else None
 
-        interval_stats, summary_stats = single_run()
+        interval_stats, summary_stats = single_run(save=False)
 
-        all_interval_stats.append(interval_stats)
-        all_summary_stats.append(summary_stats)
+        all_summary_stats.append(
+            result_sink.append_run(sink, i, "bufferbloat", summary_stats, interval_stats)
+        )
         
         if i < args.obj.iterations - 1:
             log.info(f"Sleeping for {args.obj.sleep} seconds before next iteration")
             time.sleep(args.obj.sleep)
 
-    return all_interval_stats, all_summary_stats
\ No newline at end of file
+    return all_summary_stats
\ No newline at end of file
@@ -0,0 +1,162 @@
+import json
+import logging
+import math
+import statistics
+import time
+
+from rich.console import Console
+from rich.table import Table
+from rich import box
+
+from utils import args, results_db, run_commands
+from modules import history
+
+log = logging.getLogger("another-iperf3-wrapper")
+
+# compared when no --metric
+DEFAULT_METRICS = ["downstream", "icmp_rtt", "latency_increase"]
+
+# metrics where a lower value is a regression
+HIGHER_IS_BETTER = ["downstream", "upstream"]
+
+# MAD to standard deviation for normally distributed values
+MAD_SCALE = 1.4826
+
+# minimum deviation scale relative to median - MAD of a very stable baseline can be 0
+MIN_RELATIVE_SCALE = 0.01
+
+# exit code when a regression is detected - errors exit with 1
+REGRESSION_EXIT_CODE = 2
+
+
+def get_baseline(values):
+    """median and median absolute deviation of values
+
+    Args:
+        values (list): baseline values
+
+    Returns:
+        tuple: median, MAD
+    """
+    median = statistics.median(values)
+    return median, statistics.median([abs(value - median) for value in values])
+
+
+def get_score(metric, value, median, mad):
+    """robust z-score of value against baseline - positive when worse than median
+
+    Args:
+        metric (str): metric of results_db.HISTORY_METRICS
+        value (float): value of compared run
+        median (float): baseline median
+        mad (float): baseline MAD
+
+    Returns:
+        float: deviation from median in scaled MAD
+    """
+    deviation = median - value if metric in HIGHER_IS_BETTER else value - median
+    scale = max(MAD_SCALE * mad, MIN_RELATIVE_SCALE * abs(median))
+    if scale == 0:
+        return math.inf if deviation > 0 else 0.0
+    return deviation / scale
+
+
+def get_direction(commands):
+    """direction of run from its iperf3 commands - both for bufferbloat
+
+    Args:
+        commands (str): command lines of run as json list
+
+    Returns:
+        str: downstream|upstream|both
+    """
+    directions = {
+        run_commands.get_cmd_direction(cmd)
+        for cmd in json.loads(commands)
+        if run_commands.get_cmd_type(cmd) == "iperf3"
+    }
+    return directions.pop() if len(directions) == 1 else "both"
+
+
+def compare_run():
+    """compare latest run of each host, test and direction to baseline of previous runs
+
+    Download and upload runs of a test type (e.g. both steps of all) and runs of
+    different subcommands are compared to their own baseline.
+
+    Exit with REGRESSION_EXIT_CODE if a metric of a latest run is worse than its
+    baseline median by more than threshold scaled MAD.
+    """
+
+    if not args.obj.db:
+        log.error("compare requires results database - set --db")
+        exit(1)
+
+    metrics = args.obj.metric or DEFAULT_METRICS
+    hosts = [host.strip() for host in args.obj.host.split(",") if host.strip()] if args.obj.host else None
+    since = time.time() - args.obj.days * 86400
+
+    runs = results_db.get_runs(
+        args.obj.db,
+        metrics,
+        since,
+        hosts=hosts,
+        test_type=args.obj.test_type,
+        description=args.obj.description or None,
+    )
+
+    if not runs:
+        log.warning(f"no run found in {args.obj.db} over the last {args.obj.days} days")
+        return
+
+    groups = {}
+    for run in runs:
+        direction = get_direction(run["commands"])
+        test = " ".join(filter(None, [run["test_type"], run["subcommand"], direction]))
+        groups.setdefault((run["host"], test, direction), []).append(run)
+
+    table = Table(box=box.ASCII, title=f"Latest run vs baseline - last {args.obj.days:g} days")
+    for column in ["host", "test", "metric", "latest", "median", "MAD", "runs", "score", "status"]:
+        table.add_column(column, justify="right")
+
+    regressions = []
+    for (host, test, direction), group_runs in groups.items():
+        latest, baseline = group_runs[-1], group_runs[:-1]
+        for metric in metrics:
+            # throughput of the other direction not measured
+            if metric in ["downstream", "upstream"] and direction not in [metric, "both"]:
+                continue
+            values = [run[metric] for run in baseline if run[metric] is not None]
+            row = [host, test, metric, history.format_value(metric, latest[metric])]
+
+            if latest[metric] is None:
+                table.add_row(*row, "", "", str(len(values)), "", "N/A")
+                continue
+            if len(values) < args.obj.min_runs:
+                table.add_row(*row, "", "", str(len(values)), "", "not enough runs")
+                continue
+
+            median, mad = get_baseline(values)
+            score = get_score(metric, latest[metric], median, mad)
+            status = "[red]REGRESSION[/red]" if score > args.obj.threshold else "ok"
+            if score > args.obj.threshold:
+                regressions.append(
+                    f"{host} {test} {metric}: {history.format_value(metric, latest[metric])}"
+                    f" - baseline median {history.format_value(metric, median)}, score {score:.1f}"
+                )
+
+            table.add_row(
+                *row,
+                history.format_value(metric, median),
+                history.format_value(metric, mad),
+                str(len(values)),
+                f"{score:.1f}",
+                status,
+            )
+
+    Console().print(table)
+
+    if regressions:
+        for regression in regressions:
+            log.error(f"regression - {regression}")
+        exit(REGRESSION_EXIT_CODE)
@@ -0,0 +1,71 @@
+import logging
+import time
+from datetime import datetime
+
+from rich.console import Console
+from rich.table import Table
+from rich import box
+
+from utils import args, common, interval_store, results_db
+
+log = logging.getLogger("another-iperf3-wrapper")
+
+
+def format_value(metric, value):
+    """format metric value with its unit
+
+    Args:
+        metric (str): metric of results_db.HISTORY_METRICS
+        value (float): value
+
+    Returns:
+        str: formatted value
+    """
+    if value is None:
+        return "N/A"
+    if metric in ["downstream", "upstream"]:
+        return f"{common.units_to_humanReadable(value) or '0 '}bps"
+    if metric == "icmp_loss":
+        return f"{round(value, 3)} %"
+    return f"{round(value, 3)} ms"
+
+
+def history_run():
+    """display stats by host of a metric over the last days from results database"""
+
+    if not args.obj.db:
+        log.error("history requires results database - set --db")
+        exit(1)
+
+    hosts = [host.strip() for host in args.obj.host.split(",") if host.strip()] if args.obj.host else None
+    since = time.time() - args.obj.days * 86400
+
+    history = results_db.get_history(
+        args.obj.db,
+        args.obj.metric,
+        since,
+        hosts=hosts,
+        test_type=args.obj.test_type,
+        description=args.obj.description or None,
+    )
+
+    if not history:
+        log.warning(f"no run with {args.obj.metric} found in {args.obj.db} over the last {args.obj.days} days")
+        return
+
+    table = Table(box=box.ASCII, title=f"{args.obj.metric} - last {args.obj.days:g} days")
+    for column in ["host", "runs", "first", "last", "min", "p50", "p95", "max"]:
+        table.add_column(column, justify="right")
+
+    for host, runs in history.items():
+        values = [value for _, value in runs]
+        p50, p95 = interval_store.get_percentiles(values, [50, 95])
+        table.add_row(
+            host,
+            str(len(runs)),
+            datetime.fromtimestamp(runs[0][0]).strftime("%m-%d %H:%M"),
+            datetime.fromtimestamp(runs[-1][0]).strftime("%m-%d %H:%M"),
+            *[format_value(args.obj.metric, value) for value in [min(values), p50, p95, max(values)]],
+        )
+
+    Console().print(table)
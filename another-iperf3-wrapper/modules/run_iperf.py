@@ -1,10 +1,105 @@
+import collections
+import functools
 import logging
 
-from utils import args, common, run_commands, output_operations, data_parsers
+from utils import args, common, run_commands, output_operations, data_parsers, port_cache, live_dashboard, abort_rules, interval_store
 
 log = logging.getLogger("another-iperf3-wrapper")
 
 
+def handle_iperf3_line(stream, dashboard, abort_state, line):
+    """parse iperf3 --json-stream output line, update live dashboard and evaluate abort rules
+
+    Args:
+        stream (dict): iperf3 stream state
+        dashboard (dict): live dashboard state or None
+        abort_state (dict): abort rules state or None
+        line (str): output line
+    """
+    event = data_parsers.parse_iperf3_stream_line(stream, line)
+    if dashboard:
+        live_dashboard.update_iperf3(dashboard, stream, event)
+    if abort_state and event and event["event"] == "interval" and stream["start"]:
+        abort_rules.check_iperf3_interval(
+            abort_state, data_parsers.get_stream_direction(stream), event["data"]
+        )
+
+
+def handle_ping_line(stream, dashboard, abort_state, line):
+    """parse ping output line, update live dashboard and evaluate abort rules
+
+    Args:
+        stream (dict): ping stream state
+        dashboard (dict): live dashboard state or None
+        abort_state (dict): abort rules state or None
+        line (str): output line
+    """
+    pckt_stats = data_parsers.parse_ping_stream_line(stream, line)
+    if dashboard:
+        live_dashboard.update_ping(dashboard, pckt_stats)
+    if abort_state and pckt_stats:
+        abort_rules.check_ping(abort_state, pckt_stats)
+
+
+def is_interrupted(cmd, process_stats):
+    """iperf3 process interrupted by abort rules or timeout - reports an interrupt error with partial results
+
+    Args:
+        cmd (str): iperf3 command
+        process_stats (dict): process stats by command
+
+    Returns:
+        bool: True if process was interrupted by the wrapper
+    """
+    stats = process_stats.get(cmd, {})
+    return bool(stats.get("timed_out") or stats.get("aborted"))
+
+
+def merge_processes(output_commands, process_stats):
+    """merge outputs of iperf3 processes of a same direction (--split) into one output
+
+    Outputs are left as they are when a process failed, to be reported by command,
+    other processes of its direction are dropped.
+
+    Args:
+        output_commands (dict): parsed output by command
+        process_stats (dict): process stats by command - wall time of merged outputs added
+
+    Returns:
+        dict: output_commands with a single iperf3 output by direction
+    """
+    cmds_by_direction = {}
+    for cmd, values in output_commands.items():
+        if values["type"] == "iperf3":
+            cmds_by_direction.setdefault(run_commands.get_cmd_direction(cmd), []).append(cmd)
+
+    for direction, cmds in cmds_by_direction.items():
+        if len(cmds) < 2:
+            continue
+        failed = [
+            cmd
+            for cmd in cmds
+            if (output_commands[cmd]["output_parsed"].get("error") and not is_interrupted(cmd, process_stats))
+            or (output_commands[cmd].get("streamed") and not output_commands[cmd]["output_parsed"]["end"])
+        ]
+        members = [output_commands.pop(cmd) for cmd in cmds if cmd not in failed]
+        if failed:
+            log.error(f"{direction}: {len(failed)} of {len(cmds)} iperf3 processes failed - no merged result")
+            continue
+
+        merged_cmd = " + ".join(cmds)
+        output_commands[merged_cmd] = dict(
+            members[0], output_parsed=data_parsers.merge_iperf3_outputs([m["output_parsed"] for m in members])
+        )
+        process_stats[merged_cmd] = {
+            "wall_time": max(process_stats.get(cmd, {}).get("wall_time", 0) for cmd in cmds),
+            "timed_out": any(process_stats.get(cmd, {}).get("timed_out") for cmd in cmds),
+            "aborted": any(process_stats.get(cmd, {}).get("aborted") for cmd in cmds),
+        }
+
+    return output_commands
+
+
 def run(scenario_cmds):
     """main function to run iperf3 standalone or on bufferbloat test
 
@@ -17,74 +112,121 @@ def run(scenario_cmds):
 
     runtest_time = common.get_timestamp_now()
 
-    output_commands = run_commands.run_commands(scenario_cmds)
+    interval_stats = interval_store.new_interval_store()
+
+    # iperf3 --json-stream and ping outputs aggregated into interval store as they come
+    streamed_directions = collections.Counter(
+        run_commands.get_cmd_direction(cmd)
+        for cmd in scenario_cmds
+        if run_commands.get_cmd_type(cmd) == "iperf3" and "--json-stream" in cmd
+    )
+    # intervals of iperf3 processes of a same direction (--split) merged as they come
+    groups = {
+        direction: data_parsers.new_iperf3_group(interval_stats, count)
+        for direction, count in streamed_directions.items()
+        if count > 1
+    }
+    streams = {}
+    for cmd in scenario_cmds:
+        if run_commands.get_cmd_type(cmd) == "iperf3" and "--json-stream" in cmd:
+            streams[cmd] = data_parsers.new_iperf3_stream(
+                interval_stats, groups.get(run_commands.get_cmd_direction(cmd))
+            )
+        elif run_commands.get_cmd_type(cmd) == "ping":
+            streams[cmd] = data_parsers.new_ping_stream(interval_stats)
 
-    output_commands = data_parsers.parse_output_commands(output_commands)
+    dashboard = live_dashboard.new_dashboard() if args.obj.live else None
+    abort_state = abort_rules.parse_rules(args.obj.abort_if)
+    line_handlers = {
+        cmd: functools.partial(
+            handle_iperf3_line if run_commands.get_cmd_type(cmd) == "iperf3" else handle_ping_line,
+            stream,
+            dashboard,
+            abort_state,
+        )
+        for cmd, stream in streams.items()
+    }
 
-    # save raw output
-    if args.obj.save_outputs:
-        log.debug("save raw output enabled")
-        for cmd, output in output_commands.items():
-            str_cmd = cmd.replace("-", "_").replace(" ", "")
-            fn = f"{args.obj.result_dst_path}{str_cmd}_{runtest_time}.{output['ext']}"
-            log.info(f"raw output saved : {fn}")
-            common.save_outputs(fn, output["raw"])
+    with live_dashboard.live_display(dashboard):
+        output_commands = run_commands.run_commands(scenario_cmds, line_handlers, abort_state)
+
+    output_commands = data_parsers.parse_output_commands(output_commands, streams)
+
+    process_stats = common.data.get("process_stats", {})
+    output_commands = merge_processes(output_commands, process_stats)
 
     #
     # Stats
     #
 
     # Aggregate data
-    interval_stats = {}
-
     summary_stats = {"timestamp": runtest_time}
 
+    # partial results when aborted
+    summary_stats["aborted"] = abort_state["reason"] if abort_state and abort_state["reason"] else ""
+    if summary_stats["aborted"]:
+        log.warning(f"test aborted - partial results: {summary_stats['aborted']}")
+
+    common.data["failed_ports"] = []
+
     for cmd, values in output_commands.items():
         test_error = values["output_parsed"].get("error", False)
+        if test_error and values["type"] == "iperf3" and is_interrupted(cmd, process_stats):
+            # SIGINT sent on abort or timeout - not a port failure, partial results kept
+            log.warning(f"iperf3 interrupted - partial results: {test_error}")
+            test_error = False
         if test_error:
             log.error(f"test invalid - error: {test_error}")
+            if values["type"] == "iperf3":
+                port = run_commands.get_cmd_port(cmd)
+                common.data["failed_ports"].append(port)
+                port_cache.invalidate(args.obj.host, port)
         else:
             if values["type"] == "ping":
+                # streamed replies already aggregated while running
                 for pckts_stats in values["output_parsed"]["pckts_stats"]:
-                    rounded_timestamp = int(round(float(pckts_stats["unix_time"]), 0))
+                    interval_store.add_ping_reply(interval_stats, pckts_stats)
 
-                    if not interval_stats.get(rounded_timestamp, False):
-                        # if the timestamp doesn't exist
-                        interval_stats[rounded_timestamp] = {"ping": {}}
-                    elif not interval_stats[rounded_timestamp].get("ping", False):
-                        # if there is no ping data
-                        interval_stats[rounded_timestamp]["ping"] = {}
-
-                    interval_stats[rounded_timestamp]["ping"].update(pckts_stats)
+                summary_stats["icmp_no_answer"] = values["output_parsed"].get("no_answer", "")
 
                 for stat_name, stat_value in values["output_parsed"]["stats"].items():
                     summary_stats[f"icmp_{stat_name}"] = stat_value
 
+                summary_stats["icmp_wall_time"] = process_stats.get(cmd, {}).get(
+                    "wall_time", ""
+                )
+
             if values["type"] == "iperf3":
 
-                stream_direction = (
-                    "downstream"
-                    if values["output_parsed"]["start"]["test_start"]["reverse"] == 1
-                    else "upstream"
-                )
+                # no end of test streamed, or none reported by interrupted iperf3
+                if "sum_received" not in values["output_parsed"].get("end", {}):
+                    log.error(f"test incomplete - no end of test received: {cmd}")
+                    continue
+
+                stream_direction = data_parsers.get_stream_direction(values["output_parsed"])
 
-                interval_stats = data_parsers.set_iperf3_results_by_timestamp(
-                    interval_stats, stream_direction, values["output_parsed"]
+                # streamed intervals already aggregated while running
+                if not values.get("streamed"):
+                    data_parsers.add_iperf3_results(
+                        interval_stats, stream_direction, values["output_parsed"]
+                    )
+                rtt_stats = interval_store.get_rtt_stats(interval_stats, stream_direction)
+
+                summary_stats[f"{stream_direction}_fairness"] = (
+                    interval_store.get_streams_fairness(interval_stats, stream_direction) or ""
                 )
 
                 summary_stats[f"{stream_direction}_bits_per_second"] = int(
                     values["output_parsed"]["end"]["sum_received"]["bits_per_second"]
                 )
 
-                # if not any(arg in cmd for arg in ["-u", "-R"]):
-                if output_commands[cmd]["output_parsed"]["intervals"][0]["streams"][
-                    0
-                ].get("rtt", False):
-                    summary_stats.update(
-                        data_parsers.calculate_streams_rtt_stats(
-                            output_commands[cmd]["output_parsed"]["intervals"]
-                        )
-                    )
+                # wall time of iperf3 process - include wrapper and iperf3 overhead
+                summary_stats[f"{stream_direction}_wall_time"] = process_stats.get(
+                    cmd, {}
+                ).get("wall_time", "")
+
+                if rtt_stats:
+                    summary_stats.update(rtt_stats)
                 else:
                     # Not existants
                     summary_stats.update(
@@ -93,6 +235,9 @@ def run(scenario_cmds):
                             "max": "",
                             "min": "",
                             "mdev": "",
+                            "rtt_p50": "",
+                            "rtt_p95": "",
+                            "rtt_p99": "",
                         }
                     )
     if not summary_stats.get("upstream_bits_per_second", False):
@@ -101,4 +246,22 @@ def run(scenario_cmds):
     if not summary_stats.get("downstream_bits_per_second", False):
         summary_stats["downstream_bits_per_second"] = ""
 
+    # same keys whatever commands completed
+    for key in [
+        "avg",
+        "max",
+        "min",
+        "mdev",
+        "rtt_p50",
+        "rtt_p95",
+        "rtt_p99",
+        "icmp_no_answer",
+        "icmp_wall_time",
+        "upstream_wall_time",
+        "downstream_wall_time",
+        "upstream_fairness",
+        "downstream_fairness",
+    ]:
+        summary_stats.setdefault(key, "")
+
     return interval_stats, summary_stats
@@ -0,0 +1,229 @@
+import logging
+import os
+import subprocess
+import sys
+import time
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from rich import print
+from rich.panel import Panel
+from rich.table import Table
+from rich.text import Text
+from rich import box
+
+from utils import args, run_commands
+
+log = logging.getLogger("another-iperf3-wrapper")
+
+# wrapper arguments (dest) set by scheduler for each job
+JOB_ARGS = ["host", "port", "iterations", "test_name"]
+
+
+def get_hosts(config):
+    """get hosts to test from '-c' argument (comma separated) or from config file
+
+    Config file hosts are set under "hosts" key, either as host name or as
+    dict with "host" and optional "port":
+        "hosts": ["host-a", {"host": "host-b", "port": "9200-9240"}]
+
+    Args:
+        config (dict): config file content
+
+    Returns:
+        list: list of dict with host and port
+    """
+    if args.obj.host:
+        return [
+            {"host": host.strip(), "port": args.obj.port}
+            for host in args.obj.host.split(",")
+            if host.strip()
+        ]
+
+    hosts = []
+    for host in config.get("hosts", []):
+        if isinstance(host, dict):
+            hosts.append({"host": host["host"], "port": str(host.get("port", args.obj.port))})
+        else:
+            hosts.append({"host": host, "port": args.obj.port})
+    return hosts
+
+
+def split_port_pool(port_list, slots):
+    """split port list into disjoint port pools - one for each concurrent job on a host
+
+    Args:
+        port_list (list): ports available on host
+        slots (int): amount of concurrent jobs on host
+
+    Returns:
+        list: list of port pools as comma separated string
+    """
+    slots = max(min(slots, len(port_list)), 1)
+    pools = [port_list[i::slots] for i in range(slots)]
+    return [",".join(str(port) for port in pool) for pool in pools]
+
+
+def get_job_arg_values(arg):
+    """values following arg on command line if it sets one of JOB_ARGS
+
+    Options are resolved as argparse does: abbreviations (--iter) and values
+    attached to the option (-p5201, --test-name=name) included.
+
+    Args:
+        arg (str): command line argument
+
+    Returns:
+        int: values following arg, None if arg does not set one of JOB_ARGS
+    """
+    if not arg.startswith("-"):
+        return None
+    option = args.parser._parse_optional(arg)
+    # list of matching options since python 3.12
+    if isinstance(option, list):
+        option = option[0] if len(option) == 1 else None
+    if not option or option[0] is None or option[0].dest not in JOB_ARGS:
+        return None
+    # explicit value is last item
+    return 0 if option[-1] is not None else 1
+
+
+def get_job_argv(host, ports, iterations, test_name):
+    """build command line to run the wrapper for a single host
+
+    Args:
+        host (str): host to test
+        ports (str): port pool for this job
+        iterations (int): iterations to run
+        test_name (str): test name for this job
+
+    Returns:
+        list: command line
+    """
+    user_argv = []
+    skip = 0
+    for arg in sys.argv[1:]:
+        if skip:
+            skip -= 1
+            continue
+        values = get_job_arg_values(arg)
+        if values is None:
+            user_argv.append(arg)
+        else:
+            skip = values
+
+    return [
+        sys.executable,
+        os.path.abspath(sys.argv[0]),
+        "-c", host,
+        "-p", ports,
+        "--iterations", str(iterations),
+        "--test-name", test_name,
+    ] + user_argv
+
+
+def prepare_jobs(hosts):
+    """prepare jobs for each host with its own port pool and share of iterations
+
+    Args:
+        hosts (list): list of dict with host and port
+
+    Returns:
+        list: jobs, interleaved across hosts
+    """
+    jobs_by_host = []
+    for host in hosts:
+        port_pools = split_port_pool(
+            run_commands.check_port_arg(host["port"]), args.obj.per_host_concurrency
+        )
+        host_jobs = []
+        for slot, ports in enumerate(port_pools):
+            iterations = args.obj.iterations // len(port_pools) + (
+                slot < args.obj.iterations % len(port_pools)
+            )
+            if not iterations:
+                continue
+            test_name = "-".join(filter(None, [args.obj.test_name, host["host"]]))
+            if len(port_pools) > 1:
+                test_name += f"-{slot}"
+            host_jobs.append(
+                {
+                    "host": host["host"],
+                    "slot": slot,
+                    "ports": ports,
+                    "argv": get_job_argv(host["host"], ports, iterations, test_name),
+                }
+            )
+        jobs_by_host.append(host_jobs)
+
+    # interleave jobs so that concurrency is spread across hosts
+    jobs = []
+    for i in range(max(len(host_jobs) for host_jobs in jobs_by_host)):
+        jobs.extend(host_jobs[i] for host_jobs in jobs_by_host if i < len(host_jobs))
+    return jobs
+
+
+def run_job(job):
+    """run the wrapper for one job and capture its output
+
+    Args:
+        job (dict): job to run
+
+    Returns:
+        dict: job with output, returncode and wall_time
+    """
+    log.debug(f"run job: {' '.join(job['argv'])}")
+    start = time.monotonic()
+    result = subprocess.run(job["argv"], capture_output=True, text=True)
+    job["wall_time"] = round(time.monotonic() - start, 3)
+    job["returncode"] = result.returncode
+    job["output"] = result.stdout + result.stderr
+    return job
+
+
+def scheduler_run(hosts):
+    """run selected test against several hosts concurrently
+
+    Up to --max-hosts jobs run at once and up to --per-host-concurrency on the
+    same host, each one with its own port pool. Output of each job is
+    displayed once completed to avoid interleaving.
+
+    Args:
+        hosts (list): list of dict with host and port
+
+    Returns:
+        list: completed jobs
+    """
+    jobs = prepare_jobs(hosts)
+    log.info(
+        f"{len(jobs)} jobs on {len(hosts)} hosts - max hosts: {args.obj.max_hosts} "
+        f"| per host concurrency: {args.obj.per_host_concurrency}"
+    )
+
+    completed_jobs = []
+    with ThreadPoolExecutor(max_workers=max(args.obj.max_hosts, 1)) as executor:
+        futures = [executor.submit(run_job, job) for job in jobs]
+        for future in as_completed(futures):
+            job = future.result()
+            completed_jobs.append(job)
+            if not args.obj.quiet:
+                print(
+                    Panel(
+                        Text(job["output"].rstrip()),
+                        title=f"{job['host']} (ports: {job['ports']})",
+                        border_style="white",
+                    )
+                )
+            if job["returncode"]:
+                log.warning(f"{job['host']}: job failed with returncode {job['returncode']}")
+
+    table = Table(box=box.ASCII, title="Scheduler")
+    table.add_column("host", justify="right")
+    table.add_column("ports", justify="right")
+    table.add_column("returncode", justify="right")
+    table.add_column("wall time", justify="right")
+    for job in sorted(completed_jobs, key=lambda j: (j["host"], j["slot"])):
+        table.add_row(job["host"], job["ports"], str(job["returncode"]), f"{job['wall_time']} s")
+    print(table)
+
+    return completed_jobs
@@ -0,0 +1,58 @@
+import logging
+import time
+
+from utils import args, run_commands, metrics_exporter, results_db
+from modules import bufferbloat, unidirectional_test
+
+log = logging.getLogger("another-iperf3-wrapper")
+
+
+def run_suite(exporter, suite):
+    """run a suite once and record its results in exporter
+
+    Args:
+        exporter (dict): exporter state
+        suite (str): unidirectional|bufferbloat
+    """
+    test_type = "BBT" if suite == "bufferbloat" else "ST"
+    try:
+        run_commands.cmd_preparation()
+        if suite == "bufferbloat":
+            interval_stats, summary_stats = bufferbloat.single_run()
+            rtt_max = results_db.get_number(summary_stats.get("icmp_rtt_max"))
+            rtt_min = results_db.get_number(summary_stats.get("icmp_rtt_min"))
+            grade = None
+            if rtt_max is not None and rtt_min is not None:
+                grade = bufferbloat.bufferbloat_grade(round(rtt_max - rtt_min, 2)).split(" - ")[0]
+            metrics_exporter.record_run(exporter, test_type, summary_stats, interval_stats, grade)
+        else:
+            interval_stats, summary_stats = unidirectional_test.single_run()
+            metrics_exporter.record_run(exporter, test_type, summary_stats, interval_stats)
+    # a failed run must not stop the agent - test functions exit on fatal errors
+    except (Exception, SystemExit) as e:
+        log.error(f"{suite} run failed: {e!r}")
+        metrics_exporter.record_failure(exporter, test_type)
+
+
+def serve_run():
+    """run suites every interval and expose results on /metrics until interrupted"""
+
+    suites = args.obj.suite or ["unidirectional", "bufferbloat"]
+    exporter = metrics_exporter.new_exporter(args.obj.host, args.obj.ring_size)
+    server = metrics_exporter.start_server(exporter, args.obj.listen)
+
+    try:
+        while True:
+            started = time.monotonic()
+            for suite in suites:
+                log.info(f"Starting {suite} run")
+                run_suite(exporter, suite)
+
+            wait = args.obj.interval - (time.monotonic() - started)
+            if wait > 0:
+                log.info(f"Sleeping for {round(wait)} seconds before next run")
+                time.sleep(wait)
+    except KeyboardInterrupt:
+        log.info("serve interrupted")
+    finally:
+        server.shutdown()
@@ -0,0 +1,66 @@
+import logging
+import os
+import signal
+
+from rich import print
+from rich.table import Table
+from rich import box
+
+from utils import args, run_commands, server_pool
+
+log = logging.getLogger("another-iperf3-wrapper")
+
+
+def get_cpus():
+    """cpus to pin workers to - --cpus (same syntax as ports) or cpus available to the wrapper
+
+    Returns:
+        list: cpus, empty for no pinning
+    """
+    if args.obj.cpus == "none":
+        return []
+    if args.obj.cpus:
+        return run_commands.check_port_arg(args.obj.cpus)
+    return sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else []
+
+
+def server_run():
+    """run a pool of iperf3 servers on ports of -p until interrupted
+
+    Each worker is pinned to a cpu and restarted when it exits. State of
+    workers (free|busy) is exposed on /ports, used by clients with --server-pool.
+    """
+    ports = run_commands.check_port_arg(args.obj.port)
+    if not ports:
+        log.error(f"no valid port in '{args.obj.port}'")
+        exit(1)
+
+    # stopped as a service - workers stopped as on interruption
+    def interrupt(signum, frame):
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, interrupt)
+
+    pool = server_pool.new_pool(ports, get_cpus())
+    server = server_pool.start_server(pool, args.obj.listen)
+
+    try:
+        for worker in pool["workers"].values():
+            server_pool.start_worker(pool, worker)
+
+        if not args.obj.quiet:
+            table = Table(box=box.ASCII, title="iperf3 server pool")
+            table.add_column("port", justify="right")
+            table.add_column("cpu", justify="right")
+            table.add_column("pid", justify="right")
+            for worker in pool["workers"].values():
+                cpu = "-" if worker["cpu"] is None else str(worker["cpu"])
+                table.add_row(str(worker["port"]), cpu, str(worker["process"].pid))
+            print(table)
+
+        server_pool.supervise(pool)
+    except KeyboardInterrupt:
+        log.info("server pool interrupted")
+    finally:
+        server.shutdown()
+        server_pool.stop(pool)
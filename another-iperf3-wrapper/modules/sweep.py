@@ -0,0 +1,132 @@
+import logging
+import random
+import statistics
+import time
+
+from rich.console import Console
+from rich.table import Table
+from rich import box
+
+from utils import args, common, run_commands, output_operations
+from modules import unidirectional_test
+
+log = logging.getLogger("another-iperf3-wrapper")
+
+
+def get_sort_key(value):
+    """sort key for argument value - numerically when possible (e.g. 64K < 1M)
+
+    Args:
+        value (str): argument value
+
+    Returns:
+        tuple: sort key
+    """
+    number = common.humanReadable_to_units(value)
+    return (0, number, "") if number is not None else (1, 0, value)
+
+
+def display_sweep_results(sweep_stats, swept_args):
+    """display mean results for each combination of swept arguments
+
+    Args:
+        sweep_stats (list): summary stats of each run with swept arguments values
+        swept_args (list): swept arguments
+    """
+    points = {}
+    for stats in sweep_stats:
+        point = tuple(stats[arg] for arg in swept_args)
+        points.setdefault(point, []).append(stats)
+
+    table = Table(box=box.ASCII, title="Sweep results (mean over repetitions)")
+    for arg in swept_args:
+        table.add_column(arg, justify="right")
+    table.add_column("runs", justify="right")
+    table.add_column("rx", justify="right")
+    table.add_column("tx", justify="right")
+    table.add_column("rtt avg", justify="right")
+    table.add_column("icmp rtt avg", justify="right")
+
+    def get_mean(point_stats, key):
+        values = [float(s[key]) for s in point_stats if s.get(key, "") != ""]
+        return statistics.mean(values) if values else None
+
+    for point, point_stats in points.items():
+        row = list(point) + [str(len(point_stats))]
+        for key in ["downstream_bits_per_second", "upstream_bits_per_second"]:
+            bps = common.units_to_humanReadable(get_mean(point_stats, key))
+            row.append(f"{bps}bps" if bps else "N/A")
+        for key in ["avg", "icmp_rtt_avg"]:
+            rtt = get_mean(point_stats, key)
+            row.append(f"{round(rtt, 3)} ms" if rtt is not None else "N/A")
+        table.add_row(*row)
+
+    Console().print(table)
+
+
+def sweep_run():
+    """run every command generated by cmd_preparation - each combination of given ranges and lists"""
+
+    run_commands.cmd_preparation()
+
+    swept_args = common.data["swept_args"]
+    points = list(zip(common.data["commands"], common.data["commands_params"]))
+    runs = [
+        (cmd, params, repetition)
+        for repetition in range(args.obj.repeat)
+        for cmd, params in points
+    ]
+    if args.obj.shuffle:
+        random.shuffle(runs)
+
+    log.info(
+        f"sweep over {swept_args}: {len(points)} combinations x {args.obj.repeat} repetitions"
+    )
+
+    sweep_stats = []
+    all_interval_stats = []
+    runtest_time = common.get_timestamp_now()
+
+    for i, (cmd, params, repetition) in enumerate(runs):
+        log.info(f"Running sweep {i + 1} of {len(runs)}: {' '.join(f'{arg} {params[arg]}' for arg in swept_args)}")
+
+        interval_stats, summary_stats = unidirectional_test.single_run(cmd=cmd, save=False)
+
+        stats = {arg: params[arg] for arg in swept_args}
+        stats["repetition"] = repetition
+        stats.update(summary_stats)
+
+        sweep_stats.append(stats)
+        all_interval_stats.append(interval_stats)
+
+        if i < len(runs) - 1:
+            log.info(f"Sleeping for {args.obj.sleep} seconds before next run")
+            time.sleep(args.obj.sleep)
+
+    # tidy table - one row for each run, sorted by swept arguments values
+    sorted_runs = sorted(
+        zip(sweep_stats, all_interval_stats),
+        key=lambda run: tuple(get_sort_key(run[0][arg]) for arg in swept_args),
+    )
+    sweep_stats = [run[0] for run in sorted_runs]
+    all_interval_stats = [run[1] for run in sorted_runs]
+
+    if not args.obj.quiet:
+        display_sweep_results(sweep_stats, swept_args)
+
+    if args.obj.csv:
+        output_operations.save_to_CSV(
+            f"{args.obj.test_name}SWEEP", runtest_time, sweep_stats, all_interval_stats
+        )
+
+    if args.obj.json:
+        output_operations.save_to_JSON(
+            f"{args.obj.test_name}SWEEP", runtest_time, sweep_stats, all_interval_stats
+        )
+
+    if args.obj.parquet:
+        output_operations.save_to_parquet(
+            f"{args.obj.test_name}SWEEP", runtest_time, sweep_stats, all_interval_stats
+        )
+
+    return all_interval_stats, sweep_stats
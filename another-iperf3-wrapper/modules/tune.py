@@ -0,0 +1,216 @@
+import logging
+import re
+import time
+
+from rich.console import Console
+from rich.table import Table
+from rich import box
+
+from utils import args, common, run_commands, output_operations
+from modules import unidirectional_test
+
+log = logging.getLogger("another-iperf3-wrapper")
+
+
+def get_tune_range(tune_range):
+    """parse search range (e.g. 1-128 or 64K-16M)
+
+    Args:
+        tune_range (str): min-max
+
+    Returns:
+        tuple: (min, max) as int
+    """
+    try:
+        range_min, range_max = [
+            int(common.humanReadable_to_units(v)) for v in tune_range.split("-")
+        ]
+    except (TypeError, ValueError):
+        log.error(f"not a valid range: {tune_range}")
+        exit(1)
+    return max(range_min, 1), max(range_min, range_max)
+
+
+def set_cmd_arg(cmd, arg, value):
+    """set argument value in iperf3 command
+
+    Args:
+        cmd (str): iperf3 command
+        arg (str): argument (e.g. -P)
+        value (int): value
+
+    Returns:
+        str: iperf3 command
+    """
+    if re.search(rf"\s{arg}\s+\S+", cmd):
+        return re.sub(rf"(\s{arg}\s+)\S+", rf"\g<1>{value}", cmd)
+    return f"{cmd} {arg} {value}"
+
+
+def get_objective(summary_stats):
+    """throughput to maximize from summary stats
+
+    Args:
+        summary_stats (dict): summary stats from run_iperf.run
+
+    Returns:
+        float: bits per second (0 if test failed)
+    """
+    bps = summary_stats.get("downstream_bits_per_second", "") or summary_stats.get(
+        "upstream_bits_per_second", ""
+    )
+    return float(bps) if bps != "" else 0
+
+
+def measure(value, phase, measures):
+    """run iperf3 test with tuned argument set to given value
+
+    Args:
+        value (int): value for tuned argument
+        phase (str): coarse|fine
+        measures (dict): measures done by value - updated
+
+    Returns:
+        float: measured throughput
+    """
+    if value in measures:
+        return measures[value]["objective"]
+
+    if measures:
+        log.info(f"Sleeping for {args.obj.sleep} seconds before next run")
+        time.sleep(args.obj.sleep)
+
+    log.info(f"{phase} search: {args.obj.tune_arg} {value}")
+    cmd = set_cmd_arg(common.data["commands"][0], args.obj.tune_arg, value)
+    interval_stats, summary_stats = unidirectional_test.single_run(cmd=cmd, save=False)
+
+    measures[value] = {
+        args.obj.tune_arg: value,
+        "phase": phase,
+        "objective": get_objective(summary_stats),
+        "summary_stats": summary_stats,
+        "interval_stats": interval_stats,
+    }
+    return measures[value]["objective"]
+
+
+def search_knee(range_min, range_max, threshold, measures):
+    """coarse-to-fine search of the knee of throughput curve
+
+    Coarse: value is doubled until throughput gain is below threshold.
+    Fine: bisection between last two coarse values for the smallest value
+    reaching (1 - threshold) of best throughput.
+
+    Args:
+        range_min (int): lowest value
+        range_max (int): highest value
+        threshold (float): relative throughput gain considered as not significant
+        measures (dict): measures done by value - updated
+
+    Returns:
+        int: knee value
+    """
+    # coarse
+    value = range_min
+    previous = None
+    while True:
+        objective = measure(value, "coarse", measures)
+        if previous is not None and objective < measures[previous]["objective"] * (1 + threshold):
+            log.info(f"gain below {threshold * 100}% from {previous} to {value} - stop coarse search")
+            break
+        if value == range_max:
+            break
+        previous = value
+        value = min(value * 2, range_max)
+
+    # fine
+    best = max(m["objective"] for m in measures.values())
+    target = best * (1 - threshold)
+    hi = min(v for v, m in measures.items() if m["objective"] >= target)
+    lo = max([v for v in measures if v < hi] or [hi])
+    # stop bisection when interval is smaller than 1 for -P or 10% for other arguments
+    resolution = 1 if args.obj.tune_arg == "-P" else max(int(lo * 0.1), 1)
+    while hi - lo > resolution:
+        mid = (lo + hi) // 2
+        if measure(mid, "fine", measures) >= target:
+            hi = mid
+        else:
+            lo = mid
+
+    return hi
+
+
+def display_tune_results(measures, knee):
+    """display measured points
+
+    Args:
+        measures (dict): measures by value
+        knee (int): knee value
+    """
+    table = Table(box=box.ASCII, title=f"Tune {args.obj.tune_arg} (knee: {knee})")
+    table.add_column(args.obj.tune_arg, justify="right")
+    table.add_column("phase", justify="right")
+    table.add_column("throughput", justify="right")
+    table.add_column("rtt avg", justify="right")
+    table.add_column("knee", justify="right")
+
+    for value in sorted(measures):
+        bps = common.units_to_humanReadable(measures[value]["objective"])
+        table.add_row(
+            str(value),
+            measures[value]["phase"],
+            f"{bps}bps" if bps else "N/A",
+            f"{measures[value]['summary_stats'].get('avg', 'N/A')} ms",
+            "*" if value == knee else "",
+        )
+
+    Console().print(table)
+
+
+def tune_run():
+    """search value of -P (or -w/-b) giving best throughput with fewest resources"""
+
+    run_commands.cmd_preparation()
+
+    range_min, range_max = get_tune_range(args.obj.tune_range)
+    log.info(
+        f"tune {args.obj.tune_arg} in {range_min}-{range_max} | threshold: {args.obj.tune_threshold * 100}%"
+    )
+
+    measures = {}
+    knee = search_knee(range_min, range_max, args.obj.tune_threshold, measures)
+
+    log.info(f"knee found: {args.obj.tune_arg} {knee} - {len(measures)} runs")
+
+    if not args.obj.quiet:
+        display_tune_results(measures, knee)
+
+    tune_stats = []
+    all_interval_stats = []
+    for value in sorted(measures):
+        stats = {
+            args.obj.tune_arg: value,
+            "phase": measures[value]["phase"],
+            "knee": value == knee,
+        }
+        stats.update(measures[value]["summary_stats"])
+        tune_stats.append(stats)
+        all_interval_stats.append(measures[value]["interval_stats"])
+
+    runtest_time = common.get_timestamp_now()
+    if args.obj.csv:
+        output_operations.save_to_CSV(
+            f"{args.obj.test_name}TUNE", runtest_time, tune_stats, all_interval_stats
+        )
+
+    if args.obj.json:
+        output_operations.save_to_JSON(
+            f"{args.obj.test_name}TUNE", runtest_time, tune_stats, all_interval_stats
+        )
+
+    if args.obj.parquet:
+        output_operations.save_to_parquet(
+            f"{args.obj.test_name}TUNE", runtest_time, tune_stats, all_interval_stats
+        )
+
+    return knee, tune_stats
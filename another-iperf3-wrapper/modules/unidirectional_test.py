@@ -1,14 +1,13 @@
 import logging
-import re
 import time
 
-from utils import args, common, run_commands, output_operations
+from utils import args, common, run_commands, output_operations, result_sink, placement, results_db
 from modules import run_iperf
 
 log = logging.getLogger("another-iperf3-wrapper")
 
 
-def single_run():
+def single_run(use_cache=True, cmd=None, save=True):
     """
     Executes a single run of the iperf3 test.
     This function performs the following steps:
@@ -18,42 +17,67 @@ def single_run():
     4. Executes the scenario commands and collects interval and summary statistics.
     5. Displays the summary statistics.
     6. Optionally saves the results to CSV and/or JSON files.
+    If the test fails on a port taken from port cache, ports are probed again and test re-run.
+
+    Args:
+        use_cache (bool, optional): use port cache when probing. Defaults to True.
+        cmd (str, optional): iperf3 command to run. Defaults to first prepared command.
+        save (bool, optional): save results, False when saved by a result sink. Defaults to True.
+
     Returns:
         tuple: A tuple containing interval statistics and summary statistics.
     """
+    base_cmd = cmd if cmd else common.data["commands"][0]
+    cmd = base_cmd
+    ports = common.data["port_list"]
+
     # run iperf3 probing
     if not args.obj.no_probe and not args.obj.dry_run:
-        free_ports = run_commands.probe_iperf3(
-            args.obj.host, common.data["port_list"], required_ports=1
+        ports = run_commands.probe_iperf3(
+            args.obj.host,
+            common.data["port_list"],
+            required_ports=placement.get_required_ports([cmd]),
+            use_cache=use_cache,
         )
 
-        cmd = common.data["commands"][0]
-        cmd = re.sub(r"-p\s+\d+\s", f"-p {free_ports[0]} ", cmd)
-    else:
-        cmd = common.data["commands"][0]
-
     scenario_cmds = {
-        f"ping {args.obj.host} -c {str(int(args.obj.time) + 4)} -D": 2,
-        cmd: 0.1,
+        run_commands.get_ping_cmd(args.obj.host, run_commands.get_cmd_duration(cmd) + 4): 2,
     }
+    # iperf3 processes - several with --split
+    for process_cmd in placement.place_cmds([cmd], ports):
+        scenario_cmds[process_cmd] = 0.1
     
     runtest_time = common.get_timestamp_now()
     
     interval_stats, summary_stats = run_iperf.run(scenario_cmds)
+
+    # not re-run when aborted - partial results kept
+    if common.data["failed_ports"] and common.data.get("ports_from_cache") and not summary_stats["aborted"]:
+        log.warning("test failed on port from cache - probe ports again")
+        return single_run(use_cache=False, cmd=base_cmd, save=save)
     
     summary_stats["description"] = args.obj.description
 
+    # saved once test is not re-run
+    if args.obj.db:
+        results_db.save_run("ST", list(scenario_cmds), summary_stats, interval_stats)
+
     output_operations.display_summary_stats(summary_stats)
     # Save all results after all iterations
-    if args.obj.csv:
+    if save and args.obj.csv:
         output_operations.save_to_CSV(
             f"{args.obj.test_name}ST", runtest_time, [summary_stats], [interval_stats]
         )
 
-    if args.obj.json:
+    if save and args.obj.json:
         output_operations.save_to_JSON(
             f"{args.obj.test_name}ST", runtest_time, [summary_stats], [interval_stats]
         )
+
+    if save and args.obj.parquet:
+        output_operations.save_to_parquet(
+            f"{args.obj.test_name}ST", runtest_time, [summary_stats], [interval_stats]
+        )
     
     return interval_stats, summary_stats
 
@@ -62,22 +86,30 @@ def single_run():
 def unidirectional_test():
     """main function to run single test"""
 
-    all_interval_stats = []
     all_summary_stats = []
     
     run_commands.cmd_preparation()
 
+    # results of each iteration saved as soon as done
+    sink = result_sink.new_sink(f"{args.obj.test_name}ST", args.obj.campaign)
+    step = "download" if args.obj.reverse else "upload"
+
     for i in range(args.obj.iterations):
+        completed = result_sink.get_completed(sink, i, step)
+        if completed:
+            log.info(f"iteration {i + 1} already completed - skipped")
+            all_summary_stats.append(completed)
+            continue
+
         if args.obj.iterations > 1:
             log.info(f"Running iteration {i + 1} of {args.obj.iterations}")
 
-        interval_stats, summary_stats = single_run()
+        interval_stats, summary_stats = single_run(save=False)
 
-        all_interval_stats.append(interval_stats)
-        all_summary_stats.append(summary_stats)
+        all_summary_stats.append(result_sink.append_run(sink, i, step, summary_stats, interval_stats))
 
         if i < args.obj.iterations - 1:
             log.info(f"Sleeping for {args.obj.sleep} seconds before next iteration")
             time.sleep(args.obj.sleep)
 
-    return all_interval_stats, all_summary_stats  
\ No newline at end of file
+    return all_summary_stats  
\ No newline at end of file
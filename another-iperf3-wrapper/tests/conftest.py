@@ -0,0 +1,29 @@
+"""wrapper run end to end with stand-in iperf3/ping of benchmarks/fake - no network nor iperf3 server"""
+import os
+import subprocess
+import sys
+
+import pytest
+
+TESTS_PATH = os.path.dirname(os.path.abspath(__file__))
+WRAPPER = os.path.join(TESTS_PATH, "..", "another-iperf3-wrapper.py")
+FAKE_PATH = os.path.join(TESTS_PATH, "..", "benchmarks", "fake")
+
+sys.path.insert(0, os.path.join(TESTS_PATH, ".."))
+
+
+@pytest.fixture
+def run_wrapper(tmp_path):
+    """run wrapper with results saved in tmp_path
+
+    Returns:
+        function: wrapper arguments, stand-in tools environment => subprocess.CompletedProcess
+    """
+
+    def run(wrapper_args, **fake_env):
+        env = dict(os.environ, PATH=f"{FAKE_PATH}{os.pathsep}{os.environ['PATH']}", HOME=str(tmp_path))
+        env.update({"FAKE_TIME_SCALE": "0", **fake_env})
+        cmd = [sys.executable, WRAPPER, "--no-probe", "--sleep", "0", "--result-dst-path", str(tmp_path)]
+        return subprocess.run(cmd + wrapper_args, cwd=tmp_path, env=env, capture_output=True, text=True, timeout=120)
+
+    return run
@@ -0,0 +1,17 @@
+def test_bufferbloat_aborted_on_ping_loss(run_wrapper):
+    result = run_wrapper(
+        ["-c", "192.0.2.1", "-p", "5201-5202", "-t", "5", "--abort-if", "ping_loss>50:2", "bufferbloat"],
+        FAKE_PING_LOSS="100",
+        FAKE_TIME_SCALE="0.1",
+    )
+
+    assert result.returncode == 0, result.stderr
+    assert "test aborted" in result.stdout
+    assert "bufferbloat grade not available" in result.stdout
+
+
+def test_bufferbloat_grade(run_wrapper):
+    result = run_wrapper(["-c", "192.0.2.1", "-p", "5201-5202", "-t", "2", "bufferbloat"])
+
+    assert result.returncode == 0, result.stderr
+    assert "bufferbloat grade: A+" in result.stdout
@@ -0,0 +1,27 @@
+REGRESSION_EXIT_CODE = 2
+
+TEST_ARGS = ["-c", "192.0.2.1", "-p", "5201-5202", "-t", "2", "--quiet"]
+
+
+def test_download_regression_in_all_campaign(run_wrapper, tmp_path):
+    db_args = ["--db", str(tmp_path / "results.db")]
+    for _ in range(6):
+        result = run_wrapper(db_args + TEST_ARGS + ["all"], FAKE_BITRATE="1e9")
+        assert result.returncode == 0, result.stderr
+    # upload step runs after download one - download regression must not be hidden by it
+    result = run_wrapper(db_args + TEST_ARGS + ["all"], FAKE_BITRATE="1e8")
+    assert result.returncode == 0, result.stderr
+
+    result = run_wrapper(db_args + ["compare", "--test-type", "ST", "--metric", "downstream", "--metric", "icmp_rtt"])
+    assert result.returncode == REGRESSION_EXIT_CODE, result.stdout
+    assert "ST all downstream downstream" in result.stdout
+
+
+def test_no_regression(run_wrapper, tmp_path):
+    db_args = ["--db", str(tmp_path / "results.db")]
+    for _ in range(6):
+        result = run_wrapper(db_args + TEST_ARGS, FAKE_BITRATE="1e9")
+        assert result.returncode == 0, result.stderr
+
+    result = run_wrapper(db_args + ["compare"])
+    assert result.returncode == 0, result.stderr
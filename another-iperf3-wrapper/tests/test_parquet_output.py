@@ -0,0 +1,37 @@
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+pq = pytest.importorskip("pyarrow.parquet")
+
+
+def read_summary(tmp_path, test_type):
+    """summary table of a test type in parquet dataset"""
+    files = list((tmp_path / "parquet" / "summary").glob(f"*/{test_type}_*.parquet"))
+    assert len(files) == 1
+    return pq.read_table(files[0])
+
+
+def test_sweep_parquet(run_wrapper, tmp_path):
+    result = run_wrapper(["-c", "192.0.2.1", "-t", "2", "-w", "64K,1M", "--parquet", "--quiet", "sweep"])
+    assert result.returncode == 0, result.stderr
+
+    summary = read_summary(tmp_path, "SWEEP")
+    assert summary.schema.field("-w").type == pa.string()
+    assert pa.types.is_timestamp(summary.schema.field("timestamp").type)
+    assert summary.schema.field("timestamp").type.tz == "UTC"
+    assert summary.schema.field("repetition").type == pa.int64()
+    assert summary.schema.field("upstream_bits_per_second").type == pa.float64()
+    assert summary.column("-w").to_pylist() == ["64K", "1M"]
+    assert summary.column("timestamp").null_count == 0
+
+
+def test_tune_parquet(run_wrapper, tmp_path):
+    result = run_wrapper(["-c", "192.0.2.1", "-t", "2", "--parquet", "--quiet", "tune", "--tune-range", "1-8"])
+    assert result.returncode == 0, result.stderr
+
+    summary = read_summary(tmp_path, "TUNE")
+    assert summary.schema.field("phase").type == pa.string()
+    assert summary.schema.field("-P").type == pa.string()
+    assert summary.schema.field("knee").type == pa.bool_()
+    assert "coarse" in summary.column("phase").to_pylist()
+    assert summary.column("knee").to_pylist().count(True) == 1
@@ -0,0 +1,47 @@
+import argparse
+import json
+import multiprocessing
+
+import pytest
+
+from utils import args, common, port_cache
+
+JOBS = 8
+PORTS_BY_JOB = 16
+
+
+@pytest.fixture
+def cache_file(tmp_path, monkeypatch):
+    cache_file = tmp_path / "port-cache.json"
+    monkeypatch.setattr(port_cache, "CACHE_FILE", str(cache_file))
+    monkeypatch.setattr(args, "obj", argparse.Namespace(probe_cache_ttl=600), raising=False)
+    common.data.pop("port_cache", None)
+    return cache_file
+
+
+def save_ports(job):
+    """scheduler job probing its own share of ports"""
+    common.data.pop("port_cache", None)
+    for port in range(job * PORTS_BY_JOB, (job + 1) * PORTS_BY_JOB):
+        port_cache.set_port_status("192.0.2.1", 5201 + port, "available")
+    port_cache.save_cache()
+
+
+def test_concurrent_saves_keep_all_entries(cache_file):
+    processes = [multiprocessing.get_context("fork").Process(target=save_ports, args=(job,)) for job in range(JOBS)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    assert len(json.loads(cache_file.read_text())) == JOBS * PORTS_BY_JOB
+    assert [f.name for f in cache_file.parent.glob("*.tmp")] == []
+
+
+def test_invalidated_entry_not_restored(cache_file):
+    port_cache.set_port_status("192.0.2.1", 5201, "available")
+    port_cache.save_cache()
+
+    port_cache.invalidate("192.0.2.1", 5201)
+
+    assert "192.0.2.1:5201" not in json.loads(cache_file.read_text())
@@ -0,0 +1,18 @@
+import csv
+
+
+def test_summary_header_grows(run_wrapper, tmp_path):
+    """ping rtt columns missing from first run - summary CSV rewritten with them when resumed"""
+    # result files are prefixed with --result-dst-path as is
+    args = ["--result-dst-path", f"{tmp_path}/", "-c", "192.0.2.1", "-p", "5201-5202", "-t", "2", "--csv", "--quiet"]
+    result = run_wrapper(args + ["--iterations", "1", "--campaign", "c1"], FAKE_PING_LOSS="100")
+    assert result.returncode == 0, result.stderr
+    result = run_wrapper(args + ["--iterations", "2", "--campaign", "c1"])
+    assert result.returncode == 0, result.stderr
+
+    with open(tmp_path / "ST_summary_c1.csv", newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert [row["iteration"] for row in rows] == ["0", "1"]
+    assert rows[0]["icmp_rtt_max"] == ""
+    assert float(rows[1]["icmp_rtt_max"]) > 0
+    assert float(rows[1]["upstream_bits_per_second"]) > 0
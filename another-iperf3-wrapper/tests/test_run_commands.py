@@ -0,0 +1,18 @@
+import pytest
+
+from utils import run_commands
+
+
+@pytest.mark.parametrize(
+    "value, expanded",
+    [
+        ("4", ["4"]),
+        ("1,4", ["1", "4"]),
+        # upper bound included, as port ranges
+        ("1-4", ["1", "2", "3", "4"]),
+        ("1-2,8", ["1", "2", "8"]),
+        ("64K", ["64K"]),
+    ],
+)
+def test_expand_cmds_args(value, expanded):
+    assert run_commands.expand_cmds_args({"-P": value}) == {"-P": expanded}
@@ -0,0 +1,17 @@
+ARGS = ["-c", "192.0.2.1", "-p", "5201-5204", "-t", "2", "-P", "4", "--split", "2"]
+
+
+def test_record_replay_split(run_wrapper, tmp_path):
+    """--split processes only differ by port - each one has its own recording"""
+    # result files are prefixed with --result-dst-path as is
+    dst_args = ["--result-dst-path", f"{tmp_path}/"]
+    result = run_wrapper(dst_args + ["--save-outputs", "--quiet"] + ARGS)
+    assert result.returncode == 0, result.stderr
+    recordings = sorted(path.name for path in tmp_path.glob("iperf3*.json") if not path.name.endswith(".timing.json"))
+    assert len(recordings) == 2
+    assert "_split1_" in recordings[1]
+
+    result = run_wrapper(dst_args + ["--runner", "replay", "--debug"] + ARGS)
+    assert result.returncode == 0, result.stderr
+    for recording in recordings:
+        assert f"replay of {tmp_path}/{recording}" in result.stdout
@@ -0,0 +1,41 @@
+import sys
+
+import pytest
+
+from utils import args
+from modules import scheduler
+
+
+@pytest.mark.parametrize(
+    "user_argv",
+    [
+        ["-c", "host-a,host-b", "-p", "5201-5210", "--iterations", "3", "--test-name", "lab"],
+        ["-chost-a,host-b", "-p5201-5210", "--iter", "3", "--test", "lab"],
+        ["-c=host-a,host-b", "--iterations=3", "--test-name=lab", "-p", "5201-5210"],
+    ],
+)
+def test_job_args_replaced(monkeypatch, user_argv):
+    monkeypatch.setattr(sys, "argv", ["another-iperf3-wrapper.py"] + user_argv + ["-t", "5", "sweep", "--repeat", "2"])
+    args.obj = args.arg_parse({})
+
+    argv = scheduler.get_job_argv("host-a", "5201,5203", 2, "lab-host-a")
+
+    assert argv[2:] == [
+        "-c", "host-a",
+        "-p", "5201,5203",
+        "--iterations", "2",
+        "--test-name", "lab-host-a",
+        "-t", "5", "sweep", "--repeat", "2",
+    ]
+
+
+def test_job_test_names(monkeypatch):
+    monkeypatch.setattr(
+        sys, "argv", ["another-iperf3-wrapper.py", "-c", "host-a", "-p", "5201-5204", "--iterations", "4",
+                      "--test-name", "lab", "--per-host-concurrency", "2"]
+    )
+    args.obj = args.arg_parse({})
+
+    jobs = scheduler.prepare_jobs(scheduler.get_hosts({}))
+
+    assert [job["argv"][job["argv"].index("--test-name") + 1] for job in jobs] == ["lab-host-a-0", "lab-host-a-1"]
@@ -0,0 +1,107 @@
+import logging
+import re
+
+from utils import common
+
+log = logging.getLogger("another-iperf3-wrapper")
+
+# metric => description - iperf3 metrics are evaluated on each interval for each direction
+ABORT_METRICS = {
+    "throughput": "interval throughput in bits per second",
+    "retransmits": "interval retransmits",
+    "rtt": "interval average streams rtt in ms",
+    "ping_rtt": "ping reply rtt in ms",
+    "ping_loss": "ping packet loss in % since start",
+}
+
+# Parse rule => throughput<10M:3
+ABORT_RULE_REGEX = re.compile(
+    r"^(?P<metric>[a-z_]+)\s*(?P<op>[<>])\s*(?P<value>[\d\.]+[kKmMgG]?)(?::(?P<count>\d+))?$"
+)
+
+
+def parse_rules(rules):
+    """parse abort rules - e.g. 'throughput<10M:3' abort after 3 consecutive intervals under 10 Mbps
+
+    Args:
+        rules (list): rules as string - metric, operator, value and optional consecutive count
+
+    Returns:
+        dict: abort state with rules parsed, None if no rule
+    """
+    if not rules:
+        return None
+
+    abort_state = {"rules": [], "reason": None, "terminated": False, "ping": {"received": 0, "last_seq": 0}}
+    for rule in rules:
+        match = ABORT_RULE_REGEX.match(rule.strip())
+        if not match or match.group("metric") not in ABORT_METRICS:
+            log.error(f"not a valid abort rule: {rule} - metrics: {', '.join(ABORT_METRICS)}")
+            exit(1)
+        abort_state["rules"].append(
+            {
+                "rule": rule,
+                "metric": match.group("metric"),
+                "op": match.group("op"),
+                "value": common.humanReadable_to_units(match.group("value"), base=1000),
+                "count": int(match.group("count") or 1),
+                # consecutive violations by direction
+                "violations": {},
+            }
+        )
+    log.debug(f"abort rules: {abort_state['rules']}")
+    return abort_state
+
+
+def check_rules(abort_state, metrics, key):
+    """evaluate rules on given metrics values and set abort reason if a rule is hit
+
+    Args:
+        abort_state (dict): abort state
+        metrics (dict): metric values
+        key (str): direction or ping - consecutive violations are counted by key
+    """
+    for rule in abort_state["rules"]:
+        value = metrics.get(rule["metric"])
+        if value is None:
+            continue
+
+        violated = value < rule["value"] if rule["op"] == "<" else value > rule["value"]
+        rule["violations"][key] = rule["violations"].get(key, 0) + 1 if violated else 0
+
+        if rule["violations"][key] >= rule["count"] and not abort_state["reason"]:
+            abort_state["reason"] = f"{rule['rule']} ({key}: {round(value, 3)})"
+
+
+def check_iperf3_interval(abort_state, direction, interval):
+    """evaluate rules on iperf3 interval
+
+    Args:
+        abort_state (dict): abort state
+        direction (str): downstream|upstream
+        interval (dict): iperf3 interval with sum and streams
+    """
+    streams_rtt = [s["rtt"] / 1000 for s in interval["streams"] if s.get("rtt", False)]
+    metrics = {
+        "throughput": interval["sum"]["bits_per_second"],
+        "retransmits": interval["sum"].get("retransmits"),
+        "rtt": sum(streams_rtt) / len(streams_rtt) if streams_rtt else None,
+    }
+    check_rules(abort_state, metrics, direction)
+
+
+def check_ping(abort_state, pckt_stats):
+    """evaluate rules on ping packet record - loss is estimated from icmp_seq gaps
+
+    Args:
+        abort_state (dict): abort state
+        pckt_stats (dict): packet record parsed from ping output
+    """
+    ping = abort_state["ping"]
+    ping["last_seq"] = max(ping["last_seq"], int(pckt_stats["icmp_seq"]))
+    metrics = {}
+    if pckt_stats.get("icmp_time"):
+        ping["received"] += 1
+        metrics["ping_rtt"] = float(pckt_stats["icmp_time"])
+    metrics["ping_loss"] = (ping["last_seq"] - ping["received"]) / ping["last_seq"] * 100
+    check_rules(abort_state, metrics, "ping")
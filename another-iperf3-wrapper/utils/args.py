@@ -1,10 +1,16 @@
 import argparse
 
+from utils import results_db
+
 obj = object()
 
+# main parser - used by scheduler to rebuild job command lines
+parser = None
+
 
 def arg_parse(config_default):
     """main argument parser"""
+    global parser
 
     text_description = """
 Wrapper to expand iperf3 capabilities 
@@ -36,7 +42,7 @@ Wrapper to expand iperf3 capabilities
         type=str,
         default=config_default.get("host", ""),
         required=False,
-        help="connecting to <host>, if multiple will launch",
+        help="connecting to <host>, if multiple (comma separated) will launch a job for each host",
     )
 
     parser.add_argument(
@@ -100,6 +106,16 @@ Wrapper to expand iperf3 capabilities
         ),
     )
 
+    parser.add_argument(
+        "-w",
+        "--window",
+        dest="window",
+        action="store",
+        default=config_default.get("window", False),
+        required=False,
+        help="window size / socket buffer size",
+    )
+
     parser.add_argument(
         "-A",
         "--iperf3-args",
@@ -114,6 +130,114 @@ Wrapper to expand iperf3 capabilities
         ),
     )
 
+    parser.add_argument(
+        "--split",
+        dest="split",
+        action="store",
+        type=int,
+        default=config_default.get("split", 1),
+        required=False,
+        help="run -P streams of each direction across N iperf3 processes, each on its own port,\n"
+        "results merged into one (default 1)",
+    )
+
+    parser.add_argument(
+        "--cpu-affinity",
+        dest="cpu_affinity",
+        action="store",
+        type=str,
+        default=config_default.get("cpu_affinity", None),
+        required=False,
+        help="pin iperf3 processes in turn to cpus with iperf3 -A, e.g. 0-3,8\n"
+        "or to cpus of NUMA nodes, e.g. node:0,1",
+    )
+
+    parser.add_argument(
+        "--json-stream",
+        dest="json_stream",
+        action="store_true",
+        required=False,
+        help="run iperf3 with --json-stream (iperf3 >= 3.17) and process intervals as they come",
+    )
+
+    parser.add_argument(
+        "--live",
+        dest="live",
+        action="store_true",
+        required=False,
+        help="display live stats while running (iperf3 run with --json-stream)",
+    )
+
+    parser.add_argument(
+        "--abort-if",
+        dest="abort_if",
+        action="append",
+        default=config_default.get("abort_if", []),
+        required=False,
+        help=(
+            "abort test when rule is hit on live data, can be repeated (iperf3 run with --json-stream)\n"
+            "<metric><|><value>[:<consecutive count>] e.g. throughput<10M:3 ping_loss>5 retransmits>100\n"
+            "metrics: throughput, retransmits, rtt (ms), ping_rtt (ms), ping_loss (%%)"
+        ),
+    )
+
+    parser.add_argument(
+        "--report-interval",
+        dest="report_interval",
+        action="store",
+        type=float,
+        default=config_default.get("report_interval", None),
+        required=False,
+        help="seconds between iperf3 interval reports (iperf3 -i), e.g. 0.1 for sub-second intervals",
+    )
+
+    parser.add_argument(
+        "--resample",
+        dest="resample",
+        action="store",
+        type=float,
+        default=config_default.get("resample", None),
+        required=False,
+        help=(
+            "resample interval stats of CSV/JSON on a grid of given seconds (e.g. 0.1)\n"
+            "columns are aggregated (mean, max, min, sum) instead of one sample by rounded second"
+        ),
+    )
+
+    parser.add_argument(
+        "--latency-prober",
+        dest="latency_prober",
+        action="store",
+        choices=["ping", "native"],
+        default=config_default.get("latency_prober", "ping"),
+        required=False,
+        help=(
+            "latency measurement during tests (default ping)\n"
+            "ping: system ping command\n"
+            "native: in-process ICMP datagram socket (net.ipv4.ping_group_range), UDP echo if not permitted"
+        ),
+    )
+
+    parser.add_argument(
+        "--ping-interval",
+        dest="ping_interval",
+        action="store",
+        type=float,
+        default=config_default.get("ping_interval", 1),
+        required=False,
+        help="seconds between latency probes, below 0.2 requires root with ping (default 1)",
+    )
+
+    parser.add_argument(
+        "--udp-echo-port",
+        dest="udp_echo_port",
+        action="store",
+        type=int,
+        default=config_default.get("udp_echo_port", 7),
+        required=False,
+        help="UDP echo service port used by native latency prober when ICMP not permitted (default 7)",
+    )
+
     parser.add_argument(
         "--no-probe",
         dest="no_probe",
@@ -122,6 +246,70 @@ Wrapper to expand iperf3 capabilities
         help="no probe",
     )
 
+    parser.add_argument(
+        "--probe-workers",
+        dest="probe_workers",
+        action="store",
+        type=int,
+        default=config_default.get("probe_workers", 8),
+        required=False,
+        help="maximum amount of ports probed in parallel (default 8)",
+    )
+
+    parser.add_argument(
+        "--probe-mode",
+        dest="probe_mode",
+        action="store",
+        choices=["tcp", "control", "full"],
+        default=config_default.get("probe_mode", "control"),
+        required=False,
+        help=(
+            "how ports are probed (default control)\n"
+            "tcp: TCP connect only\n"
+            "control: TCP connect + iperf3 handshake to detect busy server\n"
+            "full: control + 1 second iperf3 run"
+        ),
+    )
+
+    parser.add_argument(
+        "--probe-cache-ttl",
+        dest="probe_cache_ttl",
+        action="store",
+        type=float,
+        default=config_default.get("probe_cache_ttl", 300),
+        required=False,
+        help="seconds a probe result is reused from port cache, 0 to disable (default 300)",
+    )
+
+    parser.add_argument(
+        "--server-pool",
+        dest="server_pool",
+        action="store",
+        type=str,
+        default=config_default.get("server_pool", None),
+        help="address:port of a server pool (server command) giving free ports instead of probing",
+    )
+
+    parser.add_argument(
+        "--max-hosts",
+        dest="max_hosts",
+        action="store",
+        type=int,
+        default=config_default.get("max_hosts", 4),
+        required=False,
+        help="maximum amount of jobs running at once when several hosts (default 4)",
+    )
+
+    parser.add_argument(
+        "--per-host-concurrency",
+        dest="per_host_concurrency",
+        action="store",
+        type=int,
+        default=config_default.get("per_host_concurrency", 1),
+        required=False,
+        help="maximum amount of jobs running at once on the same host, each with its own port pool (default 1)",
+    )
+
     parser.add_argument(
         "--csv",
         dest="csv",
@@ -136,6 +324,24 @@ Wrapper to expand iperf3 capabilities
         help="generate a json file with data",
     )
 
+    parser.add_argument(
+        "--parquet",
+        dest="parquet",
+        action="store_true",
+        help="append data to a parquet dataset partitioned by host (requires pyarrow)",
+    )
+
+    parser.add_argument(
+        "--db",
+        dest="db",
+        action="store",
+        nargs="?",
+        const="~/.config/another-iperf3-wrapper/results.db",
+        default=config_default.get("db", None),
+        help="store summary, interval stats and commands of each run in a SQLite database\n"
+        "(default: ~/.config/another-iperf3-wrapper/results.db)",
+    )
+
     parser.add_argument(
         "-i",
         "--input_file",
@@ -151,7 +357,7 @@ Wrapper to expand iperf3 capabilities
         action="store",
         type=int,
         default=30,
-        help="timeout",
+        help="timeout in seconds added to expected command duration before terminating it (default 30)",
     )
 
     parser.add_argument(
@@ -176,7 +382,56 @@ Wrapper to expand iperf3 capabilities
         "--save-outputs",
         dest="save_outputs",
         action="store_true",
-        help="save raw output from commands",
+        help="save raw output from commands with timing, replayed with --runner replay\n"
+        "(record runner)",
+    )
+
+    parser.add_argument(
+        "--runner",
+        dest="runner",
+        action="store",
+        choices=["local", "record", "replay", "ssh"],
+        default="local",
+        help="how commands are run (default: local)\n"
+        "record: run and save outputs in result_dst_path as --save-outputs\n"
+        "replay: serve outputs saved in result_dst_path instead of running commands\n"
+        "ssh: run on --ssh-client host, outputs streamed back",
+    )
+
+    parser.add_argument(
+        "--ssh-client",
+        dest="ssh_client",
+        action="store",
+        type=str,
+        default=config_default.get("ssh_client", None),
+        help="[user@]host running iperf3 and ping commands with --runner ssh (e.g. a remote site)",
+    )
+
+    parser.add_argument(
+        "--ssh-server",
+        dest="ssh_server",
+        action="store",
+        nargs="?",
+        const="",
+        default=config_default.get("ssh_server", None),
+        help="start iperf3 -s over ssh on ports of -p not already listening, stopped at exit\n"
+        "[user@]host running servers (default: tested host)",
+    )
+
+    parser.add_argument(
+        "--ssh-persist",
+        dest="ssh_persist",
+        action="store",
+        type=int,
+        default=config_default.get("ssh_persist", 600),
+        help="seconds an idle ssh connection is kept open for next commands and runs (default: 600)",
+    )
+
+    parser.add_argument(
+        "--replay-timing",
+        dest="replay_timing",
+        action="store_true",
+        help="replay outputs with recorded timing instead of full speed",
     )
 
     parser.add_argument(
@@ -225,6 +480,18 @@ Wrapper to expand iperf3 capabilities
         help="how many iterations to run (default: 1)",
     )
     
+    parser.add_argument(
+        "--campaign",
+        dest="campaign",
+        action="store",
+        type=str,
+        default=None,
+        help=(
+            "campaign name used in result filenames instead of run time\n"
+            "results are appended as each iteration completes, re-run with same name to resume an interrupted campaign"
+        ),
+    )
+
     parser.add_argument(
         "--sleep",
         dest="sleep",
@@ -249,6 +516,220 @@ Wrapper to expand iperf3 capabilities
         help="run all tests\n ",
     )
 
+    #
+    # parameter sweep
+    parser_sweep = subparsers.add_parser(
+        "sweep",
+        help="run iperf3 test for every combination of given ranges and lists\n"
+        "(e.g. -P 1,4,8 -w 64K,256K)\n ",
+    )
+
+    parser_sweep.add_argument(
+        "--shuffle",
+        dest="shuffle",
+        action="store_true",
+        help="run combinations in random order",
+    )
+
+    parser_sweep.add_argument(
+        "--repeat",
+        dest="repeat",
+        action="store",
+        type=int,
+        default=1,
+        help="how many times each combination is run (default: 1)",
+    )
+
+    #
+    # adaptive search of optimal value
+    parser_tune = subparsers.add_parser(
+        "tune",
+        help="search value of -P (or -w/-b) where throughput stops increasing\n ",
+    )
+
+    parser_tune.add_argument(
+        "--tune-arg",
+        dest="tune_arg",
+        action="store",
+        choices=["-P", "-w", "-b"],
+        default="-P",
+        help="iperf3 argument to tune (default: -P)",
+    )
+
+    parser_tune.add_argument(
+        "--tune-range",
+        dest="tune_range",
+        action="store",
+        type=str,
+        default="1-128",
+        help="search range, unit suffix allowed for -w/-b e.g. 64K-16M (default: 1-128)",
+    )
+
+    parser_tune.add_argument(
+        "--tune-threshold",
+        dest="tune_threshold",
+        action="store",
+        type=float,
+        default=0.05,
+        help="relative throughput gain below which search stops (default: 0.05)",
+    )
+
+    #
+    # query results database
+    parser_history = subparsers.add_parser(
+        "history",
+        help="show stats of runs stored in results database (--db)\n"
+        "(e.g. downstream p50/p95 by host over the last 30 days)\n ",
+    )
+
+    parser_history.add_argument(
+        "--metric",
+        dest="metric",
+        action="store",
+        choices=list(results_db.HISTORY_METRICS),
+        default="downstream",
+        help="summary stat to show (default: downstream)",
+    )
+
+    parser_history.add_argument(
+        "--days",
+        dest="days",
+        action="store",
+        type=float,
+        default=30,
+        help="only runs of the last days (default: 30)",
+    )
+
+    parser_history.add_argument(
+        "--test-type",
+        dest="test_type",
+        action="store",
+        choices=["ST", "BBT"],
+        default=None,
+        help="only runs of this test type (default: all)",
+    )
+
+    #
+    # regression detection against results database
+    parser_compare = subparsers.add_parser(
+        "compare",
+        help="compare latest run of each host, test and direction to baseline of previous runs\n"
+        "stored in results database (--db), exit code 2 if a regression is detected\n ",
+    )
+
+    parser_compare.add_argument(
+        "--metric",
+        dest="metric",
+        action="append",
+        choices=list(results_db.HISTORY_METRICS),
+        default=None,
+        help="summary stat to compare, repeat for several (default: downstream, icmp_rtt, latency_increase)",
+    )
+
+    parser_compare.add_argument(
+        "--days",
+        dest="days",
+        action="store",
+        type=float,
+        default=30,
+        help="baseline from runs of the last days (default: 30)",
+    )
+
+    parser_compare.add_argument(
+        "--test-type",
+        dest="test_type",
+        action="store",
+        choices=["ST", "BBT"],
+        default=None,
+        help="only runs of this test type (default: all)",
+    )
+
+    parser_compare.add_argument(
+        "--threshold",
+        dest="threshold",
+        action="store",
+        type=float,
+        default=3.0,
+        help="robust z-score (deviation from median in MAD) above which a run is a regression (default: 3)",
+    )
+
+    parser_compare.add_argument(
+        "--min-runs",
+        dest="min_runs",
+        action="store",
+        type=int,
+        default=5,
+        help="minimum runs in baseline to compare (default: 5)",
+    )
+
+    #
+    # measurement agent
+    parser_serve = subparsers.add_parser(
+        "serve",
+        help="run tests every interval and expose results on a prometheus /metrics endpoint\n ",
+    )
+
+    parser_serve.add_argument(
+        "--listen",
+        dest="listen",
+        action="store",
+        type=str,
+        default=config_default.get("listen", "127.0.0.1:9237"),
+        help="address:port of /metrics endpoint (default: 127.0.0.1:9237)",
+    )
+
+    parser_serve.add_argument(
+        "--interval",
+        dest="interval",
+        action="store",
+        type=float,
+        default=config_default.get("interval", 300),
+        help="seconds between start of runs (default: 300)",
+    )
+
+    parser_serve.add_argument(
+        "--suite",
+        dest="suite",
+        action="append",
+        choices=["unidirectional", "bufferbloat"],
+        default=None,
+        help="test to run, repeat for several (default: unidirectional and bufferbloat)",
+    )
+
+    parser_serve.add_argument(
+        "--ring-size",
+        dest="ring_size",
+        action="store",
+        type=int,
+        default=288,
+        help="recent runs kept in memory for quantiles (default: 288)",
+    )
+
+    #
+    # iperf3 server pool
+    parser_server = subparsers.add_parser(
+        "server",
+        help="run and supervise iperf3 -s on ports of -p, free/busy state exposed for --server-pool\n ",
+    )
+
+    parser_server.add_argument(
+        "--listen",
+        dest="listen",
+        action="store",
+        type=str,
+        default=config_default.get("pool_listen", "127.0.0.1:9238"),
+        help="address:port of /ports endpoint (default: 127.0.0.1:9238)",
+    )
+
+    parser_server.add_argument(
+        "--cpus",
+        dest="cpus",
+        action="store",
+        type=str,
+        default=config_default.get("cpus", None),
+        help="cpus workers are pinned to in turn, e.g. 0-3,8 or none (default: cpus available)",
+    )
+
     #
     # bufferbloat test with
     parser_probe = subparsers.add_parser(
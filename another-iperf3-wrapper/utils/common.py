@@ -25,17 +25,6 @@ def get_timestamp_now(fmt="%Y%m%d-%H%M%S"):
     return datetime.datetime.now().strftime(fmt)
 
 
-def save_outputs(filename, output):
-    """save output from process into filename
-
-    Args:
-        filename (str): target filename with full path
-        output (str): content to save
-    """
-    with open(expanduser(filename), "a") as f:
-        f.write(output)
-
-
 def fill_dict(keys, dict):
     """copy key/values from a dict and add empty entries if keys not present
 
@@ -70,6 +59,21 @@ def save_CSV(dst_filename, header, csv_content):
         dict_writer.writerows(csv_content)
         log.debug(f"CSV saved in {dst_filename}")
 
+def save_CSV_rows(dst_filename, header, rows):
+    """save into CSV file rows given by an iterable, written one by one
+
+    Args:
+        dst_filename (str): CSV file destination
+        header (list): list of keys to be saved
+        rows (iterable): lists of values ordered as header
+    """
+    with open(expanduser(dst_filename), "w", newline="") as output_file:
+        writer = csv.writer(output_file)
+        writer.writerow(header)
+        writer.writerows(rows)
+        log.debug(f"CSV saved in {dst_filename}")
+
+
 def save_JSON(dst_filename, json_content):
     """save into JSON file
 
@@ -108,6 +112,27 @@ def units_to_humanReadable(bps):
         return False
 
 
+def humanReadable_to_units(value, base=1024):
+    """convert iperf3 value with optional unit suffix to number (e.g. 64K, 10M, 1G)
+
+    Args:
+        value (str): value with optional K/M/G/T suffix
+        base (int, optional): 1024 for sizes, 1000 for rates. Defaults to 1024.
+
+    Returns:
+        float: value or None if not a number
+    """
+    unit_multiplier = {"k": base, "m": base**2, "g": base**3, "t": base**4}
+    value = str(value).strip()
+    multiplier = unit_multiplier.get(value[-1:].lower(), 1)
+    if multiplier > 1:
+        value = value[:-1]
+    try:
+        return float(value) * multiplier
+    except ValueError:
+        return None
+
+
 def calculate_tput_BDP(buffer_size, latency):
     """return max throughtput achievable with given buffer size and latency
 
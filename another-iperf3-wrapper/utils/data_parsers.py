@@ -9,42 +9,140 @@ from rich.console import Console
 from rich.table import Table
 from rich import box
 
-from utils import args, common, output_operations
+from utils import args, output_operations, run_commands, interval_store
 
 log = logging.getLogger("another-iperf3-wrapper")
 
 
-def parse_ping_output(output):
-    """parse pint output with regex
+# Parse lines =>
+# [1645533781.102614] 64 bytes from 172.16.1.238: icmp_seq=1 ttl=60 time=7.36 ms
+# [1645533781.102614] 64 bytes from 2001:db8::1: icmp_seq=1 ttl=60 time=7.36 ms
+# [1645533781.102614] 64 bytes from host.example (2001:db8::1): icmp_seq=1 ttl=60 time=7.36 ms
+PING_REPLY_REGEX = re.compile(
+    r"\[(?P<unix_time>\d+\.\d+)\]\s\d+\sbytes\sfrom\s(?P<target_host>\S+?)(?:\s\((?P<target_ip>[^)]+)\))?:"
+    r"\sicmp_seq=(?P<icmp_seq>\d+)\s(?:ttl|hlim)=(?P<icmp_ttl>\d+)\stime=(?P<icmp_time>[\d\.]+)\sms"
+)
+
+# Parse line (ping -O) => [1645533781.102614] no answer yet for icmp_seq=4
+PING_NO_ANSWER_REGEX = re.compile(
+    r"\[(?P<unix_time>\d+\.\d+)\]\sno\sanswer\syet\sfor\sicmp_seq=(?P<icmp_seq>\d+)"
+)
+
+# Parse line => 15 packets transmitted, 15 received, 0% packet loss, time 14021ms
+# Parse line => 15 packets transmitted, 10 received, +5 errors, 33.3333% packet loss, time 14021ms
+PING_STATS_REGEX = re.compile(
+    r"(?P<pckts_tx>\d+) packets transmitted, (?P<pckts_rx>\d+) received,(?: \+\d+ errors,)?"
+    r" (?P<pckts_loss_perc>[\d\.]+)% packet loss, time (?P<time>\d+)ms"
+)
+
+# Parse line => rtt min/avg/max/mdev = 7.360/16.159/31.052/9.404 ms
+PING_RTT_REGEX = re.compile(
+    r"rtt min/avg/max/mdev = (?P<rtt_min>[\d\.]+)/(?P<rtt_avg>[\d\.]+)/(?P<rtt_max>[\d\.]+)/(?P<rtt_mdev>[\d\.]+) ms"
+)
+
+# socket ids of merged iperf3 processes offset by process index - unique across processes
+MERGED_SOCKET_OFFSET = 1000
+
+# iperf3 sum keys added up when processes are merged
+MERGED_SUM_KEYS = ["bytes", "bits_per_second", "retransmits", "lost_packets", "packets"]
+
+
+def new_ping_stream(interval_stats=None):
+    """initialize state to parse ping output line by line
+
     Args:
-        output (str): text to parse
+        interval_stats (dict, optional): interval store filled with replies as they come,
+            if None replies are kept in pckts_stats. Defaults to None.
 
     Returns:
-        dict: parsed data (stats and pckts_stats) in dict
+        dict: ping stream state - with same keys as parsed ping output
+    """
+    return {
+        "stats": {},
+        "pckts_stats": [],
+        "no_answer": 0,
+        "interval_stats": interval_stats,
+    }
+
+
+def parse_ping_stream_line(stream, line):
+    """parse one line of ping output and aggregate it
+
+    Args:
+        stream (dict): ping stream state from new_ping_stream
+        line (str): line to parse
+
+    Returns:
+        dict: packet record (without icmp_time when no answer) or None
     """
-    stats = {}
+    if line.startswith("{"):
+        return parse_latency_prober_record(stream, json.loads(line))
+
+    match = PING_REPLY_REGEX.search(line)
+    if match:
+        pckt_stats = match.groupdict()
+        if pckt_stats["target_ip"] is None:
+            del pckt_stats["target_ip"]
+        if stream["interval_stats"] is None:
+            stream["pckts_stats"].append(pckt_stats)
+        else:
+            interval_store.add_ping_reply(stream["interval_stats"], pckt_stats)
+        return pckt_stats
+
+    match = PING_NO_ANSWER_REGEX.search(line)
+    if match:
+        stream["no_answer"] += 1
+        return match.groupdict()
+
+    for regex in [PING_STATS_REGEX, PING_RTT_REGEX]:
+        match = regex.search(line)
+        if match:
+            stream["stats"].update(match.groupdict())
+    return None
+
+
+def parse_latency_prober_record(stream, record):
+    """aggregate record from native latency prober - same as ping output line
 
-    # Parse line => 15 packets transmitted, 15 received, 0% packet loss, time 14021ms
-    regex = r"(?P<pckts_tx>\d+) packets transmitted, (?P<pckts_rx>\d+) received, (?P<pckts_loss_perc>[\d\.]+)% packet loss, time (?P<time>\d+)ms"
-    parsed_data = parse_text_to_list(regex, output)
-    stats.update(parsed_data[0])
+    Args:
+        stream (dict): ping stream state from new_ping_stream
+        record (dict): record from latency prober
 
-    # Parse line => rtt min/avg/max/mdev = 7.360/16.159/31.052/9.404 ms
-    regex = r"rtt min/avg/max/mdev = (?P<rtt_min>[\d\.]+)/(?P<rtt_avg>[\d\.]+)/(?P<rtt_max>[\d\.]+)/(?P<rtt_mdev>[\d\.]+) ms"
-    parsed_data = parse_text_to_list(regex, output)
-    stats.update(parsed_data[0])
+    Returns:
+        dict: packet record (without icmp_time when no answer) or None
+    """
+    if "stats" in record:
+        stream["stats"].update(record["stats"])
+        return None
 
-    # Parse lines =>
-    # [1645533781.102614] 64 bytes from 172.16.1.238: icmp_seq=1 ttl=60 time=7.36 ms
-    # [1645533782.109318] 64 bytes from 172.16.1.238: icmp_seq=2 ttl=60 time=12.3 ms
-    # [1645533783.107913] 64 bytes from 172.16.1.238: icmp_seq=3 ttl=60 time=9.35 ms
-    #
+    if record.get("no_answer"):
+        stream["no_answer"] += 1
+        return record
 
-    # TODO : support ipv6
-    regex = r"\[(?P<unix_time>\d+\.\d+)\]\s\d+\sbytes\sfrom\s(?P<target_host>([\d\.]+)):\sicmp_seq=(?P<icmp_seq>\d+)\sttl=(?P<icmp_ttl>\d+)\stime=(?P<icmp_time>([\d\.]+))\sms"
-    pckts_stats = parse_text_to_list(regex, output)
+    if stream["interval_stats"] is None:
+        stream["pckts_stats"].append(record)
+    else:
+        interval_store.add_ping_reply(stream["interval_stats"], record)
+    return record
 
-    ping_results = {"stats": stats, "pckts_stats": pckts_stats}
+
+def parse_ping_output(output):
+    """parse ping output with regex
+    Args:
+        output (str): text to parse
+
+    Returns:
+        dict: parsed data (stats and pckts_stats) in dict
+    """
+    stream = new_ping_stream()
+    for line in output.splitlines():
+        parse_ping_stream_line(stream, line)
+
+    ping_results = {
+        "stats": stream["stats"],
+        "pckts_stats": stream["pckts_stats"],
+        "no_answer": stream["no_answer"],
+    }
     return ping_results
 
 
@@ -70,17 +168,29 @@ def parse_text_to_list(regex, text):
     return matches_list
 
 
-def parse_output_commands(output_commands):
+def parse_output_commands(output_commands, streams=None):
     """parse output commands
 
     Args:
         output_commands (dict): contain RAW command outputs
+        streams (dict, optional): iperf3 or ping stream state by command for outputs
+            already parsed line by line. Defaults to None.
 
     Returns:
         dict: output_commands with parsed data
     """
+    streams = streams or {}
     for cmd, output in output_commands.items():
-        if "iperf3" in cmd:
+        if cmd in streams:
+            output_commands[cmd] = {
+                "raw": output,
+                "output_parsed": streams[cmd],
+                "type": run_commands.get_cmd_type(cmd),
+                "ext": "json" if run_commands.get_cmd_type(cmd) == "iperf3" else "log",
+                "streamed": True,
+            }
+
+        elif run_commands.get_cmd_type(cmd) == "iperf3":
             output_commands[cmd] = {
                 "raw": output,
                 "output_parsed": json.loads(output),
@@ -88,7 +198,7 @@ def parse_output_commands(output_commands):
                 "ext": "json",
             }
 
-        elif "ping" in cmd:
+        elif run_commands.get_cmd_type(cmd) == "ping":
             output_commands[cmd] = {
                 "raw": output,
                 "output_parsed": parse_ping_output(output),
@@ -146,97 +256,260 @@ def parse_iperf3_intervals(output_commands):
     }
 
 
-def convert_streams_list_to_dict(interval_stats):
-    """convert list of stream in iperf3 output to dict
+def add_iperf3_results(interval_stats, stream_direction, output_parsed):
+    """add iperf3 intervals into interval store
 
     Args:
-        interval_stats (dict): stats from interval
+        interval_stats (dict): interval store
+        stream_direction (str): stream direction
+        output_parsed (dict): iperf3 output parsed
 
     Returns:
-        dict: stats from interval with stream with new format
+        dict: interval store
     """
 
-    for timestamp, stats_per_ts in interval_stats.items():
-        if stats_per_ts.get("streams", False):
-            for stream_type, stream_type_stats in stats_per_ts["streams"].items():
-                streams_dict = {}
-                for id, stream in enumerate(stream_type_stats):
-                    streams_dict[str(id)] = stream
+    start_ts = output_parsed["start"]["timestamp"]["timesecs"]
+
+    for interval in output_parsed["intervals"]:
+        interval_store.add_iperf3_interval(interval_stats, stream_direction, start_ts, interval)
 
-                interval_stats[timestamp]["streams"][stream_type] = streams_dict
     return interval_stats
 
 
-def set_iperf3_results_by_timestamp(interval_stats, stream_direction, output_parsed):
-    """reorganize iperf3 results by timestamp
+def get_stream_direction(output_parsed):
+    """return stream direction of iperf3 test
 
     Args:
-        interval_stats (dict): stats from interval
-        stream_direction (str): stream direction
         output_parsed (dict): iperf3 output parsed
 
     Returns:
-        dict: stats from interval
+        str: downstream|upstream
     """
+    return (
+        "downstream"
+        if output_parsed["start"]["test_start"]["reverse"] == 1
+        else "upstream"
+    )
 
-    start_ts = output_parsed["start"]["timestamp"]["timesecs"]
 
-    stats_type = ["sum", "streams"]
+def new_iperf3_group(interval_stats, size):
+    """initialize state merging intervals of iperf3 processes of a same direction (--split)
 
-    for interval in output_parsed["intervals"]:
-        timestamp = start_ts + int(round(interval["sum"]["start"], 0))
+    Args:
+        interval_stats (dict): interval store - filled with merged intervals
+        size (int): amount of processes
 
-        for stat_type in stats_type:
+    Returns:
+        dict: group state
+    """
+    return {
+        "interval_stats": interval_stats,
+        "size": size,
+        "members": [],
+        # interval index => interval by member
+        "pending": {},
+    }
 
-            if not interval_stats.get(timestamp, False):
-                interval_stats[timestamp] = {}
 
-            if not interval_stats[timestamp].get(stat_type, False):
-                interval_stats[timestamp][stat_type] = {}
+def new_iperf3_stream(interval_stats, group=None):
+    """initialize state to parse iperf3 --json-stream output line by line
 
-            if not interval_stats[timestamp][stat_type].get(stream_direction, False):
-                interval_stats[timestamp][stat_type][stream_direction] = {}
+    Args:
+        interval_stats (dict): interval store shared with other commands - filled as intervals come
+        group (dict, optional): group state when intervals are merged with other processes. Defaults to None.
 
-            interval_stats[timestamp][stat_type][stream_direction] = interval[stat_type]
+    Returns:
+        dict: iperf3 stream state - with same keys as iperf3 output parsed
+    """
+    stream = {
+        "start": {},
+        "end": {},
+        "intervals": [],
+        "interval_stats": interval_stats,
+        "intervals_count": 0,
+        "group": group,
+        "member": len(group["members"]) if group else None,
+    }
+    if group:
+        group["members"].append(stream)
+    return stream
 
-    return interval_stats
 
+def add_group_interval(stream, interval):
+    """add interval of a group member - merged into interval store once received from every member
 
-def prepare_iperf3_interval_results_for_CSV(interval_stats):
-    """save iperf3 interval results into CSV
+    Intervals not received from every member (process interrupted) are dropped.
 
     Args:
-        interval_stats (dict): stats from interval
+        stream (dict): iperf3 stream state of member
+        interval (dict): iperf3 interval
+
+    Returns:
+        dict: merged interval or None while waiting for other members
     """
+    group = stream["group"]
+    pending = group["pending"].setdefault(stream["intervals_count"], {})
+    pending[stream["member"]] = interval
+    if len(pending) < group["size"]:
+        return None
 
-    interval_stats = convert_streams_list_to_dict(interval_stats)
+    del group["pending"][stream["intervals_count"]]
+    merged = merge_iperf3_intervals([pending[member] for member in range(group["size"])])
+    start_ts = min(member["start"]["timestamp"]["timesecs"] for member in group["members"])
+    interval_store.add_iperf3_interval(group["interval_stats"], get_stream_direction(stream), start_ts, merged)
+    return merged
 
-    # Prepare data to save in CSV
-    timestamps_sorted = list(sorted(interval_stats.keys()))
 
-    CSV_content = []
-    for timestamp in timestamps_sorted:
-        CSV_line = {
-            "timestamp": datetime.datetime.fromtimestamp(timestamp).strftime(
-                "%Y-%m-%d %H:%M:%S"
-            )
+def parse_iperf3_stream_line(stream, line):
+    """parse one line of iperf3 --json-stream output and aggregate it
+
+    Intervals are added in interval store as they come and not kept.
+
+    Args:
+        stream (dict): iperf3 stream state from new_iperf3_stream
+        line (str): json line with event and data
+
+    Returns:
+        dict: event parsed or None
+    """
+    if not line.strip():
+        return None
+    try:
+        event = json.loads(line)
+    except ValueError:
+        log.debug(f"not a json line: {line}")
+        return None
+
+    if event["event"] == "start":
+        stream["start"] = event["data"]
+    elif event["event"] == "interval" and stream["start"] and stream["group"]:
+        stream["intervals_count"] += 1
+        merged = add_group_interval(stream, event["data"])
+        # merged interval of all processes as event
+        event = {"event": "interval", "data": merged} if merged else None
+    elif event["event"] == "interval" and stream["start"]:
+        interval_store.add_iperf3_interval(
+            stream["interval_stats"],
+            get_stream_direction(stream),
+            stream["start"]["timestamp"]["timesecs"],
+            event["data"],
+        )
+        stream["intervals_count"] += 1
+    elif event["event"] == "end":
+        stream["end"] = event["data"]
+    elif event["event"] == "error":
+        stream["error"] = event["data"]
+    return event
+
+
+def offset_sockets(streams, offset):
+    """copy of iperf3 streams with socket ids offset - sender/receiver/udp of end streams included
+
+    Args:
+        streams (list): iperf3 streams
+        offset (int): added to socket ids
+
+    Returns:
+        list: streams
+    """
+    streams_offset = []
+    for stream in streams:
+        stream = dict(stream)
+        if "socket" in stream:
+            stream["socket"] += offset
+        for key in ["sender", "receiver", "udp"]:
+            if isinstance(stream.get(key), dict) and "socket" in stream[key]:
+                stream[key] = dict(stream[key], socket=stream[key]["socket"] + offset)
+        streams_offset.append(stream)
+    return streams_offset
+
+
+def merge_iperf3_sums(sums):
+    """merge sums of iperf3 processes - counters and throughput added up
+
+    Args:
+        sums (list): iperf3 sums
+
+    Returns:
+        dict: merged sum
+    """
+    merged = dict(sums[0])
+    for key in MERGED_SUM_KEYS:
+        values = [s[key] for s in sums if s.get(key) is not None]
+        if values:
+            merged[key] = sum(values)
+    jitters = [s["jitter_ms"] for s in sums if s.get("jitter_ms") is not None]
+    if jitters:
+        merged["jitter_ms"] = statistics.mean(jitters)
+    if merged.get("packets"):
+        merged["lost_percent"] = merged.get("lost_packets", 0) / merged["packets"] * 100
+    merged["end"] = max(s["end"] for s in sums)
+    merged["seconds"] = max(s["seconds"] for s in sums)
+    return merged
+
+
+def merge_iperf3_intervals(intervals):
+    """merge an interval of iperf3 processes into one interval
+
+    Args:
+        intervals (list): same interval of each process, in process order
+
+    Returns:
+        dict: interval with sum and streams of all processes
+    """
+    return {
+        "streams": [
+            stream
+            for index, interval in enumerate(intervals)
+            for stream in offset_sockets(interval["streams"], index * MERGED_SOCKET_OFFSET)
+        ],
+        "sum": merge_iperf3_sums([interval["sum"] for interval in intervals]),
+    }
+
+
+def merge_iperf3_outputs(outputs_parsed):
+    """merge outputs of iperf3 processes of a same direction (--split) into one output
+
+    Sums are added up, streams of all processes kept with socket ids made unique,
+    intervals are merged by position and cpu utilization added up.
+
+    Args:
+        outputs_parsed (list): iperf3 outputs parsed, in process order
+
+    Returns:
+        dict: iperf3 output parsed
+    """
+    first = outputs_parsed[0]
+
+    start = dict(first["start"])
+    start["timestamp"] = min((o["start"]["timestamp"] for o in outputs_parsed), key=lambda t: t["timesecs"])
+    start["test_start"] = dict(
+        start["test_start"], num_streams=sum(o["start"]["test_start"]["num_streams"] for o in outputs_parsed)
+    )
+    start["connected"] = [
+        connected
+        for index, o in enumerate(outputs_parsed)
+        for connected in offset_sockets(o["start"].get("connected", []), index * MERGED_SOCKET_OFFSET)
+    ]
+
+    end = dict(first["end"])
+    end["streams"] = [
+        stream
+        for index, o in enumerate(outputs_parsed)
+        for stream in offset_sockets(o["end"].get("streams", []), index * MERGED_SOCKET_OFFSET)
+    ]
+    for key in ["sum_sent", "sum_received", "sum"]:
+        if all(key in o["end"] for o in outputs_parsed):
+            end[key] = merge_iperf3_sums([o["end"][key] for o in outputs_parsed])
+    if all("cpu_utilization_percent" in o["end"] for o in outputs_parsed):
+        end["cpu_utilization_percent"] = {
+            key: sum(o["end"]["cpu_utilization_percent"][key] for o in outputs_parsed)
+            for key in first["end"]["cpu_utilization_percent"]
         }
-        flatten_data = common.flatten(interval_stats[timestamp], "", ".")
-        CSV_line.update(flatten_data)
-        CSV_content.append(CSV_line)
-
-    header = [key for dict in CSV_content for key in dict]
-    header = sorted(set(header))
-    header.remove("timestamp")
-    header.insert(0, "timestamp")
-
-    # for sum data to be on first column
-    for h in header:
-        if "sum" in h:
-            header.remove(h)
-            header.insert(1, h)
-
-    return header, CSV_content
+
+    intervals = [merge_iperf3_intervals(list(same)) for same in zip(*(o["intervals"] for o in outputs_parsed))]
+
+    return dict(first, start=start, intervals=intervals, end=end)
 
 
 def calculate_streams_rtt_stats(intervals):
@@ -0,0 +1,741 @@
+import array
+import datetime
+import heapq
+import itertools
+import logging
+import math
+import statistics
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+log = logging.getLogger("another-iperf3-wrapper")
+
+# direction => code in direction column
+DIRECTIONS = ["upstream", "downstream"]
+
+# column => array typecode, missing values are NaN for float, -1 for flags
+# "n" is an integer that may be missing - stored as float
+IPERF3_SUM_COLUMNS = {
+    "start": "d",
+    "end": "d",
+    "seconds": "d",
+    "bytes": "q",
+    "bits_per_second": "d",
+    "retransmits": "n",
+    "jitter_ms": "d",
+    "lost_packets": "n",
+    "packets": "n",
+    "lost_percent": "d",
+    "omitted": "b",
+    "sender": "b",
+}
+
+IPERF3_STREAM_COLUMNS = {
+    "socket": "i",
+    "start": "d",
+    "end": "d",
+    "seconds": "d",
+    "bytes": "q",
+    "bits_per_second": "d",
+    "retransmits": "n",
+    "snd_cwnd": "n",
+    "snd_wnd": "n",
+    "rtt": "n",
+    "rttvar": "n",
+    "pmtu": "n",
+    "jitter_ms": "d",
+    "lost_packets": "n",
+    "packets": "n",
+    "lost_percent": "d",
+    "omitted": "b",
+    "sender": "b",
+}
+
+PING_COLUMNS = {
+    "send_time": "d",
+    "icmp_seq": "q",
+    "icmp_ttl": "n",
+    "icmp_time": "d",
+}
+
+# aggregation functions of each column when resampled on a time grid
+# mean: weighted by overlap of interval with grid cell, sum: counter split by overlap
+RESAMPLE_AGGREGATIONS = {
+    "iperf3_sum": {
+        "bits_per_second": ["mean", "max", "min"],
+        "bytes": ["sum"],
+        "retransmits": ["sum"],
+        "jitter_ms": ["mean", "max"],
+        "lost_packets": ["sum"],
+        "lost_percent": ["mean"],
+    },
+    "iperf3_streams": {
+        "bits_per_second": ["mean", "max", "min"],
+        "bytes": ["sum"],
+        "retransmits": ["sum"],
+        "snd_cwnd": ["mean"],
+        "rtt": ["mean", "max"],
+        "jitter_ms": ["mean", "max"],
+    },
+    "ping": {
+        "icmp_time": ["mean", "max", "min", "count"],
+    },
+}
+
+# margin for floating point errors when placing timestamp on grid
+GRID_EPSILON = 1e-6
+
+# numpy dtype of array typecodes - arrays are viewed without copy
+NUMPY_DTYPES = {"d": "float64", "q": "int64", "i": "int32", "b": "int8"}
+
+
+def new_table(columns):
+    """initialize table with timestamp, direction and given columns
+
+    Args:
+        columns (dict): column => array typecode
+
+    Returns:
+        dict: column => array
+    """
+    table = {"timestamp": array.array("d"), "direction": array.array("b")}
+    table.update(
+        {column: array.array("d" if typecode == "n" else typecode) for column, typecode in columns.items()}
+    )
+    return table
+
+
+def new_interval_store():
+    """initialize columnar store of interval stats
+
+    iperf3 sum and streams of each interval and ping replies are appended as rows
+    of typed arrays, timestamps are kept at native resolution (epoch as float).
+
+    Returns:
+        dict: interval store
+    """
+    return {
+        "iperf3_sum": new_table(IPERF3_SUM_COLUMNS),
+        "iperf3_streams": new_table(IPERF3_STREAM_COLUMNS),
+        "ping": new_table(PING_COLUMNS),
+        # ping target and protocol - same for every reply
+        "ping_info": {},
+    }
+
+
+def append_row(table, columns, timestamp, direction, row):
+    """append row in table, missing values are NaN or -1
+
+    Args:
+        table (dict): table from new_table
+        columns (dict): column => array typecode
+        timestamp (float): epoch
+        direction (str): downstream|upstream or None
+        row (dict): values by column
+    """
+    table["timestamp"].append(float(timestamp))
+    table["direction"].append(DIRECTIONS.index(direction) if direction else -1)
+    for column, typecode in columns.items():
+        value = row.get(column)
+        if typecode in ["d", "n"]:
+            table[column].append(float(value) if value is not None else math.nan)
+        elif typecode == "b":
+            table[column].append(int(value) if value is not None else -1)
+        else:
+            table[column].append(int(value or 0))
+
+
+def add_iperf3_interval(interval_store, direction, start_ts, interval):
+    """add one iperf3 interval (sum and streams) into interval store
+
+    Args:
+        interval_store (dict): interval store
+        direction (str): downstream|upstream
+        start_ts (float): test start timestamp
+        interval (dict): iperf3 interval with sum and streams
+    """
+    timestamp = start_ts + interval["sum"]["start"]
+    append_row(interval_store["iperf3_sum"], IPERF3_SUM_COLUMNS, timestamp, direction, interval["sum"])
+    for stream in interval["streams"]:
+        append_row(interval_store["iperf3_streams"], IPERF3_STREAM_COLUMNS, timestamp, direction, stream)
+
+
+def add_ping_reply(interval_store, pckt_stats):
+    """add ping reply into interval store
+
+    Args:
+        interval_store (dict): interval store
+        pckt_stats (dict): packet record parsed from ping output or latency prober
+    """
+    append_row(interval_store["ping"], PING_COLUMNS, pckt_stats["unix_time"], None, pckt_stats)
+    for key in ["target_host", "target_ip", "proto"]:
+        if pckt_stats.get(key):
+            interval_store["ping_info"][key] = pckt_stats[key]
+
+
+def get_rows_count(interval_store, table):
+    """return amount of rows in table
+
+    Args:
+        interval_store (dict): interval store
+        table (str): iperf3_sum|iperf3_streams|ping
+
+    Returns:
+        int: amount of rows
+    """
+    return len(interval_store[table]["timestamp"])
+
+
+def get_values(interval_store, table, column, direction=None):
+    """return values of column without missing values
+
+    Args:
+        interval_store (dict): interval store
+        table (str): iperf3_sum|iperf3_streams|ping
+        column (str): column
+        direction (str, optional): only rows of direction. Defaults to None.
+
+    Returns:
+        numpy array or list: values as float
+    """
+    values = interval_store[table][column]
+    directions = interval_store[table]["direction"]
+    code = DIRECTIONS.index(direction) if direction else None
+
+    if np is not None:
+        values = np.frombuffer(values, dtype=NUMPY_DTYPES[values.typecode]).astype("float64")
+        mask = ~np.isnan(values)
+        if code is not None:
+            mask &= np.frombuffer(directions, dtype="int8") == code
+        return values[mask]
+
+    return [
+        float(v)
+        for v, d in zip(values, directions)
+        if not math.isnan(v) and (code is None or d == code)
+    ]
+
+
+def get_percentiles(values, percentiles):
+    """return percentiles of values - linear interpolation as numpy default
+
+    Args:
+        values (numpy array or list): values
+        percentiles (list): percentiles between 0 and 100
+
+    Returns:
+        list: value of each percentile, None if no value
+    """
+    if len(values) == 0:
+        return [None for _ in percentiles]
+    if np is not None:
+        return [float(v) for v in np.percentile(values, percentiles)]
+    values = sorted(values)
+    results = []
+    for p in percentiles:
+        position = p / 100 * (len(values) - 1)
+        low = int(position)
+        high = min(low + 1, len(values) - 1)
+        results.append(values[low] + (values[high] - values[low]) * (position - low))
+    return results
+
+
+def get_rtt_stats(interval_store, direction):
+    """streams rtt stats of direction - avg, max, min, mdev and percentiles in ms
+
+    Args:
+        interval_store (dict): interval store
+        direction (str): downstream|upstream
+
+    Returns:
+        dict: with avg, max, min, mdev, rtt_p50, rtt_p95, rtt_p99 or None if not enough rtt
+    """
+    rtt = get_values(interval_store, "iperf3_streams", "rtt", direction)
+    if len(rtt) < 2:
+        return None
+    p50, p95, p99 = get_percentiles(rtt, [50, 95, 99])
+    if np is not None:
+        rtt_stats = [rtt.mean(), rtt.max(), rtt.min(), rtt.std(ddof=1)]
+    else:
+        rtt_stats = [statistics.mean(rtt), max(rtt), min(rtt), statistics.stdev(rtt)]
+
+    # rtt in iperf3 output is in usec
+    keys = ["avg", "max", "min", "mdev", "rtt_p50", "rtt_p95", "rtt_p99"]
+    return {key: round(float(value) / 1000, 3) for key, value in zip(keys, rtt_stats + [p50, p95, p99])}
+
+
+def get_streams_fairness(interval_store, direction):
+    """Jain's fairness index of streams mean throughput - 1 when all streams get the same share
+
+    Args:
+        interval_store (dict): interval store
+        direction (str): downstream|upstream
+
+    Returns:
+        float: fairness index between 1/streams and 1, None if no stream
+    """
+    table = interval_store["iperf3_streams"]
+    code = DIRECTIONS.index(direction)
+
+    if np is not None:
+        mask = np.frombuffer(table["direction"], dtype="int8") == code
+        sockets = np.frombuffer(table["socket"], dtype="int32")[mask]
+        bps = np.frombuffer(table["bits_per_second"], dtype="float64")[mask]
+        if not len(sockets):
+            return None
+        ids, index = np.unique(sockets, return_inverse=True)
+        means = np.bincount(index, weights=bps) / np.bincount(index)
+    else:
+        by_socket = {}
+        for socket, d, v in zip(table["socket"], table["direction"], table["bits_per_second"]):
+            if d == code:
+                by_socket.setdefault(socket, []).append(v)
+        if not by_socket:
+            return None
+        means = [statistics.mean(v) for v in by_socket.values()]
+
+    square_sum = sum(m * m for m in means)
+    if not square_sum:
+        return None
+    return round(float(sum(means) ** 2 / (len(means) * square_sum)), 4)
+
+
+def get_value(table, column, typecode, index):
+    """return value of table cell - as in iperf3 output or parsed ping output
+
+    Args:
+        table (dict): table from new_table
+        column (str): column
+        typecode (str): column typecode
+        index (int): row index
+
+    Returns:
+        int, float or bool: value, None if missing
+    """
+    value = table[column][index]
+    if typecode in ["d", "n"]:
+        if math.isnan(value):
+            return None
+        return int(value) if typecode == "n" else value
+    if typecode == "b":
+        return bool(value) if value != -1 else None
+    return value
+
+
+def get_row(table, columns, index):
+    """return row of table as dict - same keys as iperf3 output or parsed ping output
+
+    Args:
+        table (dict): table from new_table
+        columns (dict): column => array typecode
+        index (int): row index
+
+    Returns:
+        dict: values by column, missing values are not included
+    """
+    row = {}
+    for column, typecode in columns.items():
+        value = get_value(table, column, typecode, index)
+        if value is not None:
+            row[column] = value
+    return row
+
+
+def to_interval_stats(interval_store, resolution=None):
+    """convert interval store to interval stats by rounded timestamp - only for export
+
+    Args:
+        interval_store (dict): interval store
+        resolution (float, optional): resample on grid of given seconds instead. Defaults to None.
+
+    Returns:
+        dict: timestamp => {"sum": {direction: ...}, "streams": {direction: [...]}, "ping": {...}}
+    """
+    if resolution:
+        return resample(interval_store, resolution)
+
+    interval_stats = {}
+    overwritten = 0
+
+    # last interval in a rounded timestamp overwrites previous ones
+    table = interval_store["iperf3_sum"]
+    for index, timestamp in enumerate(table["timestamp"]):
+        direction = DIRECTIONS[table["direction"][index]]
+        stats = interval_stats.setdefault(int(round(timestamp, 0)), {})
+        overwritten += direction in stats.get("sum", {})
+        stats.setdefault("sum", {})[direction] = get_row(table, IPERF3_SUM_COLUMNS, index)
+        stats.setdefault("streams", {})[direction] = []
+
+    # streams of an interval share its timestamp and follow each other
+    table = interval_store["iperf3_streams"]
+    last_timestamp = {}
+    for index, timestamp in enumerate(table["timestamp"]):
+        direction = DIRECTIONS[table["direction"][index]]
+        rounded_timestamp = int(round(timestamp, 0))
+        streams = interval_stats[rounded_timestamp]["streams"][direction]
+        if last_timestamp.get((rounded_timestamp, direction), timestamp) != timestamp:
+            streams.clear()
+        last_timestamp[(rounded_timestamp, direction)] = timestamp
+        streams.append(get_row(table, IPERF3_STREAM_COLUMNS, index))
+
+    table = interval_store["ping"]
+    for index, timestamp in enumerate(table["timestamp"]):
+        rounded_timestamp = int(round(timestamp, 0))
+        ping = dict(unix_time=timestamp, **interval_store["ping_info"])
+        ping.update(get_row(table, PING_COLUMNS, index))
+        overwritten += "ping" in interval_stats.get(rounded_timestamp, {})
+        interval_stats.setdefault(rounded_timestamp, {})["ping"] = ping
+
+    if overwritten:
+        log.warning(f"{overwritten} samples overwritten by others in the same second - use --resample to keep them")
+
+    return interval_stats
+
+
+def get_grid_cells(start, end, resolution):
+    """return grid cells overlapped by [start, end) - a point if end is start
+
+    Args:
+        start (float): epoch
+        end (float): epoch
+        resolution (float): grid resolution in seconds
+
+    Returns:
+        list: (cell index, overlap ratio of [start, end) in cell)
+    """
+    first = math.floor(start / resolution + GRID_EPSILON)
+    if end <= start:
+        return [(first, 1)]
+    last = max(math.ceil(end / resolution - GRID_EPSILON) - 1, first)
+    return [
+        (cell, (min(end, (cell + 1) * resolution) - max(start, cell * resolution)) / (end - start))
+        for cell in range(first, last + 1)
+    ]
+
+
+def aggregate(samples, function):
+    """aggregate samples of a grid cell
+
+    Args:
+        samples (list): (value, overlap ratio)
+        function (str): mean|max|min|sum|count
+
+    Returns:
+        float: aggregated value
+    """
+    if function == "mean":
+        return sum(v * r for v, r in samples) / sum(r for _, r in samples)
+    if function == "sum":
+        return sum(v * r for v, r in samples)
+    if function == "max":
+        return max(v for v, _ in samples)
+    if function == "min":
+        return min(v for v, _ in samples)
+    return len(samples)
+
+
+def resample(interval_store, resolution):
+    """resample iperf3 intervals and ping replies on a common time grid
+
+    iperf3 intervals are spread over every cell they overlap, ping replies fall
+    in the cell of their timestamp. Each column is aggregated with functions of
+    RESAMPLE_AGGREGATIONS into <column>_<function>, so no sample is overwritten.
+
+    Args:
+        interval_store (dict): interval store
+        resolution (float): grid resolution in seconds (e.g. 0.1)
+
+    Returns:
+        dict: cell timestamp => {"sum": {direction: ...}, "streams": {direction: {socket: ...}}, "ping": {...}}
+    """
+    # cell => path => column => samples
+    cells = {}
+    for table_name, aggregations in RESAMPLE_AGGREGATIONS.items():
+        table = interval_store[table_name]
+        for index, timestamp in enumerate(table["timestamp"]):
+            if table_name == "ping":
+                path = ("ping",)
+                end = timestamp
+            else:
+                direction = DIRECTIONS[table["direction"][index]]
+                if table_name == "iperf3_sum":
+                    path = ("sum", direction)
+                else:
+                    path = ("streams", direction, str(table["socket"][index]))
+                seconds = table["seconds"][index]
+                end = timestamp + seconds if not math.isnan(seconds) else timestamp
+
+            for cell, ratio in get_grid_cells(timestamp, end, resolution):
+                samples = cells.setdefault(cell, {}).setdefault(path, {})
+                for column in aggregations:
+                    value = table[column][index]
+                    if not math.isnan(value):
+                        samples.setdefault(column, []).append((value, ratio))
+
+    interval_stats = {}
+    for cell in sorted(cells):
+        cell_stats = interval_stats.setdefault(round(cell * resolution, 6), {})
+        for path, columns in cells[cell].items():
+            stats = cell_stats
+            for key in path:
+                stats = stats.setdefault(key, {})
+            aggregations = RESAMPLE_AGGREGATIONS[
+                "ping" if path[0] == "ping" else f"iperf3_{path[0]}"
+            ]
+            for column, samples in columns.items():
+                for function in aggregations[column]:
+                    stats[f"{column}_{function}"] = round(aggregate(samples, function), 6)
+
+    return interval_stats
+
+
+def has_values(interval_store, table, column, direction=None):
+    """return True if column has at least one value
+
+    Args:
+        interval_store (dict): interval store
+        table (str): iperf3_sum|iperf3_streams|ping
+        column (str): column
+        direction (str, optional): only rows of direction. Defaults to None.
+
+    Returns:
+        bool: column has values
+    """
+    values = interval_store[table][column]
+    directions = interval_store[table]["direction"]
+    code = DIRECTIONS.index(direction) if direction else None
+    # missing values: NaN is not equal to itself, -1 for flags
+    missing = -1 if values.typecode == "b" else None
+    return any(
+        v == v and v != missing and (code is None or d == code) for v, d in zip(values, directions)
+    )
+
+
+def get_streams_count(interval_store):
+    """return highest amount of streams in an interval by direction
+
+    Args:
+        interval_store (dict): interval store
+
+    Returns:
+        dict: direction => amount of streams
+    """
+    table = interval_store["iperf3_streams"]
+    counts = {}
+    previous, size = None, 0
+    # streams of an interval share its timestamp and follow each other
+    for key in zip(table["timestamp"], table["direction"]):
+        size = size + 1 if key == previous else 1
+        previous = key
+        direction = DIRECTIONS[key[1]]
+        counts[direction] = max(counts.get(direction, 0), size)
+    return counts
+
+
+def get_CSV_header(interval_store, resolution=None):
+    """CSV header derived once from columns with values - deterministic order
+
+    timestamp, sum by direction, ping then streams by direction and stream,
+    columns in schema order.
+
+    Args:
+        interval_store (dict): interval store
+        resolution (float, optional): header of resampled rows. Defaults to None.
+
+    Returns:
+        list: header
+    """
+    directions = [
+        d for d in DIRECTIONS if has_values(interval_store, "iperf3_sum", "start", d)
+    ]
+
+    def get_columns(table, direction=None):
+        if resolution:
+            return [
+                f"{column}_{function}"
+                for column, functions in RESAMPLE_AGGREGATIONS[table].items()
+                if has_values(interval_store, table, column, direction)
+                for function in functions
+            ]
+        columns = {
+            "iperf3_sum": IPERF3_SUM_COLUMNS,
+            "iperf3_streams": IPERF3_STREAM_COLUMNS,
+            "ping": PING_COLUMNS,
+        }[table]
+        return [column for column in columns if has_values(interval_store, table, column, direction)]
+
+    header = ["timestamp"]
+    for direction in directions:
+        header += [f"sum.{direction}.{column}" for column in get_columns("iperf3_sum", direction)]
+
+    if get_rows_count(interval_store, "ping"):
+        if not resolution:
+            header += ["ping.unix_time"] + [f"ping.{key}" for key in interval_store["ping_info"]]
+        header += [f"ping.{column}" for column in get_columns("ping")]
+
+    if resolution:
+        # resampled streams are identified by socket
+        table = interval_store["iperf3_streams"]
+        streams = {
+            direction: sorted({s for s, d in zip(table["socket"], table["direction"]) if DIRECTIONS[d] == direction})
+            for direction in directions
+        }
+    else:
+        # streams are identified by position in interval
+        streams = {d: range(count) for d, count in get_streams_count(interval_store).items()}
+
+    for direction, stream_ids in streams.items():
+        columns = get_columns("iperf3_streams", direction)
+        for stream_id in stream_ids:
+            header += [f"streams.{direction}.{stream_id}.{column}" for column in columns]
+
+    return header
+
+
+def get_CSV_timestamp(timestamp, resolution=None):
+    """format timestamp of CSV row - with milliseconds for sub-second grid
+
+    Args:
+        timestamp (float): epoch
+        resolution (float, optional): grid resolution in seconds. Defaults to None.
+
+    Returns:
+        str: formatted timestamp
+    """
+    formatted = datetime.datetime.fromtimestamp(int(timestamp)).strftime("%Y-%m-%d %H:%M:%S")
+    if resolution and resolution < 1:
+        formatted += f".{int(round(timestamp % 1 * 1000)) % 1000:03d}"
+    return formatted
+
+
+def get_table_cursor(interval_store, table_name):
+    """row indexes of table in rounded timestamp order - rows of a same second kept in insertion order
+
+    Tables are filled in time order by direction, sorted only when both directions
+    were added one after the other (iperf3 -J outputs).
+
+    Args:
+        interval_store (dict): interval store
+        table_name (str): iperf3_sum|iperf3_streams|ping
+
+    Yields:
+        tuple: rounded timestamp, table name, row index
+    """
+    timestamps = interval_store[table_name]["timestamp"]
+    indexes = range(len(timestamps))
+    if any(round(a) > round(b) for a, b in zip(timestamps, itertools.islice(timestamps, 1, None))):
+        indexes = sorted(indexes, key=lambda index: round(timestamps[index]))
+    for index in indexes:
+        yield int(round(timestamps[index], 0)), table_name, index
+
+
+def get_CSV_rows(interval_store, header, resolution=None):
+    """generate CSV rows as lists ordered as header - one row by rounded second or grid cell
+
+    Rows of tables are merged in timestamp order and each row is yielded as soon
+    as its second is complete - a single row is built at a time. Resampled rows
+    are generated from the grid of resample.
+
+    Args:
+        interval_store (dict): interval store
+        header (list): header from get_CSV_header
+        resolution (float, optional): resample on grid of given seconds. Defaults to None.
+
+    Yields:
+        list: row values, empty string if missing
+    """
+    positions = {column: index for index, column in enumerate(header)}
+
+    if resolution:
+        for timestamp, cell in resample(interval_store, resolution).items():
+            row = [""] * len(header)
+            row[0] = get_CSV_timestamp(timestamp, resolution)
+            for direction, stats in cell.get("sum", {}).items():
+                for key, value in stats.items():
+                    row[positions[f"sum.{direction}.{key}"]] = value
+            for key, value in cell.get("ping", {}).items():
+                row[positions[f"ping.{key}"]] = value
+            for direction, by_socket in cell.get("streams", {}).items():
+                for socket, stats in by_socket.items():
+                    for key, value in stats.items():
+                        row[positions[f"streams.{direction}.{socket}.{key}"]] = value
+            yield row
+        return
+
+    def get_positions(table, prefix, columns):
+        return [
+            (table[column], typecode, positions[f"{prefix}.{column}"])
+            for column, typecode in columns.items()
+            if f"{prefix}.{column}" in positions
+        ]
+
+    def set_values(row, values_positions, index):
+        # inlined get_value - called for every cell
+        for values, typecode, position in values_positions:
+            value = values[index]
+            if typecode == "d":
+                row[position] = value if value == value else ""
+            elif typecode == "n":
+                row[position] = int(value) if value == value else ""
+            elif typecode == "b":
+                row[position] = bool(value) if value != -1 else ""
+            else:
+                row[position] = value
+
+    sum_table = interval_store["iperf3_sum"]
+    sum_positions = {d: get_positions(sum_table, f"sum.{d}", IPERF3_SUM_COLUMNS) for d in DIRECTIONS}
+
+    streams_table = interval_store["iperf3_streams"]
+    streams_positions = {
+        d: [get_positions(streams_table, f"streams.{d}.{i}", IPERF3_STREAM_COLUMNS) for i in range(count)]
+        for d, count in get_streams_count(interval_store).items()
+    }
+
+    ping_table = interval_store["ping"]
+    ping_positions = get_positions(ping_table, "ping", PING_COLUMNS)
+    info_positions = [(positions[f"ping.{key}"], value) for key, value in interval_store["ping_info"].items()]
+
+    row = None
+    row_timestamp = None
+    # direction => (interval timestamp, stream position) in current row
+    last_stream = {}
+    cursors = [get_table_cursor(interval_store, table_name) for table_name in ["iperf3_sum", "iperf3_streams", "ping"]]
+    for timestamp, table_name, index in heapq.merge(*cursors, key=lambda item: item[0]):
+        if timestamp != row_timestamp:
+            if row is not None:
+                row[0] = get_CSV_timestamp(row_timestamp)
+                yield row
+            row = [""] * len(header)
+            row_timestamp = timestamp
+            last_stream = {}
+
+        # last interval in a rounded timestamp overwrites previous ones
+        if table_name == "iperf3_sum":
+            set_values(row, sum_positions[DIRECTIONS[sum_table["direction"][index]]], index)
+
+        elif table_name == "iperf3_streams":
+            direction = DIRECTIONS[streams_table["direction"][index]]
+            interval_timestamp = streams_table["timestamp"][index]
+            previous_timestamp, stream_id = last_stream.get(direction, (interval_timestamp, -1))
+            if previous_timestamp != interval_timestamp:
+                # streams of a previous interval in the same rounded timestamp are overwritten
+                for stream_positions in streams_positions[direction]:
+                    for _, _, position in stream_positions:
+                        row[position] = ""
+                stream_id = -1
+            stream_id += 1
+            last_stream[direction] = (interval_timestamp, stream_id)
+            set_values(row, streams_positions[direction][stream_id], index)
+
+        else:
+            row[positions["ping.unix_time"]] = ping_table["timestamp"][index]
+            for position, value in info_positions:
+                row[position] = value
+            set_values(row, ping_positions, index)
+
+    if row is not None:
+        row[0] = get_CSV_timestamp(row_timestamp)
+        yield row
@@ -0,0 +1,219 @@
+import json
+import logging
+import os
+import selectors
+import socket
+import struct
+import threading
+import time
+
+log = logging.getLogger("another-iperf3-wrapper")
+
+# command name handled in-process instead of running ping
+NATIVE_PING_CMD = "native-ping"
+
+ICMP_ECHO_REQUEST = {socket.AF_INET: 8, socket.AF_INET6: 128}
+ICMP_ECHO_REPLY = {socket.AF_INET: 0, socket.AF_INET6: 129}
+ICMP_PROTO = {socket.AF_INET: socket.IPPROTO_ICMP, socket.AF_INET6: socket.IPPROTO_ICMPV6}
+
+# icmp header + 56 bytes of data, as ping
+PAYLOAD_SIZE = 56
+
+
+def get_checksum(data):
+    """internet checksum of data
+
+    Args:
+        data (bytes): data
+
+    Returns:
+        int: checksum
+    """
+    if len(data) % 2:
+        data += b"\0"
+    total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+
+def open_socket(host, udp_echo_port):
+    """open unprivileged ICMP datagram socket, UDP socket to echo service if not permitted
+
+    Args:
+        host (str): target host
+        udp_echo_port (int): echo service port for UDP fallback
+
+    Returns:
+        tuple: socket, address, protocol (icmp|udp)
+    """
+    family, _, _, _, address = socket.getaddrinfo(host, None, type=socket.SOCK_DGRAM)[0]
+    try:
+        # unprivileged ICMP - allowed by net.ipv4.ping_group_range
+        sock = socket.socket(family, socket.SOCK_DGRAM, ICMP_PROTO[family])
+        return sock, (address[0], 0), "icmp"
+    except OSError as e:
+        log.warning(f"ICMP socket not permitted ({e}) - fallback to UDP echo on port {udp_echo_port}")
+    sock = socket.socket(family, socket.SOCK_DGRAM)
+    return sock, (address[0], udp_echo_port), "udp"
+
+
+class LatencyProber:
+    """latency prober running in a thread - same interface as subprocess.Popen for process supervisor
+
+    Records are written as json lines on stdout pipe:
+        {"unix_time": 1645533781.102614, "send_time": ..., "target_host": ..., "icmp_seq": 1, "icmp_time": 7.36}
+        {"unix_time": ..., "icmp_seq": 4, "no_answer": true}
+        {"stats": {"pckts_tx": ..., "rtt_min": ...}}
+
+    Command: native-ping <host> [-c count] [-i interval] [-W timeout] [-U udp echo port]
+    """
+
+    def __init__(self, cmd):
+        cmd_args = cmd.split()
+        self.host = cmd_args[1]
+        self.count = int(self.get_arg(cmd_args, "-c", 5))
+        self.interval = float(self.get_arg(cmd_args, "-i", 1))
+        self.timeout = float(self.get_arg(cmd_args, "-W", 1))
+        self.udp_echo_port = int(self.get_arg(cmd_args, "-U", 7))
+
+        self.pid = os.getpid()
+        self.returncode = None
+        self.stop = threading.Event()
+
+        read_fd, self.write_fd = os.pipe()
+        self.stdout = os.fdopen(read_fd, "rb", buffering=0)
+
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    @staticmethod
+    def get_arg(cmd_args, arg, default):
+        """return value following arg in command arguments"""
+        try:
+            return cmd_args[cmd_args.index(arg) + 1]
+        except (ValueError, IndexError):
+            return default
+
+    def write_record(self, record):
+        """write record as json line on stdout pipe"""
+        os.write(self.write_fd, (json.dumps(record) + "\n").encode())
+
+    def run(self):
+        """thread entry point - stdout pipe is closed when done as process exit"""
+        try:
+            self.probe()
+            self.returncode = 0
+        except OSError as e:
+            log.error(f"latency prober failed: {e}")
+            self.returncode = 2
+        finally:
+            os.close(self.write_fd)
+
+    def probe(self):
+        """send probes at given interval and write a record for each reply or lost probe"""
+        sock, address, proto = open_socket(self.host, self.udp_echo_port)
+        log.debug(f"latency prober: {proto} to {address} - interval: {self.interval}s")
+
+        outstanding = {}
+        rtts = []
+        seq = 0
+        start = time.monotonic()
+        next_send = start
+
+        with sock, selectors.DefaultSelector() as selector:
+            selector.register(sock, selectors.EVENT_READ)
+            while not self.stop.is_set():
+                now = time.monotonic()
+                if seq < self.count and now >= next_send:
+                    seq += 1
+                    # sequence number on 16 bits in packet
+                    outstanding[seq & 0xFFFF] = (seq, time.time(), time.perf_counter())
+                    sock.sendto(self.get_packet(sock, proto, seq & 0xFFFF), address)
+                    next_send += self.interval
+
+                # lost probes
+                for wire_seq in [s for s, sent in outstanding.items() if time.time() - sent[1] > self.timeout]:
+                    lost_seq = outstanding.pop(wire_seq)[0]
+                    self.write_record({"unix_time": time.time(), "icmp_seq": lost_seq, "no_answer": True})
+
+                if seq >= self.count and not outstanding:
+                    break
+
+                wait = next_send - now if seq < self.count else self.timeout
+                for _ in selector.select(timeout=max(min(wait, self.timeout), 0)):
+                    data = sock.recv(2048)
+                    reply_seq = self.get_reply_seq(sock, proto, data)
+                    if reply_seq not in outstanding:
+                        continue
+                    probe_seq, send_time, send_counter = outstanding.pop(reply_seq)
+                    rtt = (time.perf_counter() - send_counter) * 1000
+                    rtts.append(rtt)
+                    self.write_record(
+                        {
+                            "unix_time": time.time(),
+                            "send_time": send_time,
+                            "target_host": self.host,
+                            "icmp_seq": probe_seq,
+                            "icmp_time": round(rtt, 3),
+                            "proto": proto,
+                        }
+                    )
+
+        self.write_record({"stats": self.get_stats(seq, rtts, time.monotonic() - start)})
+
+    def get_packet(self, sock, proto, seq):
+        """build echo request - ICMP header or sequence number for UDP echo"""
+        payload = struct.pack("!d", time.time()).ljust(PAYLOAD_SIZE, b"\0")
+        if proto == "udp":
+            return struct.pack("!H", seq) + payload
+        echo_request = ICMP_ECHO_REQUEST[sock.family]
+        header = struct.pack("!BBHHH", echo_request, 0, 0, 0, seq)
+        checksum = get_checksum(header + payload) if sock.family == socket.AF_INET else 0
+        return struct.pack("!BBHHH", echo_request, 0, checksum, 0, seq) + payload
+
+    def get_reply_seq(self, sock, proto, data):
+        """return sequence number of echo reply, None if not an echo reply"""
+        if proto == "udp":
+            return struct.unpack_from("!H", data)[0] if len(data) >= 2 else None
+        if len(data) < 8 or data[0] != ICMP_ECHO_REPLY[sock.family]:
+            return None
+        return struct.unpack_from("!H", data, 6)[0]
+
+    @staticmethod
+    def get_stats(pckts_tx, rtts, duration):
+        """stats with same keys as parsed ping output"""
+        stats = {
+            "pckts_tx": pckts_tx,
+            "pckts_rx": len(rtts),
+            "pckts_loss_perc": round((pckts_tx - len(rtts)) / pckts_tx * 100, 3) if pckts_tx else 0,
+            "time": int(duration * 1000),
+        }
+        if rtts:
+            mean = sum(rtts) / len(rtts)
+            stats.update(
+                {
+                    "rtt_min": round(min(rtts), 3),
+                    "rtt_avg": round(mean, 3),
+                    "rtt_max": round(max(rtts), 3),
+                    # population deviation as ping mdev
+                    "rtt_mdev": round(max(sum(r * r for r in rtts) / len(rtts) - mean * mean, 0) ** 0.5, 3),
+                }
+            )
+        return stats
+
+    def send_signal(self, sig):
+        self.stop.set()
+
+    def terminate(self):
+        self.stop.set()
+
+    def kill(self):
+        self.stop.set()
+
+    def poll(self):
+        return self.returncode
+
+    def wait(self, timeout=None):
+        self.thread.join(timeout)
+        return self.returncode
@@ -0,0 +1,200 @@
+import collections
+import contextlib
+import logging
+import sys
+
+from rich.live import Live
+from rich.table import Table
+from rich import box
+
+from utils import args, common, data_parsers
+
+log = logging.getLogger("another-iperf3-wrapper")
+
+SPARKLINE_CHARS = "▁▂▃▄▅▆▇█"
+
+# amount of intervals displayed in sparklines
+SPARKLINE_LENGTH = 40
+
+# above this amount of streams only min/avg/max of streams rtt is displayed
+MAX_STREAMS_DISPLAYED = 8
+
+
+def new_dashboard():
+    """initialize dashboard state
+
+    Returns:
+        dict: dashboard state
+    """
+    return {
+        "live": None,
+        "directions": {},
+        "ping": {
+            "rtt": collections.deque(maxlen=SPARKLINE_LENGTH),
+            "last_rtt": None,
+            "received": 0,
+            "lost": 0,
+        },
+    }
+
+
+def get_sparkline(values):
+    """return sparkline of values
+
+    Args:
+        values (iterable): numeric values
+
+    Returns:
+        str: sparkline
+    """
+    values = list(values)
+    if not values:
+        return ""
+    low, high = min(values), max(values)
+    scale = (high - low) or 1
+    return "".join(
+        SPARKLINE_CHARS[int((v - low) / scale * (len(SPARKLINE_CHARS) - 1))] for v in values
+    )
+
+
+def get_streams_rtt(streams_rtt):
+    """format streams rtt of last interval
+
+    Args:
+        streams_rtt (list): rtt in ms for each stream
+
+    Returns:
+        str: streams rtt
+    """
+    if not streams_rtt:
+        return "N/A"
+    if len(streams_rtt) > MAX_STREAMS_DISPLAYED:
+        return (
+            f"min {round(min(streams_rtt), 1)} / avg {round(sum(streams_rtt) / len(streams_rtt), 1)}"
+            f" / max {round(max(streams_rtt), 1)} ms"
+        )
+    return " ".join(str(round(rtt, 1)) for rtt in streams_rtt) + " ms"
+
+
+def render_dashboard(dashboard):
+    """render dashboard table
+
+    Args:
+        dashboard (dict): dashboard state
+
+    Returns:
+        obj: rich table
+    """
+    table = Table(box=box.ASCII, title=f"Live stats - {args.obj.host}")
+    table.add_column("type", justify="right")
+    table.add_column("interval", justify="right")
+    table.add_column("throughput", justify="right")
+    table.add_column("retr", justify="right")
+    table.add_column("streams rtt", justify="right")
+    table.add_column("history", justify="left")
+
+    for direction, stats in dashboard["directions"].items():
+        bps = common.units_to_humanReadable(stats["bps"][-1]) if stats["bps"] else None
+        table.add_row(
+            f"[bold]{direction}[/bold]",
+            f"{stats['interval']} s",
+            f"{bps}bps" if bps else "N/A",
+            str(stats["retransmits"]) if stats["retransmits"] is not None else "N/A",
+            get_streams_rtt(stats["streams_rtt"]),
+            get_sparkline(stats["bps"]),
+        )
+
+    ping = dashboard["ping"]
+    table.add_row(
+        "[bold]ICMP[/bold]",
+        f"{ping['received']} rx / {ping['lost']} lost",
+        "",
+        "",
+        f"{ping['last_rtt']} ms" if ping["last_rtt"] is not None else "N/A",
+        get_sparkline(ping["rtt"]),
+    )
+    return table
+
+
+def refresh(dashboard):
+    """refresh live display with dashboard state
+
+    Args:
+        dashboard (dict): dashboard state
+    """
+    if dashboard["live"]:
+        dashboard["live"].update(render_dashboard(dashboard))
+
+
+def update_iperf3(dashboard, stream, event):
+    """update dashboard with iperf3 --json-stream event
+
+    Args:
+        dashboard (dict): dashboard state
+        stream (dict): iperf3 stream state
+        event (dict): event parsed from iperf3 output
+    """
+    if not event or event["event"] != "interval" or not stream["start"]:
+        return
+
+    direction = data_parsers.get_stream_direction(stream)
+    stats = dashboard["directions"].setdefault(
+        direction,
+        {"bps": collections.deque(maxlen=SPARKLINE_LENGTH), "interval": 0, "retransmits": None, "streams_rtt": []},
+    )
+    interval = event["data"]
+    stats["bps"].append(interval["sum"]["bits_per_second"])
+    stats["interval"] = round(interval["sum"]["end"], 1)
+    stats["retransmits"] = interval["sum"].get("retransmits")
+    stats["streams_rtt"] = [
+        s["rtt"] / 1000 for s in interval["streams"] if s.get("rtt", False)
+    ]
+    refresh(dashboard)
+
+
+def update_ping(dashboard, pckt_stats):
+    """update dashboard with ping packet record
+
+    Args:
+        dashboard (dict): dashboard state
+        pckt_stats (dict): packet record parsed from ping output
+    """
+    if not pckt_stats:
+        return
+
+    ping = dashboard["ping"]
+    if pckt_stats.get("icmp_time"):
+        ping["last_rtt"] = float(pckt_stats["icmp_time"])
+        ping["rtt"].append(ping["last_rtt"])
+        ping["received"] += 1
+    else:
+        ping["lost"] += 1
+    refresh(dashboard)
+
+
+@contextlib.contextmanager
+def live_display(dashboard):
+    """display dashboard while running - logs are printed above it
+
+    Args:
+        dashboard (dict): dashboard state, None to disable live display
+    """
+    if not dashboard:
+        yield
+        return
+
+    with Live(render_dashboard(dashboard), refresh_per_second=4) as live:
+        dashboard["live"] = live
+        # logging stream handlers write to stdout redirected by live display
+        handlers = [
+            (h, h.setStream(sys.stdout))
+            for h in log.handlers
+            if isinstance(h, logging.StreamHandler)
+        ]
+        try:
+            yield
+        finally:
+            for h, stream in handlers:
+                if stream is not None:
+                    h.setStream(stream)
+            dashboard["live"] = None
@@ -0,0 +1,294 @@
+import collections
+import http.server
+import logging
+import math
+import socket
+import threading
+import time
+
+from utils import interval_store, results_db
+
+log = logging.getLogger("another-iperf3-wrapper")
+
+METRICS_PREFIX = "iperf3_wrapper"
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# histogram => interval store table, column, unit conversion, upper bounds of buckets
+HISTOGRAMS = {
+    "interval_bits_per_second": {
+        "table": "iperf3_sum",
+        "column": "bits_per_second",
+        "scale": 1,
+        "buckets": [1e6, 10e6, 50e6, 100e6, 250e6, 500e6, 1e9, 2.5e9, 5e9, 10e9, 25e9, 40e9, 100e9],
+        "help": "throughput of each iperf3 interval",
+    },
+    "interval_tcp_rtt_milliseconds": {
+        "table": "iperf3_streams",
+        "column": "rtt",
+        # usec => ms
+        "scale": 0.001,
+        "buckets": [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000],
+        "help": "tcp rtt of each iperf3 stream interval",
+    },
+    "icmp_rtt_milliseconds": {
+        "table": "ping",
+        "column": "icmp_time",
+        "scale": 1,
+        "buckets": [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000],
+        "help": "rtt of each ping reply",
+    },
+}
+
+# summary stats of recent runs exposed as quantiles over ring buffer
+RECENT_STATS = ["downstream_bits_per_second", "upstream_bits_per_second", "icmp_rtt_avg"]
+RECENT_QUANTILES = [0.5, 0.95]
+
+
+def new_exporter(host, ring_size):
+    """initialize exporter state - memory bounded whatever number of runs
+
+    Args:
+        host (str): measured host, label of every metric
+        ring_size (int): recent runs kept by test type
+
+    Returns:
+        dict: exporter state
+    """
+    return {
+        "lock": threading.Lock(),
+        "host": host,
+        "ring_size": ring_size,
+        # test type => summary stats of last run
+        "latest": {},
+        # test type => last run time
+        "latest_time": {},
+        # test type => ring buffer of summary stats
+        "recent": {},
+        # (test type, outcome) => runs count
+        "runs": collections.Counter(),
+        # test type => bufferbloat latency increase and grade
+        "bufferbloat": {},
+        # (histogram, test type, direction) => cumulative bucket counts, sum, count
+        "histograms": {},
+    }
+
+
+def add_histogram_values(exporter, name, test_type, direction, values):
+    """add values into cumulative histogram
+
+    Args:
+        exporter (dict): exporter state
+        name (str): histogram of HISTOGRAMS
+        test_type (str): ST|BBT
+        direction (str): upstream|downstream, empty for ping
+        values (iterable): values in histogram unit
+    """
+    buckets = HISTOGRAMS[name]["buckets"]
+    histogram = exporter["histograms"].setdefault(
+        (name, test_type, direction), {"buckets": [0] * len(buckets), "sum": 0.0, "count": 0}
+    )
+    for value in values:
+        for index, bound in enumerate(buckets):
+            if value <= bound:
+                histogram["buckets"][index] += 1
+        histogram["sum"] += value
+        histogram["count"] += 1
+
+
+def record_run(exporter, test_type, summary_stats, interval_stats, grade=None):
+    """update exporter with results of a run
+
+    Args:
+        exporter (dict): exporter state
+        test_type (str): ST|BBT
+        summary_stats (dict): summary stats
+        interval_stats (dict): interval store
+        grade (str, optional): bufferbloat grade. Defaults to None.
+    """
+    with exporter["lock"]:
+        exporter["runs"][(test_type, "aborted" if summary_stats.get("aborted") else "completed")] += 1
+        exporter["latest"][test_type] = summary_stats
+        exporter["latest_time"][test_type] = time.time()
+        exporter["recent"].setdefault(test_type, collections.deque(maxlen=exporter["ring_size"])).append(
+            {stat: results_db.get_number(summary_stats.get(stat)) for stat in RECENT_STATS}
+        )
+
+        rtt_max = results_db.get_number(summary_stats.get("icmp_rtt_max"))
+        rtt_min = results_db.get_number(summary_stats.get("icmp_rtt_min"))
+        if grade and rtt_max is not None and rtt_min is not None:
+            exporter["bufferbloat"][test_type] = {"latency_increase": rtt_max - rtt_min, "grade": grade}
+
+        for name, histogram in HISTOGRAMS.items():
+            directions = [""] if histogram["table"] == "ping" else interval_store.DIRECTIONS
+            for direction in directions:
+                values = interval_store.get_values(
+                    interval_stats, histogram["table"], histogram["column"], direction or None
+                )
+                add_histogram_values(
+                    exporter, name, test_type, direction, (v * histogram["scale"] for v in values)
+                )
+
+
+def record_failure(exporter, test_type):
+    """count a run which failed without results
+
+    Args:
+        exporter (dict): exporter state
+        test_type (str): ST|BBT
+    """
+    with exporter["lock"]:
+        exporter["runs"][(test_type, "failed")] += 1
+
+
+def get_labels(**labels):
+    """prometheus labels - empty labels omitted"""
+    labels = {
+        k: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for k, v in labels.items() if v != ""
+    }
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels.items()) + "}"
+
+
+def get_value(value):
+    """number as prometheus value - integers without decimal part"""
+    if value == math.inf:
+        return "+Inf"
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def render(exporter):
+    """render metrics in prometheus text exposition format
+
+    Args:
+        exporter (dict): exporter state
+
+    Returns:
+        str: metrics
+    """
+    host = exporter["host"]
+    lines = []
+
+    def add_metric(name, metric_type, help_text, samples):
+        lines.append(f"# HELP {METRICS_PREFIX}_{name} {help_text}")
+        lines.append(f"# TYPE {METRICS_PREFIX}_{name} {metric_type}")
+        for suffix, labels, value in samples:
+            lines.append(f"{METRICS_PREFIX}_{name}{suffix}{get_labels(host=host, **labels)} {get_value(value)}")
+
+    with exporter["lock"]:
+        add_metric(
+            "runs_total",
+            "counter",
+            "runs by test type and outcome",
+            [("", {"test_type": t, "outcome": o}, count) for (t, o), count in sorted(exporter["runs"].items())],
+        )
+
+        add_metric(
+            "last_run_timestamp_seconds",
+            "gauge",
+            "time of last completed run",
+            [("", {"test_type": t}, value) for t, value in sorted(exporter["latest_time"].items())],
+        )
+
+        add_metric(
+            "last_run",
+            "gauge",
+            "summary stats of last completed run",
+            [
+                ("", {"test_type": t, "stat": stat}, results_db.get_number(value))
+                for t, summary_stats in sorted(exporter["latest"].items())
+                for stat, value in summary_stats.items()
+                if results_db.get_number(value) is not None
+            ],
+        )
+
+        add_metric(
+            "bufferbloat_latency_increase_milliseconds",
+            "gauge",
+            "icmp rtt increase under load of last bufferbloat test",
+            [("", {"test_type": t}, b["latency_increase"]) for t, b in sorted(exporter["bufferbloat"].items())],
+        )
+
+        add_metric(
+            "bufferbloat_grade_info",
+            "gauge",
+            "grade of last bufferbloat test",
+            [("", {"test_type": t, "grade": b["grade"]}, 1) for t, b in sorted(exporter["bufferbloat"].items())],
+        )
+
+        add_metric(
+            "recent_runs",
+            "gauge",
+            "runs kept in ring buffer for recent quantiles",
+            [("", {"test_type": t}, len(recent)) for t, recent in sorted(exporter["recent"].items())],
+        )
+
+        for stat in RECENT_STATS:
+            samples = []
+            for t, recent in sorted(exporter["recent"].items()):
+                values = [run[stat] for run in recent if run[stat] is not None]
+                percentiles = interval_store.get_percentiles(values, [q * 100 for q in RECENT_QUANTILES])
+                samples += [
+                    ("", {"test_type": t, "quantile": quantile}, value)
+                    for quantile, value in zip(RECENT_QUANTILES, percentiles)
+                    if value is not None
+                ]
+            add_metric(f"recent_{stat}", "gauge", f"quantiles of {stat} over recent runs", samples)
+
+        for name, histogram_def in HISTOGRAMS.items():
+            samples = []
+            for (h_name, t, direction), histogram in sorted(exporter["histograms"].items()):
+                if h_name != name:
+                    continue
+                labels = {"test_type": t, "direction": direction}
+                for bound, count in zip(histogram_def["buckets"], histogram["buckets"]):
+                    samples.append(("_bucket", dict(labels, le=get_value(bound)), count))
+                samples.append(("_bucket", dict(labels, le="+Inf"), histogram["count"]))
+                samples.append(("_sum", labels, histogram["sum"]))
+                samples.append(("_count", labels, histogram["count"]))
+            add_metric(name, "histogram", histogram_def["help"], samples)
+
+    return "\n".join(lines) + "\n"
+
+
+def start_server(exporter, listen):
+    """serve /metrics in a daemon thread
+
+    Args:
+        exporter (dict): exporter state
+        listen (str): address:port
+
+    Returns:
+        obj: http server
+    """
+    address, _, port = listen.rpartition(":")
+
+    class MetricsHandler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render(exporter).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *log_args):
+            log.debug(f"metrics request from {self.client_address[0]}: {format % log_args}")
+
+    address = address.strip("[]") or "0.0.0.0"
+    try:
+        family = socket.getaddrinfo(address, int(port), type=socket.SOCK_STREAM)[0][0]
+    except socket.gaierror as e:
+        log.error(f"metrics listen address {listen} not resolved: {e}")
+        exit(1)
+
+    # ThreadingHTTPServer is IPv4 only - family of listen address (e.g. [::]:9101)
+    class MetricsServer(http.server.ThreadingHTTPServer):
+        address_family = family
+
+    server = MetricsServer((address, int(port)), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    log.info(f"metrics exposed on http://{listen}/metrics")
+    return server
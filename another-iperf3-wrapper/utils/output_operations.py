@@ -9,7 +9,7 @@ from rich.console import Console
 from rich.table import Table
 from rich import box
 
-from utils import args, common, output_operations, data_parsers
+from utils import args, common, output_operations, interval_store, parquet_output
 
 log = logging.getLogger("another-iperf3-wrapper")
 
@@ -43,10 +43,10 @@ def save_to_CSV(test_type, runtest_time, summary_stats_list, interval_stats_list
 
     for index, interval_stats in enumerate(interval_stats_list):
         interval_fn = f"{result_dst_path}{test_type}_intervals_{description}{runtest_time}_{index}.csv"
-        header, CSV_content = data_parsers.prepare_iperf3_interval_results_for_CSV(
-            interval_stats
+        header = interval_store.get_CSV_header(interval_stats, args.obj.resample)
+        common.save_CSV_rows(
+            interval_fn, header, interval_store.get_CSV_rows(interval_stats, header, args.obj.resample)
         )
-        common.save_CSV(interval_fn, header, CSV_content)
         log.debug(f"interval stats data saved in: {interval_fn}")
     log.info(f"interval stats data saved in: {interval_fn}")
 
@@ -75,11 +75,23 @@ def save_to_JSON(test_type, runtest_time, summary_stats_list, interval_stats_lis
 
     for index, interval_stats in enumerate(interval_stats_list):
         interval_fn = f"{result_dst_path}{test_type}_intervals_{description}{runtest_time}_{index}.json"
-        common.save_JSON(interval_fn, interval_stats)
+        common.save_JSON(interval_fn, interval_store.to_interval_stats(interval_stats, args.obj.resample))
         log.debug(f"interval stats data saved in: {interval_fn}")
     log.info(f"interval stats data saved in: {interval_fn}")
 
 
+def save_to_parquet(test_type, runtest_time, summary_stats_list, interval_stats_list):
+    """save information to partitioned parquet dataset
+
+    Args:
+        test_type (str): test type to be included in filename
+        runtest_time (str): runtime information to be included in filename
+        summary_stats_list (list): list of summarize information to be saved
+        interval_stats_list (list): list of interval information to be saved
+    """
+    parquet_output.save_dataset(test_type, runtest_time, summary_stats_list, interval_stats_list)
+
+
 def display_summary_stats(summary_stats):
     """display summarize stats
 
@@ -126,13 +138,13 @@ def display_summary_stats(summary_stats):
     # Add ICMP row
     table.add_row(
         f"[bold]ICMP[/bold]",
-        f"{summary_stats['icmp_pckts_tx']} pckts",
-        f"{summary_stats['icmp_pckts_rx']} pckts",
-        f"{summary_stats['icmp_rtt_avg']} ms",
-        f"{summary_stats['icmp_rtt_min']} ms",
-        f"{summary_stats['icmp_rtt_max']} ms",
-        f"{summary_stats['icmp_rtt_mdev']} ms",
-        f"{summary_stats['icmp_pckts_loss_perc']}%"
+        f"{summary_stats.get('icmp_pckts_tx', 'N/A')} pckts",
+        f"{summary_stats.get('icmp_pckts_rx', 'N/A')} pckts",
+        f"{summary_stats.get('icmp_rtt_avg', 'N/A')} ms",
+        f"{summary_stats.get('icmp_rtt_min', 'N/A')} ms",
+        f"{summary_stats.get('icmp_rtt_max', 'N/A')} ms",
+        f"{summary_stats.get('icmp_rtt_mdev', 'N/A')} ms",
+        f"{summary_stats.get('icmp_pckts_loss_perc', 'N/A')}%"
     )
 
     console.print(table)
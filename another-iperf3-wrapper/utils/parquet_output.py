@@ -0,0 +1,179 @@
+import datetime
+import logging
+import os
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+from utils import args, interval_store
+
+log = logging.getLogger("another-iperf3-wrapper")
+
+# dataset directory in result_dst_path - one sub-directory by table, partitioned by host
+DATASET_DIR = "parquet"
+
+# summary stats which are not floats - iperf3 arguments of sweep and tune (e.g. -w) are strings
+SUMMARY_STRING_COLUMNS = ["aborted", "description", "step", "phase"]
+SUMMARY_INT_COLUMNS = ["iteration", "repetition"]
+SUMMARY_BOOL_COLUMNS = ["knee"]
+# run time of common.get_timestamp_now - local time
+SUMMARY_TIMESTAMP_COLUMNS = {"timestamp": "%Y%m%d-%H%M%S"}
+
+# interval store table => columns
+DATASET_TABLES = {
+    "iperf3_sum": interval_store.IPERF3_SUM_COLUMNS,
+    "iperf3_streams": interval_store.IPERF3_STREAM_COLUMNS,
+    "ping": interval_store.PING_COLUMNS,
+}
+
+
+def check_pyarrow():
+    """exit if pyarrow is not installed"""
+    if pa is None:
+        log.error("parquet output requires pyarrow - pip install pyarrow")
+        exit(1)
+
+
+def get_column_array(values, typecode):
+    """convert store column to arrow array without copy of values - missing values are null
+
+    Args:
+        values (array): column of interval store
+        typecode (str): column typecode
+
+    Returns:
+        obj: arrow array
+    """
+    if typecode in ["d", "n"]:
+        array = pa.Array.from_buffers(pa.float64(), len(values), [None, pa.py_buffer(values)])
+        array = pc.if_else(pc.is_nan(array), pa.scalar(None, pa.float64()), array)
+        return array.cast(pa.int64()) if typecode == "n" else array
+    if typecode == "b":
+        array = pa.Array.from_buffers(pa.int8(), len(values), [None, pa.py_buffer(values)])
+        return pc.if_else(pc.equal(array, -1), pa.scalar(None, pa.bool_()), array.cast(pa.bool_()))
+    arrow_type = {"q": pa.int64(), "i": pa.int32()}[typecode]
+    return pa.Array.from_buffers(arrow_type, len(values), [None, pa.py_buffer(values)])
+
+
+def get_interval_table(interval_stats, table_name, run_columns):
+    """arrow table of an interval store table
+
+    Args:
+        interval_stats (dict): interval store
+        table_name (str): iperf3_sum|iperf3_streams|ping
+        run_columns (dict): columns with same value for every row (run id, test type)
+
+    Returns:
+        obj: arrow table
+    """
+    table = interval_stats[table_name]
+    rows = len(table["timestamp"])
+
+    # epoch as float => timestamp in usec
+    timestamp = get_column_array(table["timestamp"], "d")
+    columns = {
+        name: pa.array([value] * rows, type=pa.string()) for name, value in run_columns.items()
+    }
+    columns["timestamp"] = (
+        pc.round(pc.multiply(timestamp, 1e6)).cast(pa.int64()).cast(pa.timestamp("us", tz="UTC"))
+    )
+    if table_name != "ping":
+        columns["direction"] = pa.DictionaryArray.from_arrays(
+            pa.Array.from_buffers(pa.int8(), rows, [None, pa.py_buffer(table["direction"])]),
+            pa.array(interval_store.DIRECTIONS),
+        )
+    for column, typecode in DATASET_TABLES[table_name].items():
+        columns[column] = get_column_array(table[column], typecode)
+    if table_name == "ping":
+        for key, value in interval_stats["ping_info"].items():
+            columns[key] = pa.array([value] * rows, type=pa.string())
+
+    return pa.table(columns)
+
+
+def get_summary_array(key, values):
+    """arrow array of a summary stat - empty string is null
+
+    Types are fixed by key so that files of every run share the same schema.
+
+    Args:
+        key (str): summary stat
+        values (list): value of each run
+
+    Returns:
+        obj: arrow array
+    """
+    values = [None if v == "" else v for v in values]
+    if key in SUMMARY_STRING_COLUMNS or key.startswith("-"):
+        return pa.array([str(v) if v is not None else None for v in values], type=pa.string())
+    if key in SUMMARY_TIMESTAMP_COLUMNS:
+        values = [
+            datetime.datetime.strptime(v, SUMMARY_TIMESTAMP_COLUMNS[key]).astimezone(datetime.timezone.utc)
+            if v is not None
+            else None
+            for v in values
+        ]
+        # stored as msec - parquet has no sec unit
+        return pa.array(values, type=pa.timestamp("s", tz="UTC"))
+    if key in SUMMARY_INT_COLUMNS:
+        return pa.array(values, type=pa.int64())
+    if key in SUMMARY_BOOL_COLUMNS:
+        return pa.array(values, type=pa.bool_())
+    # numbers parsed from ping output are strings
+    return pa.array([float(v) if v is not None else None for v in values], type=pa.float64())
+
+
+def write_table(table, table_name, filename):
+    """write table in dataset partitioned by host
+
+    Args:
+        table (obj): arrow table
+        table_name (str): dataset table
+        filename (str): parquet filename - unique by run
+    """
+    result_dst_path = os.path.expanduser(args.obj.result_dst_path)
+    path = os.path.join(result_dst_path, DATASET_DIR, table_name, f"host={args.obj.host}")
+    os.makedirs(path, exist_ok=True)
+    pq.write_table(table, os.path.join(path, filename), compression="zstd")
+
+
+def save_dataset(test_type, runtest_time, summary_stats_list, interval_stats_list):
+    """save summary and intervals of runs in partitioned parquet dataset
+
+    result_dst_path/parquet/<table>/host=<host>/<test type>_<run time>.parquet
+    tables: summary, iperf3_sum, iperf3_streams, ping - all runs of all hosts
+    are loaded with a single read of a table directory.
+
+    Args:
+        test_type (str): test type to be included in filename
+        runtest_time (str): runtime information to be included in filename
+        summary_stats_list (list): list of summarize information
+        interval_stats_list (list): list of interval store
+    """
+    check_pyarrow()
+
+    run_ids = [f"{test_type}_{runtest_time}_{index}" for index in range(len(summary_stats_list))]
+    filename = f"{test_type}_{runtest_time}.parquet"
+
+    keys = list(dict.fromkeys(key for summary_stats in summary_stats_list for key in summary_stats))
+    summary = {"run_id": pa.array(run_ids), "test_type": pa.array([test_type] * len(run_ids))}
+    summary.update(
+        {key: get_summary_array(key, [s.get(key, "") for s in summary_stats_list]) for key in keys if key not in summary}
+    )
+    write_table(pa.table(summary), "summary", filename)
+
+    for table_name in DATASET_TABLES:
+        tables = [
+            get_interval_table(interval_stats, table_name, {"run_id": run_id, "test_type": test_type})
+            for run_id, interval_stats in zip(run_ids, interval_stats_list)
+            if interval_store.get_rows_count(interval_stats, table_name)
+        ]
+        if tables:
+            # ping target columns may differ between runs
+            write_table(pa.concat_tables(tables, promote_options="default"), table_name, filename)
+
+    log.info(f"parquet dataset saved in: {os.path.join(args.obj.result_dst_path, DATASET_DIR)}")
@@ -0,0 +1,148 @@
+import logging
+import os
+import re
+
+from utils import args, common, run_commands
+
+log = logging.getLogger("another-iperf3-wrapper")
+
+# cpus of a NUMA node - same range syntax as ports
+NUMA_NODE_CPULIST = "/sys/devices/system/node/node{}/cpulist"
+NUMA_PREFIX = "node:"
+
+
+def get_streams_count(cmd):
+    """return -P streams of iperf3 command
+
+    Args:
+        cmd (str): iperf3 command
+
+    Returns:
+        int: streams
+    """
+    match = re.search(r"-P\s+(\d+)", cmd)
+    return int(match.group(1)) if match else 1
+
+
+def get_processes_count(cmd):
+    """iperf3 processes running streams of command - --split, at most one by stream
+
+    Args:
+        cmd (str): iperf3 command
+
+    Returns:
+        int: processes
+    """
+    return max(min(args.obj.split, get_streams_count(cmd)), 1)
+
+
+def get_required_ports(cmds):
+    """ports required by processes of commands
+
+    Args:
+        cmds (list): iperf3 commands
+
+    Returns:
+        int: ports
+    """
+    return sum(get_processes_count(cmd) for cmd in cmds)
+
+
+def get_cpu_sets():
+    """cpu sets processes are pinned to in turn from --cpu-affinity
+
+    Returns:
+        list: a single cpu by set for cpus, cpus of node for NUMA nodes - empty for no pinning
+    """
+    if not args.obj.cpu_affinity:
+        return []
+    if not args.obj.cpu_affinity.startswith(NUMA_PREFIX):
+        return [[cpu] for cpu in run_commands.check_port_arg(args.obj.cpu_affinity)]
+
+    cpu_sets = []
+    for node in run_commands.check_port_arg(args.obj.cpu_affinity[len(NUMA_PREFIX) :]):
+        try:
+            with open(NUMA_NODE_CPULIST.format(node), "r") as f:
+                cpu_sets.append(run_commands.check_port_arg(f.read().strip()))
+        except OSError as e:
+            log.error(f"cpus of NUMA node {node} not found: {e}")
+            exit(1)
+    return cpu_sets
+
+
+def get_ports(ports, count):
+    """ports of processes - consecutive ports added after last one when not enough given
+
+    Args:
+        ports (list): ports available
+        count (int): ports required
+
+    Returns:
+        list: ports
+    """
+    ports = list(ports[:count])
+    if len(ports) < count:
+        log.warning(f"{len(ports)} ports given - {count} required - following ones added after {ports[-1]}")
+    while len(ports) < count:
+        ports.append(ports[-1] + 1)
+    return ports
+
+
+def place_cmds(cmds, ports):
+    """split iperf3 commands into processes on their own port, each pinned to its cpus
+
+    -P streams of a command are shared by --split processes, first ones get one
+    more when not divisible. Processes are pinned to cpu sets of --cpu-affinity in
+    turn: with iperf3 -A for a cpu, with sched_setaffinity once started for a NUMA
+    node (local processes only).
+
+    Args:
+        cmds (list): iperf3 commands - one by direction
+        ports (list): ports for processes of all commands, in order
+
+    Returns:
+        list: commands of processes
+    """
+    cpu_sets = get_cpu_sets()
+    ports = get_ports(ports, get_required_ports(cmds))
+    # command => cpus set once process started
+    common.data["cmd_cpus"] = {}
+
+    placed_cmds = []
+    for cmd in cmds:
+        streams = get_streams_count(cmd)
+        count = get_processes_count(cmd)
+        for index in range(count):
+            process_cmd = re.sub(r"-p\s+\d+\s", f"-p {ports[len(placed_cmds)]} ", cmd)
+            if count > 1:
+                process_cmd = re.sub(r"-P\s+\d+", f"-P {streams // count + (index < streams % count)}", process_cmd)
+
+            cpus = cpu_sets[len(placed_cmds) % len(cpu_sets)] if cpu_sets else None
+            if cpus and len(cpus) == 1:
+                process_cmd += f" -A {cpus[0]}"
+            elif cpus:
+                common.data["cmd_cpus"][process_cmd] = cpus
+            placed_cmds.append(process_cmd)
+
+    if common.data["cmd_cpus"] and (args.obj.runner in ["replay", "ssh"] or args.obj.dry_run):
+        log.warning("NUMA node placement applies to local processes only - not pinned")
+    if len(placed_cmds) > len(cmds):
+        log.info(f"{len(placed_cmds)} iperf3 processes: {placed_cmds}")
+    return placed_cmds
+
+
+def set_affinity(process, cmd):
+    """pin started process to cpus of its command - NUMA node placement
+
+    Args:
+        process (obj): started process
+        cmd (str): command
+    """
+    cpus = common.data.get("cmd_cpus", {}).get(cmd)
+    if not cpus:
+        return
+    try:
+        os.sched_setaffinity(process.pid, cpus)
+        log.debug(f"process pid: {process.pid} pinned to cpus {cpus}")
+    except (OSError, AttributeError) as e:
+        log.warning(f"could not pin process pid: {process.pid} to cpus {cpus}: {e}")
@@ -0,0 +1,170 @@
+import fcntl
+import json
+import logging
+import os
+import tempfile
+import time
+
+from utils import args, common
+
+log = logging.getLogger("another-iperf3-wrapper")
+
+CACHE_FILE = "~/.config/another-iperf3-wrapper/port-cache.json"
+
+# maximum amount of (host, port) entries kept in cache
+CACHE_MAX_ENTRIES = 4096
+
+
+def get_cache_key(host, port):
+    """return cache key for given host and port
+
+    Args:
+        host (str): iperf3 server
+        port (int): port
+
+    Returns:
+        str: cache key
+    """
+    return f"{host}:{port}"
+
+
+def read_cache(cache_file):
+    """read port cache file
+
+    Args:
+        cache_file (str): cache file
+
+    Returns:
+        dict: port cache by key with status and timestamp - empty if not readable
+    """
+    try:
+        with open(cache_file, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        log.debug(f"no port cache found: {cache_file}")
+    except (ValueError, OSError) as e:
+        log.debug(f"could not load port cache: {e}")
+    return {}
+
+
+def load_cache():
+    """load port cache from disk once and keep it in common data
+
+    Returns:
+        dict: port cache by key with status and timestamp
+    """
+    if "port_cache" not in common.data:
+        common.data["port_cache"] = read_cache(os.path.expanduser(CACHE_FILE))
+        # key => time of invalidation, not restored from entries saved meanwhile by other jobs
+        common.data["port_cache_invalidated"] = {}
+    return common.data["port_cache"]
+
+
+def merge_entries(saved, cache):
+    """merge entries saved on disk by other jobs into port cache - most recent entry by key
+
+    Args:
+        saved (dict): port cache read from disk
+        cache (dict): port cache of this job - updated
+
+    Returns:
+        dict: port cache
+    """
+    invalidated = common.data.get("port_cache_invalidated", {})
+    for key, entry in saved.items():
+        if entry["ts"] <= invalidated.get(key, 0):
+            continue
+        if key not in cache or cache[key]["ts"] < entry["ts"]:
+            cache[key] = entry
+    return cache
+
+
+def save_cache():
+    """evict expired entries and persist port cache on disk
+
+    Jobs of the scheduler save at the same time: the file is locked while entries
+    saved by other jobs are merged and written to a unique temporary file replacing it.
+    """
+    cache_file = os.path.expanduser(CACHE_FILE)
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        with open(f"{cache_file}.lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            cache = evict_entries(merge_entries(read_cache(cache_file), load_cache()))
+            fd, tmp_file = tempfile.mkstemp(dir=os.path.dirname(cache_file), suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w") as f:
+                    json.dump(cache, f)
+                os.replace(tmp_file, cache_file)
+            except OSError:
+                os.remove(tmp_file)
+                raise
+    except OSError as e:
+        log.debug(f"could not save port cache: {e}")
+
+
+def evict_entries(cache):
+    """remove expired entries and keep only most recent CACHE_MAX_ENTRIES
+
+    Args:
+        cache (dict): port cache
+
+    Returns:
+        dict: port cache
+    """
+    now = time.time()
+    for key in [k for k, v in cache.items() if now - v["ts"] > args.obj.probe_cache_ttl]:
+        del cache[key]
+
+    if len(cache) > CACHE_MAX_ENTRIES:
+        oldest = sorted(cache, key=lambda k: cache[k]["ts"])
+        for key in oldest[: len(cache) - CACHE_MAX_ENTRIES]:
+            del cache[key]
+    return cache
+
+
+def get_ports(host, ports_list, status):
+    """return ports with given status recently recorded in cache
+
+    Args:
+        host (str): iperf3 server
+        ports_list (list): ports to look for
+        status (str): available|busy
+
+    Returns:
+        list: ports with given status
+    """
+    cache = load_cache()
+    now = time.time()
+    ports = []
+    for port in ports_list:
+        entry = cache.get(get_cache_key(host, port))
+        if entry and entry["status"] == status and now - entry["ts"] <= args.obj.probe_cache_ttl:
+            ports.append(port)
+    return ports
+
+
+def set_port_status(host, port, status):
+    """record probe result in cache
+
+    Args:
+        host (str): iperf3 server
+        port (int): port probed
+        status (str): available|busy
+    """
+    load_cache()[get_cache_key(host, port)] = {"status": status, "ts": time.time()}
+
+
+def invalidate(host, port):
+    """remove port from cache - after a failed test on this port
+
+    Args:
+        host (str): iperf3 server
+        port (int): port
+    """
+    key = get_cache_key(host, port)
+    cache = load_cache()
+    common.data["port_cache_invalidated"][key] = time.time()
+    if cache.pop(key, None):
+        log.debug(f"port cache entry invalidated: {host}:{port}")
+        save_cache()
@@ -0,0 +1,215 @@
+import csv
+import io
+import json
+import logging
+import os
+
+from utils import args, common, interval_store, output_operations
+
+log = logging.getLogger("another-iperf3-wrapper")
+
+
+def get_run_key(iteration, step):
+    """key of a run in a campaign
+
+    Args:
+        iteration (int): iteration
+        step (str): test of the iteration (e.g. download, bufferbloat)
+
+    Returns:
+        str: run key
+    """
+    return f"{iteration}:{step}"
+
+
+def write_durably(f):
+    """flush file to disk - survive a crash of wrapper or host
+
+    Args:
+        f (file): open file
+    """
+    f.flush()
+    os.fsync(f.fileno())
+
+
+def rewrite(filename, content):
+    """replace file content atomically
+
+    Args:
+        filename (str): file to replace
+        content (str): new content
+    """
+    with open(f"{filename}.tmp", "w", newline="") as f:
+        f.write(content)
+        write_durably(f)
+    os.replace(f"{filename}.tmp", filename)
+
+
+def get_summary_CSV(header, summary_stats_list):
+    """return summary stats as CSV content
+
+    Args:
+        header (list): CSV header
+        summary_stats_list (iterable): summary stats of runs
+
+    Returns:
+        str: CSV content
+    """
+    content = io.StringIO()
+    writer = csv.DictWriter(content, fieldnames=header, restval="")
+    writer.writeheader()
+    writer.writerows(summary_stats_list)
+    return content.getvalue()
+
+
+def get_summary_header(header, summary_stats_list):
+    """return summary CSV header extended with columns of summary stats
+
+    Args:
+        header (list): current CSV header, None if not written yet
+        summary_stats_list (iterable): summary stats of runs
+
+    Returns:
+        list: header with new columns appended in order of appearance
+    """
+    header = list(header or [])
+    for summary_stats in summary_stats_list:
+        header.extend(key for key in summary_stats if key not in header)
+    return header
+
+
+def new_sink(test_type, campaign=None):
+    """initialize result sink of a campaign - results are appended as soon as a run is done
+
+    Files are named as with save_to_CSV, with campaign name instead of run time.
+    Summary of each run is journaled in a JSON lines file, runs found in it are
+    completed runs of an interrupted campaign which is resumed.
+
+    Args:
+        test_type (str): test type to be included in filename
+        campaign (str, optional): campaign name, resume campaign if already started. Defaults to None.
+
+    Returns:
+        dict: sink state, None if results are not saved (no --csv, --json or --parquet)
+    """
+    if not args.obj.csv and not args.obj.json and not args.obj.parquet:
+        if campaign:
+            log.warning("campaign set without --csv, --json or --parquet - results not saved, campaign can't be resumed")
+        return None
+
+    description = f"{args.obj.description}_" if args.obj.description else ""
+    result_dst_path = os.path.expanduser(args.obj.result_dst_path)
+    os.makedirs(result_dst_path, exist_ok=True)
+
+    sink = {
+        "prefix": f"{result_dst_path}{test_type}",
+        "name": f"{description}{campaign or common.get_timestamp_now()}",
+        "completed": {},
+        "summary_header": None,
+        "runs": 0,
+    }
+    sink["journal_fn"] = f"{sink['prefix']}_summary_{sink['name']}.jsonl"
+    sink["summary_fn"] = f"{sink['prefix']}_summary_{sink['name']}.csv"
+
+    if os.path.exists(sink["summary_fn"]):
+        with open(sink["summary_fn"], newline="") as f:
+            sink["summary_header"] = next(csv.reader(f), None)
+
+    if os.path.exists(sink["journal_fn"]):
+        with open(sink["journal_fn"]) as f:
+            lines = f.read().split("\n")
+        # last line incomplete if interrupted while writing
+        if lines[-1]:
+            log.debug(f"incomplete journal line dropped: {lines[-1]}")
+        for line in lines[:-1]:
+            summary_stats = json.loads(line)
+            sink["completed"][get_run_key(summary_stats["iteration"], summary_stats["step"])] = summary_stats
+        sink["runs"] = len(sink["completed"])
+        log.info(f"resume campaign {sink['name']}: {sink['runs']} runs already completed")
+
+        # journal is the reference - rewritten without incomplete line, summary CSV rewritten from it
+        rewrite(sink["journal_fn"], "".join(f"{line}\n" for line in lines[:-1]))
+        if args.obj.csv and sink["summary_header"]:
+            sink["summary_header"] = get_summary_header(sink["summary_header"], sink["completed"].values())
+            rewrite(sink["summary_fn"], get_summary_CSV(sink["summary_header"], sink["completed"].values()))
+
+    return sink
+
+
+def get_completed(sink, iteration, step):
+    """return summary stats of run if already completed in resumed campaign
+
+    Args:
+        sink (dict): sink state or None
+        iteration (int): iteration
+        step (str): test of the iteration
+
+    Returns:
+        dict: summary stats, None if not completed
+    """
+    if not sink:
+        return None
+    return sink["completed"].get(get_run_key(iteration, step))
+
+
+def append_run(sink, iteration, step, summary_stats, interval_stats):
+    """append results of a run to campaign files and flush them to disk
+
+    Args:
+        sink (dict): sink state or None
+        iteration (int): iteration
+        step (str): test of the iteration
+        summary_stats (dict): summary stats of run
+        interval_stats (dict): interval store of run
+
+    Returns:
+        dict: summary stats with iteration and step
+    """
+    summary_stats = dict({"iteration": iteration, "step": step}, **summary_stats)
+    if not sink:
+        return summary_stats
+
+    index = sink["runs"]
+    sink["runs"] += 1
+
+    # intervals first - run is completed once journaled
+    if args.obj.csv:
+        interval_fn = f"{sink['prefix']}_intervals_{sink['name']}_{index}.csv"
+        header = interval_store.get_CSV_header(interval_stats, args.obj.resample)
+        common.save_CSV_rows(
+            interval_fn, header, interval_store.get_CSV_rows(interval_stats, header, args.obj.resample)
+        )
+        log.debug(f"interval stats data saved in: {interval_fn}")
+
+        header = get_summary_header(sink["summary_header"], [summary_stats])
+        if header != sink["summary_header"]:
+            # new columns (e.g. bufferbloat step after download) - header grows, previous runs rewritten
+            sink["summary_header"] = header
+            rewrite(
+                sink["summary_fn"], get_summary_CSV(header, list(sink["completed"].values()) + [summary_stats])
+            )
+        else:
+            with open(sink["summary_fn"], "a", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=header, restval="")
+                writer.writerow(summary_stats)
+                write_durably(f)
+        log.info(f"summary stats data appended in: {sink['summary_fn']}")
+
+    if args.obj.json:
+        interval_fn = f"{sink['prefix']}_intervals_{sink['name']}_{index}.json"
+        common.save_JSON(interval_fn, interval_store.to_interval_stats(interval_stats, args.obj.resample))
+        log.debug(f"interval stats data saved in: {interval_fn}")
+
+    if args.obj.parquet:
+        output_operations.save_to_parquet(
+            os.path.basename(sink["prefix"]), f"{sink['name']}_{index}", [summary_stats], [interval_stats]
+        )
+
+    with open(sink["journal_fn"], "a") as f:
+        f.write(json.dumps(summary_stats) + "\n")
+        write_durably(f)
+    if args.obj.json:
+        log.info(f"summary stats data appended in: {sink['journal_fn']}")
+
+    sink["completed"][get_run_key(iteration, step)] = summary_stats
+    return summary_stats
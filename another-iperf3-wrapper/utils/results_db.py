@@ -0,0 +1,267 @@
+import json
+import logging
+import math
+import os
+import sqlite3
+import time
+
+from utils import args, interval_store
+
+log = logging.getLogger("another-iperf3-wrapper")
+
+# metric => summary stat stored as column of runs table
+HISTORY_METRICS = {
+    "downstream": "downstream_bits_per_second",
+    "upstream": "upstream_bits_per_second",
+    "rtt": "avg",
+    "rtt_p95": "rtt_p95",
+    "icmp_rtt": "icmp_rtt_avg",
+    "icmp_loss": "icmp_pckts_loss_perc",
+    # effective latency increase under load as bufferbloat grade
+    "latency_increase": None,
+}
+
+# subcommands varying iperf3 arguments between runs - their runs are kept out of history and baselines
+EXPLORATION_SUBCOMMANDS = ["sweep", "tune"]
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    host TEXT NOT NULL,
+    unix_time REAL NOT NULL,
+    timestamp TEXT,
+    test_type TEXT,
+    subcommand TEXT,
+    description TEXT,
+    commands TEXT,
+    summary TEXT,
+    {", ".join(f"{metric} REAL" for metric in HISTORY_METRICS)}
+);
+CREATE INDEX IF NOT EXISTS runs_host_time ON runs (host, unix_time);
+CREATE INDEX IF NOT EXISTS runs_time ON runs (unix_time);
+CREATE INDEX IF NOT EXISTS runs_test_type ON runs (test_type, unix_time);
+CREATE INDEX IF NOT EXISTS runs_description ON runs (description, unix_time);
+
+CREATE TABLE IF NOT EXISTS intervals (
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    kind TEXT NOT NULL,
+    direction TEXT,
+    socket INTEGER,
+    unix_time REAL NOT NULL,
+    bits_per_second REAL,
+    retransmits INTEGER,
+    rtt REAL,
+    snd_cwnd INTEGER,
+    icmp_time REAL
+);
+CREATE INDEX IF NOT EXISTS intervals_run ON intervals (run_id, kind);
+"""
+
+# rows inserted by executemany call
+INSERT_BATCH_SIZE = 10000
+
+
+def connect(db_file):
+    """open results database - created if needed, WAL mode so several jobs can write
+
+    Args:
+        db_file (str): database file
+
+    Returns:
+        obj: sqlite3 connection
+    """
+    db_file = os.path.expanduser(db_file)
+    os.makedirs(os.path.dirname(db_file) or ".", exist_ok=True)
+    # wait for other jobs writing at same time
+    connection = sqlite3.connect(db_file, timeout=30)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.executescript(SCHEMA)
+
+    # metrics added after database creation
+    columns = [row[1] for row in connection.execute("PRAGMA table_info(runs)")]
+    for metric in HISTORY_METRICS:
+        if metric not in columns:
+            connection.execute(f"ALTER TABLE runs ADD COLUMN {metric} REAL")
+    return connection
+
+
+def get_number(value):
+    """summary stat as number, None if empty or not a number"""
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if not math.isnan(value) else None
+
+
+def get_metrics(summary_stats):
+    """return value of each metric of HISTORY_METRICS from summary stats
+
+    Args:
+        summary_stats (dict): summary stats
+
+    Returns:
+        list: metric values, None if not available
+    """
+    metrics = [get_number(summary_stats.get(stat)) if stat else None for stat in HISTORY_METRICS.values()]
+
+    rtt_max = get_number(summary_stats.get("icmp_rtt_max"))
+    rtt_min = get_number(summary_stats.get("icmp_rtt_min"))
+    if rtt_max is not None and rtt_min is not None:
+        metrics[list(HISTORY_METRICS).index("latency_increase")] = rtt_max - rtt_min
+
+    return metrics
+
+
+def get_interval_rows(run_id, interval_stats):
+    """generate interval rows of a run from interval store
+
+    Args:
+        run_id (int): run id
+        interval_stats (dict): interval store
+
+    Yields:
+        tuple: intervals table row
+    """
+
+    def get(table, column, index):
+        value = table[column][index]
+        return value if not math.isnan(value) else None
+
+    table = interval_stats["iperf3_sum"]
+    for index, timestamp in enumerate(table["timestamp"]):
+        yield (
+            run_id,
+            "sum",
+            interval_store.DIRECTIONS[table["direction"][index]],
+            None,
+            timestamp,
+            get(table, "bits_per_second", index),
+            get(table, "retransmits", index),
+            None,
+            None,
+            None,
+        )
+
+    table = interval_stats["iperf3_streams"]
+    for index, timestamp in enumerate(table["timestamp"]):
+        yield (
+            run_id,
+            "stream",
+            interval_store.DIRECTIONS[table["direction"][index]],
+            table["socket"][index],
+            timestamp,
+            get(table, "bits_per_second", index),
+            get(table, "retransmits", index),
+            get(table, "rtt", index),
+            get(table, "snd_cwnd", index),
+            None,
+        )
+
+    table = interval_stats["ping"]
+    for index, timestamp in enumerate(table["timestamp"]):
+        yield (run_id, "ping", None, None, timestamp, None, None, None, None, get(table, "icmp_time", index))
+
+
+def save_run(test_type, commands, summary_stats, interval_stats):
+    """save run in results database - summary, intervals and command lines in one transaction
+
+    Run is tagged with subcommand (e.g. all, sweep, empty for single test).
+
+    Args:
+        test_type (str): ST|BBT
+        commands (list): command lines run
+        summary_stats (dict): summary stats
+        interval_stats (dict): interval store
+    """
+    connection = connect(args.obj.db)
+    try:
+        with connection:
+            cursor = connection.execute(
+                f"""INSERT INTO runs (host, unix_time, timestamp, test_type, subcommand, description, commands,
+                summary, {", ".join(HISTORY_METRICS)}) VALUES ({", ".join(["?"] * (8 + len(HISTORY_METRICS)))})""",
+                [
+                    args.obj.host,
+                    time.time(),
+                    summary_stats.get("timestamp", ""),
+                    test_type,
+                    args.obj.cmd or "",
+                    args.obj.description,
+                    json.dumps(commands),
+                    json.dumps(summary_stats),
+                ]
+                + get_metrics(summary_stats),
+            )
+            run_id = cursor.lastrowid
+
+            rows = get_interval_rows(run_id, interval_stats)
+            while True:
+                batch = [row for _, row in zip(range(INSERT_BATCH_SIZE), rows)]
+                if not batch:
+                    break
+                connection.executemany("INSERT INTO intervals VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", batch)
+        log.debug(f"run {run_id} saved in results database {args.obj.db}")
+    finally:
+        connection.close()
+
+
+def get_runs(db_file, metrics, since, hosts=None, test_type=None, description=None):
+    """return metric values of runs since given time - runs of EXPLORATION_SUBCOMMANDS excluded
+
+    Args:
+        db_file (str): database file
+        metrics (list): metrics of HISTORY_METRICS
+        since (float): epoch of oldest run
+        hosts (list, optional): only these hosts. Defaults to None.
+        test_type (str, optional): only this test type. Defaults to None.
+        description (str, optional): only runs with this description. Defaults to None.
+
+    Returns:
+        list: runs as dict with id, host, test_type, subcommand, commands, unix_time and metrics,
+            sorted by host, test type and time
+    """
+    columns = ["id", "host", "test_type", "subcommand", "commands", "unix_time"] + metrics
+    query = (
+        f"SELECT {', '.join(columns)} FROM runs WHERE unix_time >= ?"
+        f" AND subcommand NOT IN ({', '.join(['?'] * len(EXPLORATION_SUBCOMMANDS))})"
+    )
+    params = [since] + EXPLORATION_SUBCOMMANDS
+    if hosts:
+        query += f" AND host IN ({', '.join(['?'] * len(hosts))})"
+        params += hosts
+    if test_type:
+        query += " AND test_type = ?"
+        params.append(test_type)
+    if description:
+        query += " AND description = ?"
+        params.append(description)
+    query += " ORDER BY host, test_type, unix_time, id"
+
+    connection = connect(db_file)
+    try:
+        return [dict(zip(columns, row)) for row in connection.execute(query, params)]
+    finally:
+        connection.close()
+
+
+def get_history(db_file, metric, since, hosts=None, test_type=None, description=None):
+    """return metric values of runs by host since given time
+
+    Args:
+        db_file (str): database file
+        metric (str): metric of HISTORY_METRICS
+        since (float): epoch of oldest run
+        hosts (list, optional): only these hosts. Defaults to None.
+        test_type (str, optional): only this test type. Defaults to None.
+        description (str, optional): only runs with this description. Defaults to None.
+
+    Returns:
+        dict: host => list of (unix_time, value) sorted by time
+    """
+    history = {}
+    runs = get_runs(db_file, [metric], since, hosts, test_type, description)
+    for run in sorted(runs, key=lambda run: (run["host"], run["unix_time"])):
+        if run[metric] is not None:
+            history.setdefault(run["host"], []).append((run["unix_time"], run[metric]))
+    return history
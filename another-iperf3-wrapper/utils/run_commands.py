@@ -1,11 +1,19 @@
 import logging
+import math
+import os
+import random
+import selectors
+import signal
+import socket
+import threading
 import time
 import itertools
 import re
 
-from subprocess import Popen, PIPE, check_output
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from subprocess import Popen, PIPE
 
-from utils import args, common
+from utils import args, common, port_cache, latency_prober, runners, server_pool
 
 
 log = logging.getLogger("another-iperf3-wrapper")
@@ -104,7 +112,7 @@ def expand_cmds_args(cmds_args):
                     range_n = v.split("-")
                     new_v = [
                         str(element)
-                        for element in list(range(int(range_n[0]), int(range_n[1])))
+                        for element in list(range(int(range_n[0]), int(range_n[1]) + 1))
                     ]
                     new_arg_value.extend(new_v)
                 except Exception as e:
@@ -165,6 +173,10 @@ def cmd_preparation():
         "-Z": "",
     }
 
+    if args.obj.json_stream or args.obj.live or args.obj.abort_if:
+        # line-delimited json output - one event per interval
+        cmds_args["--json-stream"] = ""
+
     if args.obj.reverse:
         cmds_args["-R"] = ""
 
@@ -174,6 +186,12 @@ def cmd_preparation():
     if args.obj.bitrate:
         cmds_args["-b"] = args.obj.bitrate
 
+    if args.obj.window:
+        cmds_args["-w"] = args.obj.window
+
+    if args.obj.report_interval:
+        cmds_args["-i"] = str(args.obj.report_interval)
+
     if args.obj.iperf3_args:
         iperf3_args = str(args.obj.iperf3_args).replace("\\", "")
         cmds_args[iperf3_args] = ""
@@ -181,77 +199,370 @@ def cmd_preparation():
     cmds_args_expanded = expand_cmds_args(cmds_args)
     cmds_args_generated = generate_cmds_args(cmds_args_expanded)
     common.data["commands"] = generate_cmds("iperf3", cmds_args_generated)
+
+    # swept arguments (more than one value) and their value for each command
+    common.data["swept_args"] = [
+        arg for arg, value in cmds_args_expanded.items() if len(value) > 1
+    ]
+    common.data["commands_params"] = [
+        dict(zip(cmds_args_expanded.keys(), values))
+        for values in itertools.product(*cmds_args_expanded.values())
+    ]
     
     
-def run_commands(commands):
-    """run commands dict from a
+def get_ping_cmd(host, duration):
+    """build latency measurement command for given duration
+
+    System ping is run with timestamps and report of packets without answer
+    (-6 for IPv6 address), native prober is run in-process (--latency-prober native).
+
+    Args:
+        host (str): host to ping
+        duration (float): duration in seconds
+
+    Returns:
+        str: ping command
+    """
+    count = max(math.ceil(duration / args.obj.ping_interval), 1)
+    if args.obj.latency_prober == "native":
+        return f"{latency_prober.NATIVE_PING_CMD} {host} -c {count} -i {args.obj.ping_interval} -U {args.obj.udp_echo_port}"
+
+    interval = f" -i {args.obj.ping_interval}" if args.obj.ping_interval != 1 else ""
+    ip_version = " -6" if ":" in host else ""
+    return f"ping {host} -c {count}{interval} -D -O{ip_version}"
+
+
+def get_cmd_type(cmd):
+    """return type of command
+
+    Args:
+        cmd (str): command
+
+    Returns:
+        str: iperf3|ping
+    """
+    program = cmd.split()[0]
+    return "ping" if program in ["ping", latency_prober.NATIVE_PING_CMD] else program
+
+
+def get_cmd_direction(cmd):
+    """return direction of iperf3 command
+
+    Args:
+        cmd (str): iperf3 command
+
+    Returns:
+        str: downstream|upstream
+    """
+    return "downstream" if "-R" in cmd.split() else "upstream"
+
+
+def get_cmd_duration(cmd):
+    """estimate how long a command is expected to run from its arguments
+
+    Args:
+        cmd (str): iperf3 or ping command
+
+    Returns:
+        float: expected duration in seconds
+    """
+    cmd_args = cmd.split()
+
+    def get_arg_value(arg, default):
+        try:
+            return float(cmd_args[cmd_args.index(arg) + 1])
+        except (ValueError, IndexError):
+            return default
+
+    if cmd_args[0] == "iperf3":
+        return get_arg_value("-t", 10)
+    if get_cmd_type(cmd) == "ping" and "-c" in cmd_args:
+        return get_arg_value("-c", 0) * get_arg_value("-i", 1)
+    return 0
+
+
+def supervise_processes(selector, processes, output, until=None, abort_state=None):
+    """read all processes output and collect exits until all completed or `until` reached
+
+    Args:
+        selector (obj): selector with stdout of running processes registered
+        processes (dict): running processes by command
+        output (dict): output by command, filled as processes complete
+        until (float, optional): monotonic time to stop supervising. Defaults to None.
+        abort_state (dict, optional): all processes are terminated once its "reason" is set. Defaults to None.
+    """
+    while processes:
+        now = time.monotonic()
+        if until is not None and now >= until:
+            break
+
+        # abort requested - terminate all processes
+        if abort_state and abort_state["reason"] and not abort_state["terminated"]:
+            log.warning(f"abort: {abort_state['reason']} - terminate all commands")
+            abort_state["terminated"] = True
+            for proc in processes.values():
+                proc["terminated"] = True
+                proc["process"].send_signal(signal.SIGINT)
+                proc["deadline"] = now + 2
+
+        # enforce per command deadline
+        for cmd, proc in processes.items():
+            if now >= proc["deadline"] and not proc["terminated"]:
+                log.warning(
+                    f"timeout reached after {round(now - proc['start'], 2)}s - terminate cmd: '{cmd}'"
+                )
+                proc["timed_out"] = True
+                proc["terminated"] = True
+                # SIGINT - iperf3 and ping display results before exiting
+                proc["process"].send_signal(signal.SIGINT)
+                # give some time to flush partial results before killing it
+                proc["deadline"] = now + 2
+            elif now >= proc["deadline"]:
+                proc["process"].kill()
+                proc["deadline"] = now + 2
+
+        next_event = min(proc["deadline"] for proc in processes.values())
+        if until is not None:
+            next_event = min(next_event, until)
+
+        for key, _ in selector.select(timeout=max(next_event - now, 0)):
+            cmd = key.data
+            proc = processes[cmd]
+            chunk = os.read(key.fd, 65536)
+            if chunk and proc["line_handler"]:
+                # feed complete lines to handler - output not kept
+                lines = (proc["partial"] + chunk).split(b"\n")
+                proc["partial"] = lines.pop()
+                for line in lines:
+                    proc["line_handler"](line.decode(errors="replace"))
+                continue
+            if chunk:
+                proc["chunks"].append(chunk)
+                continue
+
+            # EOF - process closed its stdout and is exiting
+            selector.unregister(key.fileobj)
+            key.fileobj.close()
+            returncode = proc["process"].wait()
+            wall_time = time.monotonic() - proc["start"]
+
+            if proc["line_handler"] and proc["partial"]:
+                proc["line_handler"](proc["partial"].decode(errors="replace"))
+            output[cmd] = b"".join(proc["chunks"]).decode(errors="replace")
+            log.debug(output[cmd])
+            common.data["process_stats"][cmd] = {
+                "wall_time": round(wall_time, 3),
+                "returncode": returncode,
+                "timed_out": proc["timed_out"],
+                "aborted": bool(abort_state and abort_state["terminated"]),
+            }
+            log.debug(
+                f"process pid: {proc['process'].pid} completed in {round(wall_time, 3)}s "
+                f"(returncode: {returncode}) cmd: {cmd}"
+            )
+            del processes[cmd]
+
+
+def run_commands(commands, line_handlers=None, abort_state=None):
+    """run commands dict and supervise them until completion or timeout
 
     Args:
         commands (dict): commands to run and sleep time between them
+        line_handlers (dict, optional): function by command called on each output line
+            as it is produced - output of these commands is not kept. Defaults to None.
+        abort_state (dict, optional): set "reason" from a line handler to terminate all commands. Defaults to None.
 
     Returns:
         dict: output from command execution
     """
     processes = {}
     output = {}
-    if not args.obj.dry_run:
+    line_handlers = line_handlers or {}
+    common.data["process_stats"] = {}
+    start_cmd = runners.get_runner()
+    with selectors.DefaultSelector() as selector:
         for cmd, sleep_time in commands.items():
+            if abort_state and abort_state["reason"]:
+                break
             log.info(f"run cmd: '{cmd}'")
-            processes[cmd] = Popen(cmd.split(), stdout=PIPE, universal_newlines=True)
-            time.sleep(sleep_time)
+            process = start_cmd(cmd)
+            os.set_blocking(process.stdout.fileno(), False)
+            selector.register(process.stdout, selectors.EVENT_READ, cmd)
+            start = time.monotonic()
+            processes[cmd] = {
+                "process": process,
+                "start": start,
+                "deadline": start + get_cmd_duration(cmd) + args.obj.timeout,
+                "timed_out": False,
+                "terminated": False,
+                "chunks": [],
+                "line_handler": line_handlers.get(cmd),
+                "partial": b"",
+            }
+            # keep reading outputs while waiting to launch next command
+            supervise_processes(
+                selector, processes, output, until=time.monotonic() + sleep_time, abort_state=abort_state
+            )
         log.debug("processes check start")
-        for t in range(1, args.obj.timeout):
-            for cmd, process in processes.items():
-                log.debug(f"process pid: {process.pid} cmd: {cmd}")
+        supervise_processes(selector, processes, output, abort_state=abort_state)
+    log.debug("processes finished")
 
-                try:
-                    outs, errs = process.communicate(timeout=1)
-                    log.debug(outs)
-                    output[cmd] = outs  # process.stdout.read()
-                    # make sure process completed
-                    process.kill()
-                    del processes[cmd]
-                    # break to re-iterate over
-                    break
-                except Exception as e:
-                    log.debug(f"Exception: {e}")
-                    time.sleep(1)
+    return output
 
-            if not processes:
-                break
-            time.sleep(1)
-        log.debug("processes finished")
-
-    else:
-        # dry-run mode - load output from file
-        with open(
-            "samples/iperf3_c172.16.1.238_p5201_t5_P10_J_20220222-170451.json",
-            "r",
-        ) as f:
-            output["iperf3 -c 172.16.1.238 -p 5201 -t 5 -P 10 -J   "] = f.read()
-
-        with open(
-            "samples/iperf3_c172.16.1.238_p5201_t5_P10_J_R_20220222-170451.json",
-            "r",
-        ) as f:
-            output["iperf3 -c 172.16.1.238 -p 5201 -t 5 -P 10 -J  -R "] = f.read()
-
-        with open(
-            "samples/ping172.16.1.238_c15_D_20220222-170451.log",
-            "r",
-        ) as f:
-            output["ping 172.16.1.238 -c 15 -D"] = f.read()
 
-    return output
+# iperf3 control protocol - see iperf_api.h
+IPERF3_COOKIE_SIZE = 37
+IPERF3_COOKIE_CHARS = "abcdefghijklmnopqrstuvwxyz234567"
+IPERF3_PARAM_EXCHANGE = 9
+IPERF3_ACCESS_DENIED = -1
+IPERF3_SERVER_ERROR = -2
 
 
-def probe_iperf3(host, ports_list, required_ports=2):
+def probe_tcp_connect(host, port, timeout=0.5):
+    """open a TCP connection to iperf3 control port
+
+    Args:
+        host (str): iperf3 server
+        port (int): port to probe
+        timeout (float, optional): connect timeout in seconds. Defaults to 0.5.
+
+    Returns:
+        obj: connected socket or None if port is not reachable
+    """
+    try:
+        return socket.create_connection((host, port), timeout=timeout)
+    except OSError as e:
+        log.debug(f"port {port}: TCP connect failed: {e}")
+        return None
+
+
+def probe_iperf3_control(sock, port):
+    """check iperf3 server state with control protocol handshake - no data sent
+
+    The client cookie is sent and the server answers with its state:
+    PARAM_EXCHANGE when ready to run a test, ACCESS_DENIED when busy.
+    Connection is then closed, the server drops it and keeps listening.
+
+    Args:
+        sock (obj): connected socket to iperf3 control port
+        port (int): port probed
+
+    Returns:
+        bool: True if server is ready to run a test
+    """
+    cookie = "".join(random.choice(IPERF3_COOKIE_CHARS) for _ in range(IPERF3_COOKIE_SIZE - 1))
+    try:
+        sock.sendall(cookie.encode() + b"\0")
+        state = sock.recv(1)
+    except OSError as e:
+        log.debug(f"port {port}: control handshake failed: {e}")
+        return False
+
+    if not state:
+        log.debug(f"port {port}: control connection closed by server")
+        return False
+
+    state = int.from_bytes(state, "big", signed=True)
+    if state == IPERF3_ACCESS_DENIED:
+        log.debug(f"port {port}: the server is busy running a test")
+    elif state == IPERF3_SERVER_ERROR:
+        log.debug(f"port {port}: server error")
+    elif state != IPERF3_PARAM_EXCHANGE:
+        log.debug(f"port {port}: unexpected state {state}")
+    return state == IPERF3_PARAM_EXCHANGE
+
+
+def probe_iperf3_transfer(host, port, running_probes):
+    """probe a port with a short iperf3 run
+
+    Args:
+        host (str): iperf3 server
+        port (int): port to probe
+        running_probes (dict): probe processes in progress by port
+
+    Returns:
+        bool: True if iperf3 run completed
+    """
+    cmd = ["iperf3", "-4", "-c", host, "-t", "1", "-P", "1", "-p", str(port), "--connect-timeout", "500"]
+    try:
+        process = Popen(cmd, stdout=PIPE, stderr=PIPE, universal_newlines=True)
+    except OSError as e:
+        log.debug(f"exception: {e}")
+        return False
+
+    running_probes[port] = process
+    outs, errs = process.communicate()
+    del running_probes[port]
+
+    if errs:
+        log.debug(f"port {port}: {errs.strip()}")
+    return "iperf Done." in outs
+
+
+def probe_iperf3_port(host, port, running_probes, stop_probing):
+    """probe a single port on iperf3 server - tiered according to --probe-mode
+
+    - tcp: TCP connect to control port
+    - control: tcp + iperf3 control handshake to detect busy server
+    - full: control + iperf3 run of 1 second
+
+    Args:
+        host (str): iperf3 server
+        port (int): port to probe
+        running_probes (dict): probe processes in progress by port
+        stop_probing (obj): threading.Event set when no more probe is needed
+
+    Returns:
+        bool: True if port is available for running iperf3, None if not probed
+    """
+    if stop_probing.is_set():
+        return None
+
+    log.debug(f"probing port {port} (mode: {args.obj.probe_mode})")
+    sock = probe_tcp_connect(host, port)
+    if not sock:
+        return False
+
+    with sock:
+        if args.obj.probe_mode == "tcp":
+            return True
+        if not probe_iperf3_control(sock, port):
+            return False
+
+    if args.obj.probe_mode == "control":
+        return True
+    if stop_probing.is_set():
+        return None
+    return probe_iperf3_transfer(host, port, running_probes)
+
+
+def get_cmd_port(cmd):
+    """return server port used by iperf3 command
+
+    Args:
+        cmd (str): iperf3 command
+
+    Returns:
+        int: port or None if not set
+    """
+    match = re.search(r"-p\s+(\d+)", cmd)
+    return int(match.group(1)) if match else None
+
+
+def probe_iperf3(host, ports_list, required_ports=2, use_cache=True):
     """function to probe open port on iperf3 server - usefull when several port opens
 
+    Ports are probed concurrently (up to --probe-workers at once) and remaining
+    probes are stopped as soon as enough ports are found.
+    Recent results are taken from port cache (--probe-cache-ttl): ports known
+    available are used without probing and ports known busy are probed last.
+    With --server-pool, free ports of the pool are used without probing.
+
     Args:
         host (str): iperf3 server
         ports_list (list): port to probe
         required_ports (int, optional): define amount of required port for running iperf3. Defaults to 2.
+        use_cache (bool, optional): use port cache. Defaults to True.
 
     Returns:
         list: available port for running iperf3
@@ -259,21 +570,59 @@ def probe_iperf3(host, ports_list, required_ports=2):
     log.debug(
         f"start probing for available iperf3 ports - port range: {ports_list[0]} - {ports_list[-1]} | amount of required ports: {required_ports}"
     )
+    common.data["ports_from_cache"] = False
+
+    # free ports known by server pool - no probing
+    if args.obj.server_pool:
+        free_ports = server_pool.get_free_ports(args.obj.server_pool, ports_list)
+        if free_ports is not None and len(free_ports) >= required_ports:
+            log.debug(f"free ports from server pool: {free_ports}")
+            return sorted(free_ports[:required_ports])
+        if free_ports is not None:
+            log.warning(f"not enough free ports in server pool ({len(free_ports)}) - probing")
+
+    use_cache = use_cache and args.obj.probe_cache_ttl > 0
+
     available_ports = []
-    for port in ports_list:
-        cmd = f"iperf3 -4 -c {host} -t 1 -P 1 -p {port} --connect-timeout 500"
-        try:
-            log.debug(f"probing port {port}")
-            result = check_output(cmd, universal_newlines=True, shell=True)
-            if "iperf Done." in result:
-                available_ports.append(port)
-            if len(available_ports) == required_ports:
-                break
-        except Exception as e:
-            log.debug(f"exception: {e}")
+    if use_cache:
+        available_ports = port_cache.get_ports(host, ports_list, "available")[:required_ports]
+        busy_ports = port_cache.get_ports(host, ports_list, "busy")
+        # probe first ports not known as busy
+        ports_list = [p for p in ports_list if p not in available_ports and p not in busy_ports] + busy_ports
+        if available_ports:
+            log.debug(f"available ports from cache: {available_ports}")
+            common.data["ports_from_cache"] = True
+
+    running_probes = {}
+    stop_probing = threading.Event()
+
+    executor = ThreadPoolExecutor(max_workers=max(args.obj.probe_workers, 1))
+    futures = {
+        executor.submit(probe_iperf3_port, host, port, running_probes, stop_probing): port
+        for port in (ports_list if len(available_ports) < required_ports else [])
+    }
+    for future in as_completed(futures):
+        port_available = future.result()
+        if port_available is not None and use_cache:
+            port_cache.set_port_status(host, futures[future], "available" if port_available else "busy")
+        if port_available:
+            available_ports.append(futures[future])
+        if len(available_ports) == required_ports:
+            break
+
+    # stop remaining probes
+    stop_probing.set()
+    for process in list(running_probes.values()):
+        process.terminate()
+    executor.shutdown(wait=True, cancel_futures=True)
+
+    if use_cache:
+        port_cache.save_cache()
+
     if len(available_ports) < required_ports:
         log.warning("not enough ports to run tests")
         exit(1)
+    available_ports.sort()
     log.debug(
         f"probe finished - following port available to be used => {available_ports}"
     )
@@ -0,0 +1,354 @@
+import glob
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+from subprocess import Popen, PIPE
+
+from utils import args, common, latency_prober, placement, run_commands, ssh_control
+
+log = logging.getLogger("another-iperf3-wrapper")
+
+# dry-run outputs - samples directory of repository
+SAMPLES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "samples")
+DRY_RUN_SAMPLES = {
+    "iperf3": "iperf3_c172.16.1.238_p5201_t5_P10_J_20220222-170451.json",
+    "iperf3 -R": "iperf3_c172.16.1.238_p5201_t5_P10_J_R_20220222-170451.json",
+    "ping": "ping172.16.1.238_c15_D_20220222-170451.log",
+}
+
+# chunk offsets of a recording - next to raw output
+TIMING_EXT = "timing.json"
+
+READ_SIZE = 65536
+
+
+class PipeProcess:
+    """output written on a pipe by a thread - same interface as subprocess.Popen for process supervisor
+
+    Subclasses implement produce(), stdout pipe is closed when it returns as process exit.
+    """
+
+    def __init__(self, cmd):
+        self.cmd = cmd
+        self.pid = os.getpid()
+        self.returncode = None
+        self.stop = threading.Event()
+
+        read_fd, self.write_fd = os.pipe()
+        self.stdout = os.fdopen(read_fd, "rb", buffering=0)
+
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        """thread entry point"""
+        try:
+            self.returncode = self.produce()
+        except OSError as e:
+            log.error(f"{type(self).__name__} failed for cmd '{self.cmd}': {e}")
+            self.returncode = 2
+        finally:
+            os.close(self.write_fd)
+
+    def produce(self):
+        """write output on pipe
+
+        Returns:
+            int: returncode
+        """
+        raise NotImplementedError
+
+    def write(self, data):
+        """write all data on pipe - blocks while supervisor is reading"""
+        view = memoryview(data)
+        while view:
+            view = view[os.write(self.write_fd, view):]
+
+    def send_signal(self, sig):
+        self.stop.set()
+
+    def terminate(self):
+        self.stop.set()
+
+    def kill(self):
+        self.stop.set()
+
+    def poll(self):
+        return self.returncode
+
+    def wait(self, timeout=None):
+        self.thread.join(timeout)
+        return self.returncode
+
+
+class ReplayProcess(PipeProcess):
+    """replay recorded output - at full speed or with recorded timing"""
+
+    def __init__(self, cmd, output, chunks=None, returncode=0, timing=False):
+        """
+        Args:
+            cmd (str): command replayed
+            output (bytes): recorded output
+            chunks (list, optional): (offset in seconds, size) of each chunk as recorded. Defaults to None.
+            returncode (int, optional): recorded returncode. Defaults to 0.
+            timing (bool, optional): wait chunk offsets before writing them. Defaults to False.
+        """
+        self.output = output
+        self.chunks = chunks or [(0, len(output))]
+        self.recorded_returncode = returncode
+        self.timing = timing
+        super().__init__(cmd)
+
+    def produce(self):
+        start = time.monotonic()
+        position = 0
+        for offset, size in self.chunks:
+            if self.timing and self.stop.wait(max(start + offset - time.monotonic(), 0)):
+                break
+            self.write(self.output[position : position + size])
+            position += size
+        return self.recorded_returncode
+
+
+class RecordProcess(PipeProcess):
+    """run command and record its output with timing while forwarding it
+
+    Raw output is written as it comes, as saved with --save-outputs, and
+    offset/size of each chunk in a timing file next to it.
+    """
+
+    def __init__(self, cmd, filename):
+        """
+        Args:
+            cmd (str): command to run
+            filename (str): raw output file
+        """
+        self.filename = filename
+        self.process = start_local(cmd)
+        super().__init__(cmd)
+        self.pid = self.process.pid
+
+    def produce(self):
+        start = time.monotonic()
+        chunks = []
+        with open(self.filename, "wb") as f:
+            while True:
+                # as soon as available - stdout of Popen is buffered
+                chunk = os.read(self.process.stdout.fileno(), READ_SIZE)
+                if not chunk:
+                    break
+                chunks.append((round(time.monotonic() - start, 6), len(chunk)))
+                f.write(chunk)
+                self.write(chunk)
+        returncode = self.process.wait()
+
+        with open(f"{self.filename}.{TIMING_EXT}", "w") as f:
+            json.dump(
+                {
+                    "cmd": self.cmd,
+                    "returncode": returncode,
+                    "wall_time": round(time.monotonic() - start, 6),
+                    "chunks": chunks,
+                },
+                f,
+            )
+        log.info(f"raw output saved : {self.filename}")
+        return returncode
+
+    # signals forwarded to recorded process
+
+    def send_signal(self, sig):
+        self.process.send_signal(sig)
+
+    def terminate(self):
+        self.process.terminate()
+
+    def kill(self):
+        self.process.kill()
+
+
+def get_recording_key(cmd):
+    """key of recordings of a command - port removed as it changes with probing
+
+    --split processes of a direction only differ by port, they are numbered
+    in start order of the run so that each one has its own recordings.
+
+    Args:
+        cmd (str): command
+
+    Returns:
+        str: key usable in filename
+    """
+    cmd = re.sub(r"\s-p\s+\d+", "", f" {cmd} ")
+    cmd = re.sub(r"\s+", " ", cmd).strip()
+    key = cmd.replace("-", "_").replace(" ", "")
+
+    started = common.data.setdefault("recordings_started", {})
+    index = started.get(key, 0)
+    started[key] = index + 1
+    return f"{key}_split{index}" if index else key
+
+
+def get_recording_ext(cmd):
+    """extension of raw output file"""
+    return "json" if run_commands.get_cmd_type(cmd) == "iperf3" else "log"
+
+
+def start_local(cmd):
+    """run command as subprocess - native latency prober in-process
+
+    Process is pinned to cpus of its command for NUMA node placement.
+
+    Args:
+        cmd (str): command
+
+    Returns:
+        obj: process with subprocess.Popen interface
+    """
+    if cmd.startswith(latency_prober.NATIVE_PING_CMD):
+        return latency_prober.LatencyProber(cmd)
+    process = Popen(cmd.split(), stdout=PIPE)
+    placement.set_affinity(process, cmd)
+    return process
+
+
+def start_record(cmd):
+    """run command and record its output in result_dst_path
+
+    Args:
+        cmd (str): command
+
+    Returns:
+        obj: process with subprocess.Popen interface
+    """
+    result_dst_path = os.path.expanduser(args.obj.result_dst_path)
+    os.makedirs(result_dst_path, exist_ok=True)
+    filename = (
+        f"{result_dst_path}{get_recording_key(cmd)}_{common.get_timestamp_now()}.{get_recording_ext(cmd)}"
+    )
+    return RecordProcess(cmd, filename)
+
+
+def start_replay(cmd):
+    """replay output recorded for command in result_dst_path
+
+    Recordings of a command are replayed in turn, oldest first, on successive runs.
+
+    Args:
+        cmd (str): command
+
+    Returns:
+        obj: process with subprocess.Popen interface
+    """
+    key = get_recording_key(cmd)
+    result_dst_path = os.path.expanduser(args.obj.result_dst_path)
+    recordings = sorted(
+        glob.glob(os.path.join(glob.escape(result_dst_path), f"{glob.escape(key)}_*.{get_recording_ext(cmd)}"))
+    )
+    # key of another command may start with key (e.g. with -R)
+    recordings = [
+        r for r in recordings if re.fullmatch(r"\d{8}-\d{6}\.\w+", os.path.basename(r)[len(key) + 1 :])
+    ]
+    if not recordings:
+        log.error(f"no recording of cmd '{cmd}' in {result_dst_path} - record it with --save-outputs")
+        exit(1)
+
+    replayed = common.data.setdefault("replayed", {})
+    filename = recordings[replayed.get(key, 0) % len(recordings)]
+    replayed[key] = replayed.get(key, 0) + 1
+    log.debug(f"replay of {filename}")
+
+    with open(filename, "rb") as f:
+        output = f.read()
+    recording = {}
+    if os.path.exists(f"{filename}.{TIMING_EXT}"):
+        with open(f"{filename}.{TIMING_EXT}") as f:
+            recording = json.load(f)
+
+    return ReplayProcess(
+        cmd, output, recording.get("chunks"), recording.get("returncode", 0), timing=args.obj.replay_timing
+    )
+
+
+def start_ssh(cmd):
+    """run command on --ssh-client host over its persistent ssh connection
+
+    Args:
+        cmd (str): command
+
+    Returns:
+        obj: process with subprocess.Popen interface
+    """
+    if cmd.startswith(latency_prober.NATIVE_PING_CMD):
+        log.error("native latency prober runs in-process - use --latency-prober ping with --runner ssh")
+        exit(1)
+    return ssh_control.start_remote(args.obj.ssh_client, cmd)
+
+
+def get_dry_run_output(cmd):
+    """return sample output of command for dry-run mode
+
+    iperf3 --json-stream output is rebuilt from sample as one json event by line.
+
+    Args:
+        cmd (str): iperf3 or ping command
+
+    Returns:
+        str: command output
+    """
+    cmd_args = cmd.split()
+    cmd_type = run_commands.get_cmd_type(cmd)
+    sample = "iperf3 -R" if cmd_type == "iperf3" and "-R" in cmd_args else cmd_type
+
+    with open(os.path.join(SAMPLES_PATH, DRY_RUN_SAMPLES[sample]), "r") as f:
+        output = f.read()
+
+    if cmd_type == "iperf3" and "--json-stream" in cmd_args:
+        output_parsed = json.loads(output)
+        events = [{"event": "start", "data": output_parsed["start"]}]
+        events += [{"event": "interval", "data": interval} for interval in output_parsed["intervals"]]
+        events += [{"event": "end", "data": output_parsed["end"]}]
+        output = "".join(f"{json.dumps(event)}\n" for event in events)
+
+    return output
+
+
+def start_dry_run(cmd):
+    """replay sample output of command
+
+    Args:
+        cmd (str): command
+
+    Returns:
+        obj: process with subprocess.Popen interface
+    """
+    return ReplayProcess(cmd, get_dry_run_output(cmd).encode())
+
+
+RUNNERS = {
+    "local": start_local,
+    "record": start_record,
+    "replay": start_replay,
+    "ssh": start_ssh,
+}
+
+
+def get_runner():
+    """return function starting a command with selected runner
+
+    --dry-run replays samples, --save-outputs records outputs of local runs.
+
+    Returns:
+        function: start function, command as argument and process as result
+    """
+    # new run - --split processes numbered from 0
+    common.data["recordings_started"] = {}
+    if args.obj.dry_run:
+        return start_dry_run
+    if args.obj.runner == "local" and args.obj.save_outputs:
+        return start_record
+    return RUNNERS[args.obj.runner]
@@ -0,0 +1,282 @@
+import http.server
+import json
+import logging
+import os
+import selectors
+import threading
+import time
+import urllib.request
+
+from subprocess import Popen, PIPE, STDOUT
+
+log = logging.getLogger("another-iperf3-wrapper")
+
+# worker state from iperf3 -s output lines
+STATE_LINES = {
+    "Server listening on": "free",
+    "Accepted connection from": "busy",
+}
+
+# seconds before restarting an exited worker - doubled while it exits early
+RESTART_DELAY = 1
+RESTART_DELAY_MAX = 30
+# worker running longer is considered healthy and its restart delay reset
+HEALTHY_TIME = 5
+
+CONTENT_TYPE = "application/json"
+
+
+def new_pool(ports, cpus):
+    """initialize pool state - one worker by port, pinned to cpus in turn
+
+    Args:
+        ports (list): ports of workers
+        cpus (list): cpus to pin workers to, empty for no pinning
+
+    Returns:
+        dict: pool state
+    """
+    return {
+        "lock": threading.Lock(),
+        "selector": selectors.DefaultSelector(),
+        "workers": {
+            port: {
+                "port": port,
+                "cpu": cpus[index % len(cpus)] if cpus else None,
+                "process": None,
+                "state": "stopped",
+                "since": time.time(),
+                "started": None,
+                "restart_at": 0,
+                "restart_delay": RESTART_DELAY,
+                "restarts": 0,
+                "tests": 0,
+                "partial": b"",
+            }
+            for index, port in enumerate(ports)
+        },
+    }
+
+
+def get_worker_cmd(worker):
+    """iperf3 server command of worker - output flushed by line to follow its state
+
+    Args:
+        worker (dict): worker state
+
+    Returns:
+        list: command
+    """
+    cmd = ["iperf3", "-s", "-p", str(worker["port"]), "--forceflush"]
+    if worker["cpu"] is not None:
+        cmd += ["-A", str(worker["cpu"])]
+    return cmd
+
+
+def set_state(pool, worker, state):
+    """update worker state
+
+    Args:
+        pool (dict): pool state
+        worker (dict): worker state
+        state (str): free|busy|restarting|stopped
+    """
+    if worker["state"] == state:
+        return
+    log.debug(f"port {worker['port']}: {worker['state']} -> {state}")
+    with pool["lock"]:
+        if state == "busy":
+            worker["tests"] += 1
+        worker["state"] = state
+        worker["since"] = time.time()
+
+
+def start_worker(pool, worker):
+    """start iperf3 server of worker
+
+    Args:
+        pool (dict): pool state
+        worker (dict): worker state
+    """
+    try:
+        process = Popen(get_worker_cmd(worker), stdout=PIPE, stderr=STDOUT)
+    except OSError as e:
+        log.error(f"could not start iperf3 server: {e}")
+        exit(1)
+    os.set_blocking(process.stdout.fileno(), False)
+    pool["selector"].register(process.stdout, selectors.EVENT_READ, worker)
+    worker["process"] = process
+    worker["started"] = time.monotonic()
+    worker["partial"] = b""
+    log.debug(f"port {worker['port']}: iperf3 server started - pid: {process.pid} cpu: {worker['cpu']}")
+
+
+def handle_line(pool, worker, line):
+    """follow worker state from iperf3 -s output line
+
+    Args:
+        pool (dict): pool state
+        worker (dict): worker state
+        line (str): output line
+    """
+    for prefix, state in STATE_LINES.items():
+        if line.startswith(prefix):
+            set_state(pool, worker, state)
+    if line.startswith("iperf3: error"):
+        log.debug(f"port {worker['port']}: {line}")
+
+
+def handle_exit(pool, worker):
+    """schedule restart of exited worker - delay doubled while it exits early
+
+    Args:
+        pool (dict): pool state
+        worker (dict): worker state
+    """
+    returncode = worker["process"].wait()
+    now = time.monotonic()
+    if now - worker["started"] >= HEALTHY_TIME:
+        worker["restart_delay"] = RESTART_DELAY
+    log.warning(
+        f"port {worker['port']}: iperf3 server exited (returncode: {returncode}) "
+        f"- restart in {worker['restart_delay']}s"
+    )
+    worker["process"] = None
+    worker["restart_at"] = now + worker["restart_delay"]
+    worker["restart_delay"] = min(worker["restart_delay"] * 2, RESTART_DELAY_MAX)
+    set_state(pool, worker, "restarting")
+
+
+def supervise(pool, until=None):
+    """read workers output, follow their state and restart exited ones
+
+    Args:
+        pool (dict): pool state
+        until (float, optional): monotonic time to stop supervising. Defaults to None.
+    """
+    workers = pool["workers"].values()
+    while until is None or time.monotonic() < until:
+        now = time.monotonic()
+        for worker in workers:
+            if worker["process"] is None and now >= worker["restart_at"]:
+                if worker["state"] == "restarting":
+                    worker["restarts"] += 1
+                start_worker(pool, worker)
+
+        waiting = [w["restart_at"] for w in workers if w["process"] is None]
+        next_event = min(waiting + ([until] if until is not None else []), default=now + 1)
+
+        for key, _ in pool["selector"].select(timeout=max(next_event - now, 0)):
+            worker = key.data
+            chunk = os.read(key.fd, 65536)
+            if chunk:
+                lines = (worker["partial"] + chunk).split(b"\n")
+                worker["partial"] = lines.pop()
+                for line in lines:
+                    handle_line(pool, worker, line.decode(errors="replace").strip())
+                continue
+            # EOF - worker exiting
+            pool["selector"].unregister(key.fileobj)
+            key.fileobj.close()
+            handle_exit(pool, worker)
+
+
+def stop(pool):
+    """stop all workers
+
+    Args:
+        pool (dict): pool state
+    """
+    for worker in pool["workers"].values():
+        if worker["process"]:
+            worker["process"].terminate()
+    for worker in pool["workers"].values():
+        if worker["process"]:
+            worker["process"].wait()
+            worker["process"] = None
+        set_state(pool, worker, "stopped")
+    pool["selector"].close()
+
+
+def get_state(pool):
+    """pool state exposed to clients
+
+    Args:
+        pool (dict): pool state
+
+    Returns:
+        dict: state of each worker by port
+    """
+    ports = {}
+    with pool["lock"]:
+        for port, worker in pool["workers"].items():
+            # process replaced by supervisor thread on restart
+            process = worker["process"]
+            ports[str(port)] = {
+                "state": worker["state"],
+                "since": worker["since"],
+                "cpu": worker["cpu"],
+                "pid": process.pid if process else None,
+                "restarts": worker["restarts"],
+                "tests": worker["tests"],
+            }
+    return {"timestamp": time.time(), "ports": ports}
+
+
+def start_server(pool, listen):
+    """serve pool state as json on /ports in a daemon thread
+
+    Args:
+        pool (dict): pool state
+        listen (str): address:port
+
+    Returns:
+        obj: http server
+    """
+    address, _, port = listen.rpartition(":")
+
+    class PoolHandler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/ports":
+                self.send_error(404)
+                return
+            body = json.dumps(get_state(pool)).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *log_args):
+            log.debug(f"pool request from {self.client_address[0]}: {format % log_args}")
+
+    server = http.server.ThreadingHTTPServer((address.strip("[]") or "0.0.0.0", int(port)), PoolHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    log.info(f"pool state exposed on http://{listen}/ports")
+    return server
+
+
+def get_free_ports(url, ports_list):
+    """ports of list free in server pool - client side
+
+    Args:
+        url (str): pool address (http://host:port)
+        ports_list (list): ports to look for
+
+    Returns:
+        list: free ports, least recently used first - None if pool not reachable
+    """
+    url = url if "://" in url else f"http://{url}"
+    try:
+        with urllib.request.urlopen(f"{url.rstrip('/')}/ports", timeout=2) as response:
+            state = json.load(response)
+    except (OSError, ValueError) as e:
+        log.warning(f"server pool {url} not reachable: {e}")
+        return None
+
+    free_ports = [
+        (worker["since"], int(port))
+        for port, worker in state["ports"].items()
+        if worker["state"] == "free" and int(port) in ports_list
+    ]
+    return [port for _, port in sorted(free_ports)]
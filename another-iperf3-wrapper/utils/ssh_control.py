@@ -0,0 +1,222 @@
+import atexit
+import hashlib
+import logging
+import os
+import shlex
+import signal
+import subprocess
+import tempfile
+import time
+
+from subprocess import Popen, PIPE, DEVNULL
+
+from utils import args, common, run_commands
+
+log = logging.getLogger("another-iperf3-wrapper")
+
+# control sockets of persistent connections - shared by wrapper runs of the same user
+CONTROL_DIR = os.path.join(tempfile.gettempdir(), f"another-iperf3-wrapper-ssh-{os.getuid()}")
+
+# iperf3 servers started on remote host - expanded by remote shell
+REMOTE_PIDFILE = "${TMPDIR:-/tmp}/another-iperf3-wrapper-iperf3-%s.pid"
+
+# seconds to wait for a started iperf3 server to accept connections
+SERVER_READY_TIMEOUT = 5
+
+# remote command interrupted with SIGINT when ssh stdin is closed - ssh does not forward signals
+INTERRUPTIBLE_CMD = (
+    "exec 3<&0; {cmd} </dev/null & pid=$!; "
+    "(read _ <&3; kill -INT $pid) 2>/dev/null & watcher=$!; "
+    "wait $pid; returncode=$?; kill $watcher 2>/dev/null; exit $returncode"
+)
+
+
+class RemoteProcess(Popen):
+    """command run over ssh - SIGINT and SIGTERM close its stdin to interrupt remote command"""
+
+    def send_signal(self, sig):
+        if sig in [signal.SIGINT, signal.SIGTERM] and self.stdin and not self.stdin.closed:
+            self.stdin.close()
+        else:
+            super().send_signal(sig)
+
+
+def get_control_path(destination):
+    """control socket of destination - short enough for unix socket path limit
+
+    Args:
+        destination (str): [user@]host
+
+    Returns:
+        str: control socket path
+    """
+    return os.path.join(CONTROL_DIR, hashlib.sha1(destination.encode()).hexdigest()[:16])
+
+
+def get_ssh_args(destination, *ssh_options):
+    """ssh command line going through persistent connection of destination
+
+    The first command opens the connection as master, it is kept open in background
+    for --ssh-persist seconds once idle and reused by next commands and wrapper runs.
+
+    Args:
+        destination (str): [user@]host
+        *ssh_options (str): additional ssh options
+
+    Returns:
+        list: ssh command line, remote command to append
+    """
+    return [
+        "ssh",
+        "-o", "BatchMode=yes",
+        "-o", "ControlMaster=auto",
+        "-o", f"ControlPath={get_control_path(destination)}",
+        "-o", f"ControlPersist={args.obj.ssh_persist}",
+        *ssh_options,
+        destination,
+    ]
+
+
+def connect(destination):
+    """open persistent connection to destination if not already open - setup paid once by host
+
+    Args:
+        destination (str): [user@]host
+    """
+    connections = common.data.setdefault("ssh_connections", set())
+    if destination in connections:
+        return
+
+    os.makedirs(CONTROL_DIR, mode=0o700, exist_ok=True)
+    check = subprocess.run(get_ssh_args(destination, "-O", "check"), stdin=DEVNULL, capture_output=True)
+    if check.returncode:
+        control_path = get_control_path(destination)
+        # stale socket of a dead master disables multiplexing
+        if os.path.exists(control_path):
+            os.remove(control_path)
+
+        start = time.monotonic()
+        try:
+            setup = subprocess.run(
+                get_ssh_args(destination) + ["true"],
+                stdin=DEVNULL,
+                capture_output=True,
+                text=True,
+                timeout=args.obj.timeout,
+            )
+        except subprocess.TimeoutExpired:
+            log.error(f"ssh connection to {destination} timed out after {args.obj.timeout}s")
+            exit(1)
+        if setup.returncode:
+            log.error(f"ssh connection to {destination} failed: {setup.stderr.strip()}")
+            exit(1)
+        log.info(f"ssh connection to {destination} opened in {round(time.monotonic() - start, 3)}s")
+    else:
+        log.debug(f"ssh connection to {destination} reused")
+
+    connections.add(destination)
+
+
+def run_remote(destination, remote_cmd):
+    """run shell command on destination and wait for its completion
+
+    Args:
+        destination (str): [user@]host
+        remote_cmd (str): shell command
+
+    Returns:
+        obj: subprocess.CompletedProcess
+    """
+    connect(destination)
+    log.debug(f"{destination}: {remote_cmd}")
+    return subprocess.run(get_ssh_args(destination) + [remote_cmd], stdin=DEVNULL, capture_output=True, text=True)
+
+
+def start_remote(destination, cmd):
+    """start command on destination with its output streamed back as a local process
+
+    Args:
+        destination (str): [user@]host
+        cmd (str): iperf3 or ping command
+
+    Returns:
+        obj: process with subprocess.Popen interface
+    """
+    connect(destination)
+    remote_cmd = INTERRUPTIBLE_CMD.format(cmd=" ".join(shlex.quote(arg) for arg in cmd.split()))
+    return RemoteProcess(get_ssh_args(destination) + [remote_cmd], stdin=PIPE, stdout=PIPE)
+
+
+def wait_server(host, port):
+    """wait until iperf3 server accepts connections
+
+    Args:
+        host (str): iperf3 server
+        port (int): server port
+
+    Returns:
+        bool: True if server is ready
+    """
+    deadline = time.monotonic() + SERVER_READY_TIMEOUT
+    while time.monotonic() < deadline:
+        sock = run_commands.probe_tcp_connect(host, port)
+        if sock:
+            sock.close()
+            return True
+        time.sleep(0.1)
+    return False
+
+
+def start_servers(destination, host, ports):
+    """start iperf3 -s on destination for ports of pool not already listening
+
+    Servers are stopped at exit.
+
+    Args:
+        destination (str): [user@]host running iperf3 servers
+        host (str): tested host - address of servers
+        ports (list): port pool
+    """
+    listening = []
+    for port in ports:
+        sock = run_commands.probe_tcp_connect(host, port, timeout=0.2)
+        if sock:
+            sock.close()
+            listening.append(port)
+    ports = [port for port in ports if port not in listening]
+    if not ports:
+        log.info(f"iperf3 servers already listening on {host} - none started")
+        return
+
+    result = run_remote(
+        destination,
+        "; ".join(f"iperf3 -s -p {port} -D --pidfile {REMOTE_PIDFILE % port}" for port in ports),
+    )
+    if result.returncode:
+        log.error(f"iperf3 servers start failed on {destination}: {result.stderr.strip()}")
+        exit(1)
+    atexit.register(stop_servers, destination, ports)
+
+    not_ready = [port for port in ports if not wait_server(host, port)]
+    if not_ready:
+        log.warning(f"iperf3 servers not accepting connections on {host}: {not_ready}")
+    log.info(f"iperf3 servers started on {destination} - ports: {ports}")
+
+
+def stop_servers(destination, ports):
+    """stop iperf3 servers started on destination
+
+    Args:
+        destination (str): [user@]host running iperf3 servers
+        ports (list): ports of started servers
+    """
+    result = run_remote(
+        destination,
+        "; ".join(
+            f'f={REMOTE_PIDFILE % port}; [ -f "$f" ] && kill "$(cat "$f")"' for port in ports
+        ) + "; true",
+    )
+    if result.returncode:
+        log.warning(f"iperf3 servers stop failed on {destination}: {result.stderr.strip()}")
+    else:
+        log.info(f"iperf3 servers stopped on {destination} - ports: {ports}")